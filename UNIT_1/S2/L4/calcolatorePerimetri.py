@@ -1,4 +1,4 @@
-import math
+from calcolatorePerimetri2 import perimetriQ, circonferenze, perimetriR #le formule a lotti, usate qui con una figura sola
 print("Benvenuto/a nel calcolatore dei perimetri!\n")
 a = 0
 while a != 4: #ciclo per continuare a chiedere i perimetri finché non preme '4' per uscire
@@ -6,16 +6,16 @@ while a != 4: #ciclo per continuare a chiedere i perimetri finché non preme '4'
 
     if a == 1:
         latoQuadrato = float(input("Inserisci la lunghezza del lato del quadrato: "))
-        perimetroQuadrato = latoQuadrato * 4 #calcolo del perimetro del quadrato
+        perimetroQuadrato = perimetriQ([latoQuadrato])[0] #calcolo del perimetro del quadrato
         print(f"\nIl perimetro del quadrato di lato {latoQuadrato} è {perimetroQuadrato}")
     elif a == 2:
             raggioCerchio = float(input("Inserisci la lunghezza del raggio del cerchio: "))
-            ciconferenza = 2 * math.pi * raggioCerchio #calcolo della circonferenza 
+            ciconferenza = circonferenze([raggioCerchio])[0] #calcolo della circonferenza 
             print(f"\nLa circonferenza del cerchio di raggio {raggioCerchio} è {ciconferenza}")
     elif a == 3:
             baseRettangolo = float(input("Inserisci la lunghezza della base del rettangolo: "))
             altezzaRettangolo = float(input("Inserisci l'altezza della base del rettangolo: "))
-            perimetroRettangolo = (2 * baseRettangolo) + (2 * altezzaRettangolo) #calcolo del perimetro del rettangolo
+            perimetroRettangolo = perimetriR([baseRettangolo], [altezzaRettangolo])[0] #calcolo del perimetro del rettangolo
             print(f"\nIl perimetro del rettangolo di base {baseRettangolo} e di altezza {altezzaRettangolo} è {perimetroRettangolo}")
     elif a == 4: #uscita dal programma
             print("\nAlla prossima!")
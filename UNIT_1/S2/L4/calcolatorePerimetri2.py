@@ -1,5 +1,60 @@
 import math
-#ho definito prima delle funzioni che calcolano i perimetri
+import sys
+from array import array
+from contextlib import ExitStack
+from itertools import islice
+
+try:
+    import numpy as np   # facoltativo: se c'è, i calcoli sui lotti sono vettoriali
+except ImportError:
+    np = None
+
+BLOCCO_DEFAULT = 65536   # figure lette, calcolate e scritte alla volta: la memoria resta costante
+
+# figura -> quanti valori servono per ogni figura (lato / raggio / base e altezza)
+FIGURE = {"quadrato": 1, "cerchio": 1, "rettangolo": 2}
+
+# ---CALCOLO A LOTTI---
+#le funzioni ricevono liste/array di misure e calcolano tutti i perimetri in un colpo solo
+def _vettore(valori):
+    """Lista/array di numeri -> array numpy di float64 (oppure array('d') senza numpy)."""
+    if np is not None:
+        return np.asarray(valori, dtype=np.float64)
+    return valori if isinstance(valori, array) and valori.typecode == "d" else array("d", valori)
+
+def perimetriQ(lati): #perimetri dei Quadrati
+    lati = _vettore(lati)
+    if np is not None:
+        return lati * 4
+    return array("d", [l * 4 for l in lati])
+
+def circonferenze(raggi): #circonferenze dei Cerchi
+    raggi = _vettore(raggi)
+    if np is not None:
+        return raggi * (2 * math.pi)
+    due_pi = 2 * math.pi
+    return array("d", [due_pi * r for r in raggi])
+
+def perimetriR(basi, altezze): #perimetri dei Rettangoli
+    basi, altezze = _vettore(basi), _vettore(altezze)
+    if len(basi) != len(altezze):
+        raise ValueError(f"basi e altezze devono essere tante quante: {len(basi)} contro {len(altezze)}")
+    if np is not None:
+        return (basi + altezze) * 2
+    return array("d", [(b + h) * 2 for b, h in zip(basi, altezze)])
+
+def calcola(figura, colonne):
+    """Perimetri della 'figura' dati i valori per colonna (es. [basi, altezze] per il rettangolo)."""
+    if figura == "quadrato":
+        return perimetriQ(colonne[0])
+    if figura == "cerchio":
+        return circonferenze(colonne[0])
+    if figura == "rettangolo":
+        return perimetriR(colonne[0], colonne[1])
+    raise ValueError(f"figura sconosciuta: {figura} (valide: {', '.join(FIGURE)})")
+
+# ---FUNZIONI PER UNA SOLA FIGURA---
+#stesse formule dei lotti su un numero solo: il tipo del risultato segue quello delle misure (int -> int)
 def perimetroQ(l): #perimetro Quadrato
     perQ = l * 4
     return(perQ)
@@ -12,26 +67,161 @@ def perimetroR(b,h): #perimetro Rettangolo
     perR = (2 * b) + (2 * h)
     return(perR)
 
-print("Benvenuto/a nel calcolatore dei perimetri!\n")
-a = 0
-while a != 4: #ciclo per continuare a chiedere i perimetri finché non preme '4' per uscire
-    a = float((input("\n\nQuale figura geometrica vuoi calcolare?\n 1 Quadrato\n 2 Cerchio\n 3 Rettangolo\n 4 Esci\n\n")))
-    
-    if a == 1:
-            lQ = float(input("Inserisci la lunghezza del lato del quadrato: "))
-            perimetroQuadrato = perimetroQ(lQ) #utilizzo della funzione definito sopra
-            print(f"\nIl perimetro del quadrato di lato {lQ} è {perimetroQuadrato}")
-    elif a == 2:
-            rC = float(input("Inserisci la lunghezza del raggio del cerchio: "))
-            circonferenzaCerchio = ciconferenza(rC) #utilizzo della funzione definito sopra
-            print(f"\nLa circonferenza del cerchio di raggio {rC} è {circonferenzaCerchio}")
-    elif a == 3:
-            bR = float(input("Inserisci la lunghezza della base del rettangolo: "))
-            aR = float(input("Inserisci l'altezza della base del rettangolo: "))
-            perimetroRettangolo = perimetroR(bR, aR) #utilizzo della funzione definito sopra
-            print(f"\nIl perimetro del rettangolo di base {bR} e di altezza {aR} è {perimetroRettangolo}")
-    elif a == 4: #uscita dal programma
-            print("\nAlla prossima!")
-            break
-    else: #se sceglie un numero al di fuori della lista
-          print("\nQuesto numero non è presente nella lista, riprova.\n") 
+# ---LETTURA E SCRITTURA DEI FILE A BLOCCHI---
+#CSV: una figura per riga, i valori separati da virgola (righe vuote, commenti '#' e intestazione ignorati)
+#binario: float64 little-endian uno dopo l'altro, 'n_valori' per figura; i risultati sono nello stesso formato
+def _numero(campo):
+    try:
+        float(campo)
+        return True
+    except ValueError:
+        return False
+
+def leggi_csv_a_blocchi(file, n_valori, blocco=BLOCCO_DEFAULT):
+    """
+    Genera liste di colonne, ognuna con al massimo 'blocco' valori.
+    Solleva ValueError con il numero della riga se una riga non ha 'n_valori' numeri.
+    """
+    prima = True   # la prima riga con dei dati può essere l'intestazione (es. "base,altezza")
+    numero = 0
+    while True:
+        righe = list(islice(file, blocco))
+        if not righe:
+            return
+        colonne = [array("d") for _ in range(n_valori)]
+        for riga in righe:
+            numero += 1
+            riga = riga.strip()
+            if not riga or riga.startswith("#"):
+                continue
+            campi = riga.split(",")
+            try:
+                valori = [float(campi[i]) for i in range(n_valori)]
+            except (ValueError, IndexError):
+                #è l'intestazione solo se nessun campo è un numero: "1,abc" o "2" sono righe sbagliate
+                if prima and not any(_numero(campo) for campo in campi):
+                    prima = False
+                    continue
+                raise ValueError(f"riga non valida (n. {numero}), servono {n_valori} numeri: {riga!r}") from None
+            prima = False
+            for colonna, valore in zip(colonne, valori):
+                colonna.append(valore)
+        if len(colonne[0]):
+            yield colonne
+
+def leggi_binario_a_blocchi(file, n_valori, blocco=BLOCCO_DEFAULT):
+    """Come leggi_csv_a_blocchi, per un file di float64 little-endian."""
+    dimensione = 8 * n_valori * blocco
+    while True:
+        dati = file.read(dimensione)
+        if not dati:
+            return
+        if len(dati) % (8 * n_valori):
+            raise ValueError(f"file binario troncato: l'ultima figura non ha tutti i suoi {n_valori} valori")
+        if np is not None:
+            valori = np.frombuffer(dati, dtype="<f8")
+            yield [valori[i::n_valori] for i in range(n_valori)]
+        else:
+            valori = array("d", dati)
+            if sys.byteorder == "big":
+                valori.byteswap()
+            yield [valori[i::n_valori] for i in range(n_valori)]
+
+def scrivi_csv(file, risultati):
+    file.write("".join(f"{x!r}\n" for x in risultati.tolist()))
+
+def scrivi_binario(file, risultati):
+    if np is not None:
+        file.write(np.asarray(risultati, dtype="<f8").tobytes())
+    else:
+        if sys.byteorder == "big":
+            risultati = array("d", risultati)
+            risultati.byteswap()
+        file.write(risultati.tobytes())
+
+def _binario(percorso, formato):
+    if formato:
+        return formato == "bin"
+    return percorso.endswith((".bin", ".f64"))
+
+def calcola_file(figura, ingresso, uscita, formato_ingresso=None, formato_uscita=None, blocco=BLOCCO_DEFAULT):
+    """
+    Calcola i perimetri di tutte le figure di 'ingresso' e li scrive in 'uscita' (un risultato
+    per figura, nello stesso ordine), un blocco alla volta. '-' = stdin / stdout.
+    Il formato si deduce dall'estensione (.bin/.f64 binario, altrimenti CSV) o da formato_*.
+    Ritorna il numero di figure calcolate.
+    """
+    n_valori = FIGURE[figura]
+    ingresso_bin = _binario(ingresso, formato_ingresso)
+    uscita_bin = _binario(uscita, formato_uscita)
+
+    leggi = leggi_binario_a_blocchi if ingresso_bin else leggi_csv_a_blocchi
+    scrivi = scrivi_binario if uscita_bin else scrivi_csv
+    totale = 0
+    with ExitStack() as chiudi:   #i file aperti qui si chiudono anche se l'apertura del secondo fallisce
+        if ingresso == "-":
+            f_in = sys.stdin.buffer if ingresso_bin else sys.stdin
+        else:
+            f_in = chiudi.enter_context(open(ingresso, "rb") if ingresso_bin else open(ingresso, encoding="utf-8"))
+        if uscita == "-":
+            f_out = sys.stdout.buffer if uscita_bin else sys.stdout
+            chiudi.callback(f_out.flush)
+        else:
+            f_out = chiudi.enter_context(open(uscita, "wb") if uscita_bin else open(uscita, "w", encoding="utf-8"))
+
+        for colonne in leggi(f_in, n_valori, blocco):
+            risultati = calcola(figura, colonne)
+            scrivi(f_out, risultati)
+            totale += len(risultati)
+    return totale
+
+def cli(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Perimetri di tante figure lette da un file CSV o binario (float64)")
+    parser.add_argument("figura", choices=list(FIGURE))
+    parser.add_argument("ingresso", help="file con le misure, una figura per riga ('-' = stdin)")
+    parser.add_argument("-o", "--uscita", default="-", help="file dei risultati (default: stdout)")
+    parser.add_argument("--formato-ingresso", choices=("csv", "bin"))
+    parser.add_argument("--formato-uscita", choices=("csv", "bin"))
+    parser.add_argument("--blocco", type=int, default=BLOCCO_DEFAULT, help="figure per blocco")
+    args = parser.parse_args(argv)
+    try:
+        totale = calcola_file(args.figura, args.ingresso, args.uscita, args.formato_ingresso,
+                              args.formato_uscita, args.blocco)
+    except (OSError, ValueError) as e:
+        print(f"errore: {e}", file=sys.stderr)
+        return 1
+    print(f"{totale} figure calcolate ({'numpy' if np is not None else 'python puro'})", file=sys.stderr)
+    return 0
+
+# ---CALCOLATORE INTERATTIVO---
+def menu():
+    print("Benvenuto/a nel calcolatore dei perimetri!\n")
+    a = 0
+    while a != 4: #ciclo per continuare a chiedere i perimetri finché non preme '4' per uscire
+        a = float((input("\n\nQuale figura geometrica vuoi calcolare?\n 1 Quadrato\n 2 Cerchio\n 3 Rettangolo\n 4 Esci\n\n")))
+
+        if a == 1:
+                lQ = float(input("Inserisci la lunghezza del lato del quadrato: "))
+                perimetroQuadrato = perimetroQ(lQ) #utilizzo della funzione definito sopra
+                print(f"\nIl perimetro del quadrato di lato {lQ} è {perimetroQuadrato}")
+        elif a == 2:
+                rC = float(input("Inserisci la lunghezza del raggio del cerchio: "))
+                circonferenzaCerchio = ciconferenza(rC) #utilizzo della funzione definito sopra
+                print(f"\nLa circonferenza del cerchio di raggio {rC} è {circonferenzaCerchio}")
+        elif a == 3:
+                bR = float(input("Inserisci la lunghezza della base del rettangolo: "))
+                aR = float(input("Inserisci l'altezza della base del rettangolo: "))
+                perimetroRettangolo = perimetroR(bR, aR) #utilizzo della funzione definito sopra
+                print(f"\nIl perimetro del rettangolo di base {bR} e di altezza {aR} è {perimetroRettangolo}")
+        elif a == 4: #uscita dal programma
+                print("\nAlla prossima!")
+                break
+        else: #se sceglie un numero al di fuori della lista
+              print("\nQuesto numero non è presente nella lista, riprova.\n")
+
+if __name__ == "__main__":
+    #con degli argomenti calcola un file a blocchi, senza argomenti parte il calcolatore interattivo
+    if len(sys.argv) > 1:
+        sys.exit(cli())
+    menu()
@@ -0,0 +1,92 @@
+import io
+import math
+import struct
+
+import pytest
+
+import calcolatorePerimetri2 as calc
+
+
+@pytest.fixture(params=["numpy", "python puro"])
+def senza_numpy(request, monkeypatch):
+    """Esegue il test con numpy (se installato) e con il ripiego in python puro."""
+    if request.param == "numpy":
+        if calc.np is None:
+            pytest.skip("numpy non installato")
+    else:
+        monkeypatch.setattr(calc, "np", None)
+    return request.param
+
+
+def test_lotti_come_funzioni_singole(senza_numpy):
+    lati, raggi, basi, altezze = [1, 2.5, 0], [1, 0.5], [1, 3], [2, 4.5]
+    assert list(calc.perimetriQ(lati)) == [calc.perimetroQ(l) for l in lati] == [4.0, 10.0, 0.0]
+    assert list(calc.circonferenze(raggi)) == [2 * math.pi, math.pi]
+    assert list(calc.perimetriR(basi, altezze)) == [6.0, 15.0]
+    with pytest.raises(ValueError):
+        calc.perimetriR([1, 2], [3])
+
+
+def test_funzioni_singole_mantengono_il_tipo():
+    assert calc.perimetroQ(3) == 12 and type(calc.perimetroQ(3)) is int
+    assert calc.perimetroR(2, 5) == 14 and type(calc.perimetroR(2, 5)) is int
+    assert calc.perimetroR(0.5, 1) == 3.0 and calc.ciconferenza(1) == 2 * math.pi
+
+
+def test_csv_con_commenti_e_intestazione(senza_numpy):
+    testo = "# misure del rilievo\n\nbase,altezza\n1,2\n\n# secondo blocco\n3.5,4\n"
+    blocchi = list(calc.leggi_csv_a_blocchi(io.StringIO(testo), 2))
+    assert [[list(c) for c in colonne] for colonne in blocchi] == [[[1.0, 3.5], [2.0, 4.0]]]
+
+
+def test_csv_riga_non_valida_dopo_i_dati(senza_numpy):
+    with pytest.raises(ValueError, match="riga non valida"):
+        list(calc.leggi_csv_a_blocchi(io.StringIO("1,2\nbase,altezza\n"), 2))
+
+
+@pytest.mark.parametrize("testo, numero", [
+    ("# commento\n1,abc\n3,4\n", 2),     # prima riga di dati in parte numerica: non è un'intestazione
+    ("2\n3,4\n", 1),                      # manca un valore
+    ("base,altezza\n1,2\n\n3;4\n", 4),
+])
+def test_csv_prima_riga_sbagliata_non_e_intestazione(senza_numpy, testo, numero):
+    with pytest.raises(ValueError, match=rf"riga non valida \(n\. {numero}\)"):
+        list(calc.leggi_csv_a_blocchi(io.StringIO(testo), 2, blocco=2))
+
+
+def test_calcola_file_csv_e_binario(senza_numpy, tmp_path):
+    # 5 rettangoli letti a blocchi da 2: i risultati escono nello stesso ordine
+    misure = [(1, 2), (3, 4), (0.5, 0.25), (10, 0), (7, 7)]
+    attesi = [(b + h) * 2 for b, h in misure]
+
+    csv = tmp_path / "r.csv"
+    csv.write_text("base,altezza\n" + "".join(f"{b},{h}\n" for b, h in misure))
+    uscita_csv = tmp_path / "p.csv"
+    assert calc.calcola_file("rettangolo", str(csv), str(uscita_csv), blocco=2) == 5
+    assert [float(r) for r in uscita_csv.read_text().split()] == attesi
+
+    binario = tmp_path / "r.bin"
+    binario.write_bytes(b"".join(struct.pack("<2d", b, h) for b, h in misure))
+    uscita_bin = tmp_path / "p.f64"
+    assert calc.calcola_file("rettangolo", str(binario), str(uscita_bin), blocco=2) == 5
+    assert list(struct.unpack("<5d", uscita_bin.read_bytes())) == attesi
+
+
+def test_binario_troncato(senza_numpy):
+    with pytest.raises(ValueError, match="troncato"):
+        list(calc.leggi_binario_a_blocchi(io.BytesIO(struct.pack("<3d", 1, 2, 3)), 2))
+
+
+def test_calcola_file_chiude_l_ingresso_se_l_uscita_non_si_apre(tmp_path, monkeypatch):
+    aperti = []
+
+    def apri(*args, **kwargs):
+        f = open(*args, **kwargs)
+        aperti.append(f)
+        return f
+    monkeypatch.setattr(calc, "open", apri, raising=False)
+    ingresso = tmp_path / "q.csv"
+    ingresso.write_text("1\n2\n")
+    with pytest.raises(FileNotFoundError):
+        calc.calcola_file("quadrato", str(ingresso), str(tmp_path / "manca" / "p.csv"))
+    assert len(aperti) == 1 and aperti[0].closed
@@ -1,32 +1,149 @@
 import datetime
+import sys
+
+PORTA_DEFAULT = 5050
+
+def normalizza(testo):
+    return testo.lower().strip()
+
+# ---RISPOSTE---
+#una funzione per ogni domanda che l'assistente conosce
+def data_di_oggi():
+    oggi = datetime.datetime.today()
+    return "La data di oggi è " + oggi.strftime("%d/%m/%Y")
+
+def ora_attuale():
+    ora = datetime.datetime.now().time()
+    return "L'ora attuale è " + ora.strftime("%H:%M")
+
+def come_ti_chiami():
+    return "Mi chiamo Assistente Virtuale"
+
+DOMANDE = {
+    "Qual è la data di oggi?": data_di_oggi,
+    "Che ore sono?": ora_attuale,
+    "Come ti chiami?": come_ti_chiami,
+}
+#le domande vengono normalizzate una volta sola, qui: trovare la risposta è una ricerca nel dizionario
+INTENTI = {normalizza(domanda): funzione for domanda, funzione in DOMANDE.items()}
+NON_CAPITO = "Non ho capito la tua domanda."
 
 def assistente_virtuale(comando):
-    if comando == "Qual è la data di oggi?".lower().strip():
-        oggi = datetime.datetime.today()
-        risposta = "La data di oggi è " + oggi.strftime("%d/%m/%Y")
-    elif comando == "Che ore sono?".lower().strip():
-        ora_attuale = datetime.datetime.now().time()
-        risposta = "L'ora attuale è " + ora_attuale.strftime("%H:%M")
-    elif comando == "Come ti chiami?".lower().strip():
-        risposta = "Mi chiamo Assistente Virtuale"
+    funzione = INTENTI.get(normalizza(comando))
+    return funzione() if funzione is not None else NON_CAPITO
+
+# ---MODALITÀ BATCH---
+def rispondi_a_lotti(ingresso, uscita):
+    """Una domanda per riga da 'ingresso', una risposta per riga su 'uscita'; si ferma a "esci" o alla fine."""
+    risposte = 0
+    for riga in ingresso:
+        comando = normalizza(riga)
+        if comando == "esci":
+            break
+        uscita.write(assistente_virtuale(comando) + "\n")
+        risposte += 1
+    uscita.flush()
+    return risposte
+
+# ---SERVER---
+#protocollo a righe: il client manda una domanda per riga (UTF-8) e riceve una risposta per riga
+RIGA_TROPPO_LUNGA = "Domanda troppo lunga, chiudo la connessione."
+
+async def gestisci_client(reader, writer):
+    try:
+        while True:
+            try:
+                riga = await reader.readline()
+            except ValueError:
+                #riga oltre il limite dello StreamReader (64 KiB): il resto non si può più allineare alle righe
+                writer.write((RIGA_TROPPO_LUNGA + "\n").encode())
+                await writer.drain()
+                break
+            if not riga:
+                break
+            comando = normalizza(riga.decode("utf-8", "replace"))
+            if comando == "esci":
+                writer.write("Arrivederci!\n".encode())
+                break
+            writer.write((assistente_virtuale(comando) + "\n").encode())
+            #drain aspetta solo se il client non legge e il buffer di uscita è pieno
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def avvia_server(host="127.0.0.1", porta=PORTA_DEFAULT, percorso_unix=None):
+    import asyncio
+    if percorso_unix:
+        server = await asyncio.start_unix_server(gestisci_client, percorso_unix)
+        print(f"Assistente in ascolto su {percorso_unix}", file=sys.stderr)
     else:
-        risposta = "Non ho capito la tua domanda."
-    return risposta
+        server = await asyncio.start_server(gestisci_client, host, porta)
+        print(f"Assistente in ascolto su {host}:{porta}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+def indirizzo(testo):
+    """"[HOST:]PORTA" -> (host, porta); per argparse, che con un valore sbagliato stampa l'uso ed esce."""
+    import argparse
+    host, _, porta = testo.rpartition(":")
+    try:
+        porta = int(porta)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"porta non valida: {porta!r}") from None
+    if not 0 <= porta <= 65535:
+        raise argparse.ArgumentTypeError(f"porta fuori intervallo (0-65535): {porta}")
+    return host or "127.0.0.1", porta
+
+def cli(argv=None):
+    import argparse
+    import asyncio
+    parser = argparse.ArgumentParser(description="Assistente virtuale: server a righe o modalità batch")
+    modo = parser.add_mutually_exclusive_group(required=True)
+    modo.add_argument("--server", metavar="[HOST:]PORTA", nargs="?", const=str(PORTA_DEFAULT), type=indirizzo,
+                      help=f"server TCP (default 127.0.0.1:{PORTA_DEFAULT})")
+    modo.add_argument("--unix", metavar="PERCORSO", help="server su un socket Unix")
+    modo.add_argument("--batch", metavar="FILE", help="legge le domande da un file ('-' = stdin)")
+    args = parser.parse_args(argv)
+
+    if args.batch:
+        if args.batch == "-":
+            rispondi_a_lotti(sys.stdin, sys.stdout)
+        else:
+            with open(args.batch, encoding="utf-8") as f:
+                rispondi_a_lotti(f, sys.stdout)
+        return 0
+
+    host, porta = args.server or ("127.0.0.1", PORTA_DEFAULT)
+    try:
+        asyncio.run(avvia_server(host, porta, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+# ---ASSISTENTE INTERATTIVO---
+def menu():
+    print ('''
+       Benvenuto/a! Sono un Assistente Virtuale.
 
-print ('''
-       Benvenuto/a! Sono un Assistente Virtuale. 
-       
        Queste sono le funzionalità che posso offrire:
        - Qual è la data di oggi?
        - Che ore sono?
        - Come ti chiami
        Se vuoi uscire baste digitare "esci"
        ''')
-while True:
-    comando_utente = input("Cosa vuoi sapere? ")
-    newComando = comando_utente.lower().strip()
-    if newComando == "esci":
-        print("Arrivederci!")
-        break
-    else:
-        print(assistente_virtuale(newComando))
+    while True:
+        comando_utente = input("Cosa vuoi sapere? ")
+        newComando = comando_utente.lower().strip()
+        if newComando == "esci":
+            print("Arrivederci!")
+            break
+        else:
+            print(assistente_virtuale(newComando))
+
+if __name__ == "__main__":
+    #con degli argomenti parte come server o in batch, senza argomenti è l'assistente interattivo
+    if len(sys.argv) > 1:
+        sys.exit(cli())
+    menu()
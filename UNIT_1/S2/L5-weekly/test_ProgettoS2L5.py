@@ -0,0 +1,69 @@
+import asyncio
+import io
+
+import pytest
+
+import ProgettoS2L5 as progetto
+
+
+def test_intenti_normalizzati():
+    assert progetto.assistente_virtuale("  COME TI CHIAMI?\n") == "Mi chiamo Assistente Virtuale"
+    assert progetto.assistente_virtuale("che ore sono?").startswith("L'ora attuale è ")
+    assert progetto.assistente_virtuale("chi sei?") == progetto.NON_CAPITO
+
+
+def test_batch_si_ferma_a_esci():
+    ingresso = io.StringIO("Come ti chiami?\nboh\n  Esci \nChe ore sono?\n")
+    uscita = io.StringIO()
+    assert progetto.rispondi_a_lotti(ingresso, uscita) == 2
+    assert uscita.getvalue() == "Mi chiamo Assistente Virtuale\n" + progetto.NON_CAPITO + "\n"
+
+
+def test_cli_batch_da_file(tmp_path, capsys):
+    domande = tmp_path / "domande.txt"
+    domande.write_text("Qual è la data di oggi?\n", encoding="utf-8")
+    assert progetto.cli(["--batch", str(domande)]) == 0
+    assert capsys.readouterr().out.startswith("La data di oggi è ")
+
+
+@pytest.mark.parametrize("valore", ["abc", "localhost:", "127.0.0.1:70000", "-1"])
+def test_cli_porta_non_valida(valore, capsys):
+    with pytest.raises(SystemExit) as uscita:
+        progetto.cli(["--server", valore])
+    assert uscita.value.code == 2 and "porta" in capsys.readouterr().err
+
+
+def test_indirizzo():
+    assert progetto.indirizzo("8080") == ("127.0.0.1", 8080)
+    assert progetto.indirizzo("0.0.0.0:5050") == ("0.0.0.0", 5050)
+    assert progetto.indirizzo("::1:9000") == ("::1", 9000)
+
+
+async def _con_server(dialogo):
+    server = await asyncio.start_server(progetto.gestisci_client, "127.0.0.1", 0)
+    async with server:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        try:
+            return await asyncio.wait_for(dialogo(reader, writer), 5)
+        finally:
+            writer.close()
+
+
+def test_server_a_righe():
+    async def dialogo(reader, writer):
+        writer.write("Come ti chiami?\nboh\nesci\nChe ore sono?\n".encode())
+        return (await reader.read()).decode().splitlines()   # il server chiude dopo "esci"
+
+    assert asyncio.run(_con_server(dialogo)) == ["Mi chiamo Assistente Virtuale", progetto.NON_CAPITO,
+                                                 "Arrivederci!"]
+
+
+def test_server_riga_troppo_lunga():
+    async def dialogo(reader, writer):
+        writer.write(b"Come ti chiami?\n" + b"x" * 100_000 + b"\n")
+        risposte = []
+        while riga := await reader.readline():
+            risposte.append(riga.decode().rstrip("\n"))
+        return risposte
+
+    assert asyncio.run(_con_server(dialogo)) == ["Mi chiamo Assistente Virtuale", progetto.RIGA_TROPPO_LUNGA]
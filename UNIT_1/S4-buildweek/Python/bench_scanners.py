@@ -0,0 +1,363 @@
+"""
+Benchmark riproducibile del port scanner e dell'HTTP scanner contro server finti su loopback.
+
+- "Fattoria" TCP: su un intervallo di porte alcune sono aperte (accept + close), alcune
+  "buco nero" (listener con la coda di accept piena: i SYN vengono scartati e il connect
+  va in timeout, come una porta filtrata da un firewall) e tutte le altre chiuse (RST).
+- Server HTTP/1.1 keep-alive con latenza, dimensione del corpo e risposta per verbo
+  configurabili.
+
+Ogni motore gira in un processo figlio separato, così il picco di memoria (RSS) è
+il suo. Per ciascuno si stampano probe/s, latenza p50/p99 del singolo probe e RSS di
+picco; con --salva si scrive il risultato in JSON e con --baseline lo si confronta
+con un'esecuzione precedente.
+
+Uso: python3 bench_scanners.py [--motori sync,async,...] [--porte 2000] [--richieste 1000]
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import http_scanner_v3 as http_scanner
+import port_scanner_v3 as port_scanner
+
+MOTORI_PORTE = ("sync", "async", "sweep")
+MOTORI_HTTP = ("http-nuova-conn", "http-keepalive", "http-batch", "run_scan")
+
+# Risposta del server finto per ogni verbo: (status, header extra)
+COMPORTAMENTO_VERBI = {
+    "GET": (200, {}),
+    "HEAD": (200, {}),
+    "POST": (201, {}),
+    "OPTIONS": (204, {"Allow": "GET, HEAD, POST, OPTIONS"}),
+    "PUT": (405, {"Allow": "GET, HEAD, POST, OPTIONS"}),
+    "DELETE": (403, {}),
+    "PATCH": (501, {}),
+    "TRACE": (405, {}),
+}
+
+
+# ---FATTORIA DI PORTE TCP---
+class FattoriaTCP:
+    """Listener su loopback: 'aperte' rispondono, 'buchi_neri' non rispondono, il resto è chiuso."""
+
+    def __init__(self, ips, porta_iniziale, n_porte, n_aperte, n_buchi_neri, seme=1234):
+        rnd = random.Random(seme)
+        candidate = rnd.sample(range(porta_iniziale, porta_iniziale + n_porte), n_aperte + n_buchi_neri)
+        self.ips = ips
+        self.porte = range(porta_iniziale, porta_iniziale + n_porte)
+        self.aperte = sorted(candidate[:n_aperte])
+        self.buchi_neri = sorted(candidate[n_aperte:])
+        self._listener = []
+        self._riempitivi = []   # connessioni che tengono piena la coda dei buchi neri
+        self._fermo = threading.Event()
+
+    def avvia(self):
+        for ip in self.ips:
+            for porta in self.aperte:
+                s = socket.socket()
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                s.bind((ip, porta))
+                s.listen(1024)
+                s.setblocking(False)
+                self._listener.append(s)
+            for porta in self.buchi_neri:
+                self._buco_nero(ip, porta)
+        threading.Thread(target=self._accetta, daemon=True).start()
+        return self
+
+    def _buco_nero(self, ip, porta):
+        s = socket.socket()
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((ip, porta))
+        s.listen(0)
+        self._riempitivi.append(s)
+        # Si connette finché il kernel accetta: quando la coda è piena i SYN successivi vengono ignorati
+        for _ in range(16):
+            c = socket.socket()
+            c.settimeout(0.2)
+            try:
+                c.connect((ip, porta))
+            except OSError:
+                c.close()
+                return
+            self._riempitivi.append(c)
+        raise RuntimeError(f"impossibile riempire la coda di accept di {ip}:{porta}")
+
+    def _accetta(self):
+        import selectors
+        sel = selectors.DefaultSelector()
+        for s in self._listener:
+            sel.register(s, selectors.EVENT_READ)
+        while not self._fermo.is_set():
+            for chiave, _ in sel.select(0.2):
+                try:
+                    while True:
+                        c, _ = chiave.fileobj.accept()
+                        c.close()
+                except (BlockingIOError, OSError):
+                    pass
+
+    def ferma(self):
+        self._fermo.set()
+        for s in self._listener + self._riempitivi:
+            s.close()
+
+
+# ---SERVER HTTP FINTO---
+class GestoreHTTP(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive: serve a misurare il ConnectionPool
+    disable_nagle_algorithm = True  # altrimenti header e corpo scritti separatamente aspettano il delayed ACK
+    latenza = 0.0
+    corpo = b""
+    comportamento = COMPORTAMENTO_VERBI
+
+    def _rispondi(self):
+        lunghezza = int(self.headers.get("Content-Length") or 0)
+        if lunghezza:
+            self.rfile.read(lunghezza)
+        if self.latenza:
+            time.sleep(self.latenza)
+        status, extra = self.comportamento.get(self.command, (501, {}))
+        corpo = self.corpo if status < 300 and status != 204 else b""
+        self.send_response(status)
+        for nome, valore in extra.items():
+            self.send_header(nome, valore)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(corpo)
+
+    do_GET = do_HEAD = do_POST = do_OPTIONS = do_PUT = do_DELETE = do_PATCH = do_TRACE = _rispondi
+
+    def log_message(self, *args):
+        pass
+
+
+def avvia_server_http(latenza, dimensione_corpo, comportamento):
+    gestore = type("Gestore", (GestoreHTTP,), {
+        "latenza": latenza, "corpo": b"x" * dimensione_corpo, "comportamento": comportamento,
+    })
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), gestore)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---MISURA DELLE LATENZE---
+def _cronometra(modulo, nome, latenze):
+    """Sostituisce modulo.nome con una versione che registra la durata di ogni chiamata."""
+    originale = getattr(modulo, nome)
+    if asyncio.iscoroutinefunction(originale):
+        @functools.wraps(originale)
+        async def cronometrata(*args, **kwargs):
+            inizio = time.perf_counter()
+            try:
+                return await originale(*args, **kwargs)
+            finally:
+                latenze.append(time.perf_counter() - inizio)
+    else:
+        @functools.wraps(originale)
+        def cronometrata(*args, **kwargs):
+            inizio = time.perf_counter()
+            try:
+                return originale(*args, **kwargs)
+            finally:
+                latenze.append(time.perf_counter() - inizio)
+    setattr(modulo, nome, cronometrata)
+
+
+def percentile(valori, p):
+    if not valori:
+        return 0.0
+    ordinati = sorted(valori)
+    return ordinati[min(len(ordinati) - 1, int(len(ordinati) * p / 100))]
+
+
+# ---MOTORI---
+def motore_porte(nome, cfg):
+    """Ritorna (probe eseguiti, porte aperte trovate per host, latenze)."""
+    latenze = []
+    ip = cfg["ips"][0]
+    porte = list(range(cfg["porta_iniziale"], cfg["porta_iniziale"] + cfg["n_porte"]))
+    if nome == "sync":
+        _cronometra(port_scanner, "sonda_porta", latenze)
+        rtt = port_scanner.StimatoreRTT(timeout_iniziale=cfg["timeout"])
+        trovate = [p for p in porte if port_scanner.stato_porta(ip, p, cfg["timeout"], rtt) == port_scanner.APERTA]
+        return len(latenze), {ip: trovate}, latenze
+
+    _cronometra(port_scanner, "sonda_porta_async", latenze)
+    if nome == "async":
+        trovate = asyncio.run(port_scanner.scan_ports_async(ip, porte, cfg["timeout"], cfg["concorrenza"]))
+        return len(latenze), {ip: trovate}, latenze
+    if nome == "sweep":
+        stimatori = {ip: port_scanner.StimatoreRTT(timeout_iniziale=cfg["timeout"]) for ip in cfg["ips"]}
+        trovate = asyncio.run(port_scanner.sweep_async(stimatori, porte, cfg["concorrenza"], cfg["per_host"]))
+        return len(latenze), trovate, latenze
+    raise ValueError(nome)
+
+
+def motore_http(nome, cfg):
+    """Ritorna (richieste eseguite, risposte con errore, latenze)."""
+    latenze = []
+    host, port, n = "127.0.0.1", cfg["porta_http"], cfg["richieste"]
+    verbi = http_scanner.VERBS_TO_TEST
+    errori = 0
+    _cronometra(http_scanner, "send_http_request", latenze)
+
+    if nome in ("http-nuova-conn", "http-keepalive"):
+        pool = http_scanner.ConnectionPool() if nome == "http-keepalive" else None
+        for i in range(n):
+            try:   # come run_scan: un errore conta come risposta fallita, non ferma il processo figlio
+                http_scanner.send_http_request(host, port, verbi[i % len(verbi)], f"/p{i}", cfg["timeout"], pool)
+            except Exception:
+                errori += 1
+        if pool is not None:
+            pool.close()
+    elif nome == "http-batch":
+        percorsi = [f"/p{i}" for i in range(max(1, n // len(verbi)))]
+        for r in http_scanner.iter_batch([(host, port)], percorsi, cfg["timeout"], cfg["workers"], cfg["per_host_http"]):
+            errori += not r.get("ok")
+    elif nome == "run_scan":
+        cartella = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:   # run_scan scrive un report .txt nella cartella corrente
+            os.chdir(tmp)
+            try:
+                for i in range(max(1, n // len(verbi))):
+                    risultati, _ = http_scanner.run_scan(host, port, f"/p{i}", cfg["timeout"], lambda msg: None)
+                    errori += sum(not r.get("ok") for r in risultati)
+            finally:
+                os.chdir(cartella)
+    else:
+        raise ValueError(nome)
+    return len(latenze), errori, latenze
+
+
+def _figlio(nome, cfg, uscita):
+    """Esegue un motore nel processo figlio e manda indietro le misure."""
+    inizio = time.perf_counter()
+    if nome in MOTORI_PORTE:
+        operazioni, esito, latenze = motore_porte(nome, cfg)
+        attese = {ip: cfg["aperte"] for ip in cfg["ips"]} if nome == "sweep" else {cfg["ips"][0]: cfg["aperte"]}
+        corretto = {ip: sorted(p) for ip, p in esito.items()} == attese
+        nota = "porte aperte corrette" if corretto else f"porte aperte DIVERSE: {esito}"
+    else:
+        operazioni, errori, latenze = motore_http(nome, cfg)
+        corretto = errori == 0
+        nota = "nessun errore" if corretto else f"{errori} errori"
+    durata = time.perf_counter() - inizio
+    uscita.send({
+        "motore": nome,
+        "operazioni": operazioni,
+        "secondi": durata,
+        "al_secondo": operazioni / durata if durata else 0.0,
+        "p50_ms": percentile(latenze, 50) * 1000,
+        "p99_ms": percentile(latenze, 99) * 1000,
+        "rss_picco_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KiB su Linux
+        "corretto": corretto,
+        "nota": nota,
+    })
+    uscita.close()
+
+
+def esegui_motore(nome, cfg):
+    ricevi, invia = multiprocessing.Pipe(duplex=False)
+    processo = multiprocessing.get_context("fork").Process(target=_figlio, args=(nome, cfg, invia))
+    processo.start()
+    invia.close()
+    risultato = ricevi.recv()
+    processo.join()
+    return risultato
+
+
+def stampa_risultati(risultati, baseline=None):
+    print(f"\n{'motore':<16} {'operazioni':>10} {'s':>7} {'op/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>7}  verifica")
+    for r in risultati:
+        riga = (f"{r['motore']:<16} {r['operazioni']:>10,} {r['secondi']:>7.2f} {r['al_secondo']:>10,.0f} "
+                f"{r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['rss_picco_mb']:>7.1f}  {r['nota']}")
+        prima = (baseline or {}).get(r["motore"])
+        if prima and prima["al_secondo"]:
+            riga += f"  ({(r['al_secondo'] / prima['al_secondo'] - 1) * 100:+.1f}% op/s rispetto alla baseline)"
+        print(riga)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark di port scanner e HTTP scanner su loopback")
+    parser.add_argument("--motori", default=",".join(MOTORI_PORTE + MOTORI_HTTP),
+                        help="motori da misurare, separati da virgola (default: tutti)")
+    parser.add_argument("--porta-iniziale", type=int, default=20000)
+    parser.add_argument("--porte", type=int, default=2000, help="ampiezza dell'intervallo scansionato")
+    parser.add_argument("--aperte", type=int, default=20)
+    parser.add_argument("--buchi-neri", type=int, default=5, help="porte che non rispondono (timeout)")
+    parser.add_argument("--host", type=int, default=4, help="indirizzi 127.0.0.x per lo sweep")
+    parser.add_argument("--concorrenza", type=int, default=port_scanner.CONCORRENZA_DEFAULT)
+    parser.add_argument("--per-host", type=int, default=port_scanner.PER_HOST_DEFAULT)
+    parser.add_argument("--timeout", type=float, default=0.3, help="timeout iniziale dei probe TCP")
+    parser.add_argument("--richieste", type=int, default=1000, help="richieste HTTP per motore")
+    parser.add_argument("--latenza-ms", type=float, default=1.0, help="latenza del server HTTP finto")
+    parser.add_argument("--corpo", type=int, default=4096, help="byte del corpo delle risposte 2xx")
+    parser.add_argument("--verbo", action="append", default=[], metavar="VERBO=STATUS",
+                        help="cambia la risposta del server per un verbo, es. PUT=200 (ripetibile)")
+    parser.add_argument("--workers", type=int, default=http_scanner.DEFAULT_WORKERS)
+    parser.add_argument("--per-host-http", type=int, default=8)
+    parser.add_argument("--salva", metavar="FILE.json", help="salva i risultati (da usare poi come --baseline)")
+    parser.add_argument("--baseline", metavar="FILE.json", help="confronta con i risultati di un'esecuzione precedente")
+    args = parser.parse_args(argv)
+
+    motori = [m.strip() for m in args.motori.split(",") if m.strip()]
+    sconosciuti = [m for m in motori if m not in MOTORI_PORTE + MOTORI_HTTP]
+    if sconosciuti:
+        parser.error(f"motori sconosciuti: {', '.join(sconosciuti)}")
+    comportamento = dict(COMPORTAMENTO_VERBI)
+    for voce in args.verbo:
+        verbo, _, status = voce.partition("=")
+        comportamento[verbo.upper()] = (int(status), {})
+
+    ips = [f"127.0.0.{i}" for i in range(1, args.host + 1)]
+    fattoria = FattoriaTCP(ips, args.porta_iniziale, args.porte, args.aperte, args.buchi_neri).avvia()
+    server = avvia_server_http(args.latenza_ms / 1000, args.corpo, comportamento)
+    print(f"[*] Fattoria TCP su {', '.join(ips)}: porte {args.porta_iniziale}-{args.porta_iniziale + args.porte - 1}, "
+          f"{args.aperte} aperte, {args.buchi_neri} buchi neri, il resto chiuse")
+    print(f"[*] Server HTTP su 127.0.0.1:{server.server_address[1]}: latenza {args.latenza_ms} ms, corpo {args.corpo} B")
+
+    cfg = {
+        "ips": ips, "porta_iniziale": args.porta_iniziale, "n_porte": args.porte, "aperte": fattoria.aperte,
+        "timeout": args.timeout, "concorrenza": args.concorrenza, "per_host": args.per_host,
+        "porta_http": server.server_address[1], "richieste": args.richieste,
+        "workers": args.workers, "per_host_http": args.per_host_http,
+    }
+    risultati = []
+    try:
+        for nome in motori:
+            print(f"[*] {nome}...", flush=True)
+            risultati.append(esegui_motore(nome, cfg))
+    finally:
+        server.shutdown()
+        fattoria.ferma()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {r["motore"]: r for r in json.load(f)["risultati"]}
+    stampa_risultati(risultati, baseline)
+
+    if args.salva:
+        with open(args.salva, "w", encoding="utf-8") as f:
+            json.dump({"parametri": vars(args), "risultati": risultati}, f, indent=2)
+        print(f"\n[*] Risultati salvati in {args.salva}")
+    return 0 if all(r["corretto"] for r in risultati) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Benchmark della decodifica del sniffer: percorso veloce (struct) contro dissezione scapy.
+
+Genera un pcap sintetico (TCP con e senza payload, padding Ethernet, VLAN, ARP,
+qualche frame IPv6/UDP da ignorare), controlla che i due percorsi producano le
+stesse righe e misura i pacchetti al secondo di ciascuno.
+
+Uso: python3 bench_sniffer.py [numero_pacchetti] [file.pcap]
+"""
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+from scapy.all import Ether
+
+import pcap_io
+import sniffer_tool4 as sniffer
+
+
+def _ip_header(src, dst, proto, payload_len):
+    return struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + payload_len, 1, 0x4000, 64, proto, 0,
+                       bytes(src), bytes(dst))
+
+
+def frame_sintetico(rnd):
+    """Un frame Ethernet casuale fra i tipi che il sniffer incontra di solito."""
+    mac_dst = bytes(rnd.getrandbits(8) for _ in range(6))
+    mac_src = bytes(rnd.getrandbits(8) for _ in range(6))
+    src = [192, 168, 1, rnd.randint(1, 254)]
+    dst = [192, 168, 1, rnd.randint(1, 254)]
+    tipo = rnd.random()
+
+    if tipo < 0.08:   # ARP who-has / is-at
+        arp = struct.pack("!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, rnd.choice((1, 2)),
+                          mac_src, bytes(src), bytes(6), bytes(dst))
+        return mac_dst + mac_src + b"\x08\x06" + arp + bytes(18)   # padding a 60 byte
+
+    if tipo < 0.12:   # UDP (da ignorare)
+        udp = struct.pack("!HHHH", 53, rnd.randint(1024, 65535), 8 + 20, 0) + bytes(20)
+        return mac_dst + mac_src + b"\x08\x00" + _ip_header(src, dst, 17, len(udp)) + udp
+
+    if tipo < 0.14:   # IPv6 TCP (da ignorare)
+        return mac_dst + mac_src + b"\x86\xdd" + struct.pack("!IHBB", 0x60000000, 20, 6, 64) + bytes(32) + bytes(20)
+
+    payload = bytes(rnd.choice((0, 0, 0, 1, 100, 1400)))
+    opzioni = bytes(rnd.choice((0, 12)))
+    flags = rnd.choice((0x02, 0x12, 0x10, 0x18, 0x11, 0x04, 0x14))
+    tcp = struct.pack("!HHIIBBHHH", rnd.randint(1024, 65535), rnd.choice((22, 80, 443)),
+                      rnd.getrandbits(32), rnd.getrandbits(32), (5 + len(opzioni) // 4) << 4, flags,
+                      65535, 0, 0) + opzioni + payload
+    ip = _ip_header(src, dst, 6, len(tcp)) + tcp
+    ethertype = b"\x08\x00"
+    if tipo < 0.17:   # con tag VLAN
+        ethertype = b"\x81\x00" + struct.pack("!H", 10) + b"\x08\x00"
+    frame = mac_dst + mac_src + ethertype + ip
+    return frame + bytes(max(0, 60 - len(frame)))   # padding minimo Ethernet
+
+
+def scrivi_pcap(percorso, frames):
+    with open(percorso, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack("<IIII", 1700000000 + i // 1000, i % 1000 * 1000, len(frame), len(frame)))
+            f.write(frame)
+
+
+def leggi_pcap(percorso):
+    """Copia i frame in memoria (bytes) e misura la velocità di lettura di LettorePcap."""
+    with pcap_io.LettorePcap(percorso) as lettore:
+        inizio = time.perf_counter()
+        totale = sum(len(frame) for _, _, frame in lettore)
+        durata = time.perf_counter() - inizio
+        frames = [bytes(frame) for _, _, frame in lettore]
+    return frames, totale, durata
+
+
+def percorso_veloce(frames, orario):
+    righe = []
+    for frame in frames:
+        evento = sniffer.decodifica_veloce(frame)
+        if evento is sniffer.NON_DECODIFICATO:
+            evento = sniffer.evento_da_scapy(Ether(frame))
+        if evento:
+            righe.append(sniffer.formatta_evento(orario, evento))
+    return righe
+
+
+def percorso_scapy(frames, orario):
+    righe = []
+    for frame in frames:
+        evento = sniffer.evento_da_scapy(Ether(frame))
+        if evento:
+            righe.append(sniffer.formatta_evento(orario, evento))
+    return righe
+
+
+def misura(funzione, frames):
+    inizio = time.perf_counter()
+    righe = funzione(frames, "12:00:00")   # orario fisso: confrontiamo solo la decodifica
+    return righe, time.perf_counter() - inizio
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rnd = random.Random(1234)
+
+    if len(sys.argv) > 2:
+        percorso = sys.argv[2]
+    else:
+        percorso = os.path.join(tempfile.gettempdir(), "bench_sniffer.pcap")
+        scrivi_pcap(percorso, (frame_sintetico(rnd) for _ in range(n)))
+    frames, byte_letti, t_lettura = leggi_pcap(percorso)
+    print(f"[*] {len(frames)} frame da {percorso}")
+    print(f"    lettura mmap:    {byte_letti / t_lettura / 1e6:12,.0f} MB/s  ({len(frames) / t_lettura:,.0f} record/s)")
+
+    righe_veloci, t_veloce = misura(percorso_veloce, frames)
+    righe_scapy, t_scapy = misura(percorso_scapy, frames)
+
+    if righe_veloci != righe_scapy:
+        diverse = [(a, b) for a, b in zip(righe_veloci, righe_scapy) if a != b]
+        print(f"[!] Output diverso: {len(diverse)} righe, {len(righe_veloci)} contro {len(righe_scapy)}")
+        for a, b in diverse[:5]:
+            print(f"    veloce: {a}\n    scapy:  {b}")
+        sys.exit(1)
+
+    print(f"[+] Output identico: {len(righe_veloci)} righe")
+    print(f"    percorso veloce: {len(frames) / t_veloce:12,.0f} pacchetti/s")
+    print(f"    scapy:           {len(frames) / t_scapy:12,.0f} pacchetti/s")
+    print(f"    speedup:         {t_scapy / t_veloce:12.1f}x")
@@ -0,0 +1,142 @@
+"""
+Unico punto di ingresso da riga di comando per gli strumenti della build week:
+
+    python3 buildweek_cli.py portscan 192.168.50.101 -p 1-1024
+    python3 buildweek_cli.py http -t 192.168.50.101 -p /dvwa/ --format jsonl
+    python3 buildweek_cli.py sniff -r cattura.pcap -a 5
+    python3 buildweek_cli.py gui                 # wizard Tkinter dell'HTTP scanner
+    python3 buildweek_cli.py avvio               # misura il tempo di avvio di ogni sottocomando
+    python3 buildweek_cli.py --metriche m.json --profilo campioni portscan 10.0.0.0/24
+
+Le opzioni prima del sottocomando valgono per tutti: --metriche salva a fine
+esecuzione contatori e tempi raccolti da metriche.py, --profilo (cprofile o
+campioni) profila l'intera esecuzione, --profilo-file ne salva il risultato.
+
+Nessun input() interattivo: tutto passa dagli argomenti, quindi gli strumenti si
+possono lanciare da script e in cicli stretti. Ogni sottocomando importa solo il
+proprio modulo, e scapy / Tkinter vengono caricati solo dove servono davvero
+(cattura live o ripiego della decodifica, wizard grafico).
+"""
+import importlib
+import sys
+
+# sottocomando -> (modulo, funzione che riceve la lista degli argomenti, descrizione)
+SOTTOCOMANDI = {
+    "portscan": ("port_scanner_v3", "cli", "port scan TCP di un host, di più host o di una rete CIDR"),
+    "http": ("http_scanner_v3", "batch_cli", "test dei verbi HTTP su target x percorsi, con report"),
+    "sniff": ("sniffer_tool4", "cli", "sniffer ARP/TCP live o da file pcap/pcapng"),
+    "gui": ("http_scanner_v3", "start_gui", "wizard grafico (Tkinter) dell'HTTP scanner"),
+}
+
+# opzione -> chiave; vanno scritte prima del sottocomando
+OPZIONI_GLOBALI = {"--metriche": "metriche", "--profilo": "profilo", "--profilo-file": "profilo_file"}
+MODI_PROFILO = ("cprofile", "campioni")
+
+# ---BUDGET DI AVVIO---
+BUDGET_AVVIO_MS = 150          # tempo massimo per "<sottocomando> --help", interprete compreso
+RIPETIZIONI_AVVIO = 5
+MODULI_PESANTI = ("scapy", "tkinter")   # non devono essere importati solo per partire
+
+
+def _uso():
+    righe = [
+        "uso: buildweek_cli.py [--metriche FILE.json] [--profilo cprofile|campioni] [--profilo-file FILE]",
+        "                      <sottocomando> [argomenti...]", "", "sottocomandi:",
+    ]
+    righe += [f"  {nome:<10} {descrizione}" for nome, (_, _, descrizione) in SOTTOCOMANDI.items()]
+    righe.append(f"  {'avvio':<10} misura l'avvio dei sottocomandi (budget {BUDGET_AVVIO_MS} ms)")
+    righe += ["", "'buildweek_cli.py <sottocomando> --help' per le opzioni di ciascuno."]
+    return "\n".join(righe)
+
+
+def misura_avvio(sottocomando, ripetizioni=RIPETIZIONI_AVVIO):
+    """
+    Lancia "<sottocomando> --help" in un nuovo interprete: ritorna il tempo migliore in ms
+    e i moduli pesanti importati (da -X importtime, senza dover eseguire il comando vero).
+    """
+    import subprocess
+    import time
+
+    comando = [sys.executable, __file__, sottocomando, "--help"]
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        subprocess.run(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tempi.append((time.perf_counter() - inizio) * 1000)
+
+    traccia = subprocess.run([sys.executable, "-X", "importtime"] + comando[1:],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    importati = {riga.rsplit("|", 1)[-1].strip() for riga in traccia.splitlines() if riga.startswith("import time:")}
+    pesanti = sorted(m for m in importati if m.split(".")[0] in MODULI_PESANTI)
+    return min(tempi), pesanti
+
+
+def avvio(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="avvio", description="Controlla che ogni sottocomando parta entro il budget")
+    parser.add_argument("--budget", type=float, default=BUDGET_AVVIO_MS, help=f"millisecondi (default {BUDGET_AVVIO_MS})")
+    parser.add_argument("-n", "--ripetizioni", type=int, default=RIPETIZIONI_AVVIO)
+    args = parser.parse_args(argv)
+
+    fuori_budget = 0
+    for nome in SOTTOCOMANDI:
+        if nome == "gui":
+            continue          # Tkinter è il suo scopo: non ha senso misurarne l'avvio "leggero"
+        ms, pesanti = misura_avvio(nome, args.ripetizioni)
+        ok = ms <= args.budget and not pesanti
+        fuori_budget += not ok
+        nota = f"  importa {', '.join(pesanti)}" if pesanti else ""
+        print(f"[{'+' if ok else '!'}] {nome:<10} {ms:7.1f} ms  (budget {args.budget:.0f} ms){nota}")
+    return 1 if fuori_budget else 0
+
+
+def _opzioni_globali(argv):
+    """Separa le opzioni comuni (prima del sottocomando) dal resto della riga di comando."""
+    opzioni = {}
+    while argv and argv[0] in OPZIONI_GLOBALI:
+        if len(argv) < 2:
+            raise ValueError(f"manca il valore di {argv[0]}")
+        opzioni[OPZIONI_GLOBALI[argv[0]]] = argv[1]
+        argv = argv[2:]
+    if opzioni.get("profilo", MODI_PROFILO[0]) not in MODI_PROFILO:
+        raise ValueError(f"--profilo deve essere uno fra: {', '.join(MODI_PROFILO)}")
+    return opzioni, argv
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        opzioni, argv = _opzioni_globali(argv)
+    except ValueError as e:
+        print(f"errore: {e}\n\n{_uso()}", file=sys.stderr)
+        return 2
+    if not argv or argv[0] in ("-h", "--help"):
+        print(_uso())
+        return 0 if argv else 2
+
+    nome, argomenti = argv[0], argv[1:]
+    if nome == "avvio":
+        return avvio(argomenti)
+    if nome not in SOTTOCOMANDI:
+        print(f"sottocomando sconosciuto: {nome}\n\n{_uso()}", file=sys.stderr)
+        return 2
+
+    modulo, funzione, _ = SOTTOCOMANDI[nome]
+    esegui = getattr(importlib.import_module(modulo), funzione)
+    if not opzioni:
+        return (esegui() if nome == "gui" else esegui(argomenti)) or 0
+
+    import metriche
+    if "metriche" in opzioni:
+        metriche.attiva()
+    try:
+        with metriche.profila(opzioni.get("profilo"), opzioni.get("profilo_file")):
+            return (esegui() if nome == "gui" else esegui(argomenti)) or 0
+    finally:
+        if "metriche" in opzioni:
+            print(f"[*] Metriche salvate in {metriche.registro.salva_json(opzioni['metriche'])}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
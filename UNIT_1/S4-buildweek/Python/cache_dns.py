@@ -0,0 +1,158 @@
+"""
+Cache DNS condivisa da port scanner e HTTP scanner.
+
+socket.gethostbyname / HTTPConnection risolvono il nome a ogni chiamata, in modo
+bloccante: in uno sweep o in un batch HTTP lo stesso hostname veniva risolto
+decine di volte. Qui ogni nome viene risolto una volta sola e tenuto in memoria:
+
+- TTL positivo (default 300 s) e negativo (30 s) per i nomi inesistenti; gli errori
+  temporanei (server DNS che non risponde) non vengono messi in cache;
+- richieste contemporanee dello stesso nome aspettano un'unica risoluzione;
+- risolvi_molti() risolve una lista di target in parallelo su un pool di thread,
+  risolvi_async() fa lo stesso dentro un event loop senza bloccarlo.
+
+getaddrinfo non espone il TTL vero dei record, quindi i TTL sono fissi e configurabili.
+"""
+import concurrent.futures
+import ipaddress
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+import metriche
+
+TTL_DEFAULT = 300.0
+TTL_NEGATIVO_DEFAULT = 30.0
+MAX_VOCI_DEFAULT = 4096
+WORKER_DEFAULT = 16
+
+# Errori "il nome non esiste": si possono ricordare. Gli altri (EAI_AGAIN, ...) sono temporanei.
+ERRORI_DEFINITIVI = {socket.EAI_NONAME} | ({socket.EAI_NODATA} if hasattr(socket, "EAI_NODATA") else set())
+
+
+class CacheDNS:
+    """
+    Nome -> indirizzo IP (stringa). Le voci sono in un OrderedDict in ordine di uso:
+    oltre 'max_voci' si scarta la meno usata di recente.
+    """
+
+    def __init__(self, ttl=TTL_DEFAULT, ttl_negativo=TTL_NEGATIVO_DEFAULT, max_voci=MAX_VOCI_DEFAULT):
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.max_voci = max_voci
+        self._voci = OrderedDict()   # (nome, famiglia) -> (scadenza, ip oppure eccezione)
+        self._in_corso = {}          # (nome, famiglia) -> Event di chi sta risolvendo
+        self._lock = threading.Lock()
+
+    def risolvi(self, nome, famiglia=socket.AF_INET):
+        """
+        Ritorna l'IP di 'nome' (gli IP letterali tornano così come sono).
+        Solleva socket.gaierror come socket.gethostbyname se il nome non si risolve.
+        """
+        try:
+            return str(ipaddress.ip_address(nome))
+        except ValueError:
+            pass
+
+        chiave = (nome.lower(), famiglia)
+        m = metriche.registro
+        while True:
+            with self._lock:
+                voce = self._voci.get(chiave)
+                if voce is not None:
+                    scadenza, valore = voce
+                    if scadenza > time.monotonic():
+                        self._voci.move_to_end(chiave)
+                        m.conta("dns.hit")
+                        if isinstance(valore, Exception):
+                            raise socket.gaierror(valore.errno, valore.strerror)
+                        return valore
+                    del self._voci[chiave]
+                attesa = self._in_corso.get(chiave)
+                if attesa is None:
+                    self._in_corso[chiave] = threading.Event()
+                    break
+            attesa.wait()   # un altro thread sta già risolvendo lo stesso nome: usiamo il suo risultato
+
+        m.conta("dns.miss")
+        try:
+            with m.cronometro("dns.risoluzione_s"):
+                info = socket.getaddrinfo(nome, None, famiglia, socket.SOCK_STREAM)
+            # Con AF_UNSPEC preferiamo IPv4: i bersagli del corso (e molti servizi) ascoltano solo lì
+            valore = next((i[4][0] for i in info if i[0] == socket.AF_INET), info[0][4][0])
+            ttl = self.ttl
+        except socket.gaierror as e:
+            valore, ttl = e, (self.ttl_negativo if e.errno in ERRORI_DEFINITIVI else 0)
+            m.conta("dns.errori")
+        finally:
+            with self._lock:
+                self._in_corso.pop(chiave).set()
+
+        if ttl:
+            with self._lock:
+                self._voci[chiave] = (time.monotonic() + ttl, valore)
+                self._voci.move_to_end(chiave)
+                while len(self._voci) > self.max_voci:
+                    self._voci.popitem(last=False)
+        if isinstance(valore, Exception):
+            raise valore
+        return valore
+
+    def risolvi_molti(self, nomi, famiglia=socket.AF_INET, workers=WORKER_DEFAULT):
+        """
+        Risolve in parallelo e ritorna {nome: ip}, con None per i nomi non risolvibili.
+        I nomi ripetuti vengono risolti una volta sola.
+        """
+        unici = list(dict.fromkeys(nomi))
+        risultati = {}
+        da_risolvere = []
+        for nome in unici:
+            try:
+                risultati[nome] = str(ipaddress.ip_address(nome))
+            except ValueError:
+                da_risolvere.append(nome)
+        if not da_risolvere:
+            return risultati
+
+        def uno(nome):
+            try:
+                return self.risolvi(nome, famiglia)
+            except socket.gaierror:
+                return None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(da_risolvere))) as pool:
+            risultati.update(zip(da_risolvere, pool.map(uno, da_risolvere)))
+        return risultati
+
+    async def risolvi_async(self, nome, famiglia=socket.AF_INET):
+        """risolvi() senza bloccare l'event loop (la risoluzione gira nel thread pool del loop)."""
+        try:
+            return str(ipaddress.ip_address(nome))
+        except ValueError:
+            pass
+        import asyncio   # solo qui: http_scanner_v3 non deve pagare l'import di asyncio all'avvio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.risolvi, nome, famiglia)
+
+    async def risolvi_molti_async(self, nomi, famiglia=socket.AF_INET):
+        import asyncio
+        unici = list(dict.fromkeys(nomi))
+        esiti = await asyncio.gather(*(self.risolvi_async(n, famiglia) for n in unici), return_exceptions=True)
+        return {nome: (None if isinstance(esito, Exception) else esito) for nome, esito in zip(unici, esiti)}
+
+    def svuota(self):
+        with self._lock:
+            self._voci.clear()
+
+
+# Cache unica per tutto il processo: la usano sia port_scanner_v3 sia http_scanner_v3
+cache = CacheDNS()
+
+
+def risolvi(nome, famiglia=socket.AF_INET):
+    return cache.risolvi(nome, famiglia)
+
+
+def risolvi_molti(nomi, famiglia=socket.AF_INET, workers=WORKER_DEFAULT):
+    return cache.risolvi_molti(nomi, famiglia, workers)
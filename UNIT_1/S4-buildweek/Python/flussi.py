@@ -0,0 +1,215 @@
+"""
+Tabella dei flussi TCP per il sniffer: invece di stampare una riga per pacchetto
+(la print diventa il collo di bottiglia già a poche migliaia di pacchetti/s) si
+aggregano i pacchetti per 5-tupla e ogni N secondi si stampa un riepilogo con i
+flussi e gli host più attivi.
+
+La memoria è limitata: oltre 'max_flussi' si scarta il flusso usato meno di
+recente (LRU) e i flussi fermi da più di 'timeout_inattivi' secondi vengono chiusi.
+"""
+import heapq
+import json
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+MAX_FLUSSI_DEFAULT = 65536
+TIMEOUT_INATTIVI_DEFAULT = 120.0
+INTERVALLO_DEFAULT = 5.0
+TOP_DEFAULT = 10
+
+
+class Flusso:
+    __slots__ = ("primo", "ultimo", "pacchetti", "byte", "syn", "fin", "rst")
+
+    def __init__(self, ts):
+        self.primo = ts
+        self.ultimo = ts
+        self.pacchetti = 0
+        self.byte = 0
+        self.syn = self.fin = self.rst = 0
+
+    def flags(self):
+        return "".join(lettera for lettera, n in (("S", self.syn), ("F", self.fin), ("R", self.rst)) if n)
+
+
+class TabellaFlussi:
+    """
+    Flussi TCP indicizzati per (ip_src, sport, ip_dst, dport, "TCP").
+    L'OrderedDict è tenuto in ordine di ultimo pacchetto visto: il primo elemento è
+    sempre il candidato per l'espulsione LRU e per il timeout di inattività.
+    """
+
+    def __init__(self, max_flussi=MAX_FLUSSI_DEFAULT, timeout_inattivi=TIMEOUT_INATTIVI_DEFAULT):
+        self.max_flussi = max_flussi
+        self.timeout_inattivi = timeout_inattivi
+        self.flussi = OrderedDict()
+        self.scaduti = 0      # chiusi per inattività
+        self.espulsi = 0      # scartati perché la tabella era piena
+
+    def aggiorna(self, ts, ip_src, sport, ip_dst, dport, flags, lunghezza):
+        chiave = (ip_src, sport, ip_dst, dport, "TCP")
+        flusso = self.flussi.get(chiave)
+        if flusso is None:
+            if len(self.flussi) >= self.max_flussi:
+                self.flussi.popitem(last=False)
+                self.espulsi += 1
+            flusso = self.flussi[chiave] = Flusso(ts)
+        else:
+            self.flussi.move_to_end(chiave)
+        flusso.ultimo = ts
+        flusso.pacchetti += 1
+        flusso.byte += lunghezza
+        if "S" in flags:
+            flusso.syn += 1
+        if "F" in flags:
+            flusso.fin += 1
+        if "R" in flags:
+            flusso.rst += 1
+        return flusso
+
+    def scadenza(self, ora):
+        """Chiude i flussi senza pacchetti da più di timeout_inattivi secondi."""
+        limite = ora - self.timeout_inattivi
+        flussi = self.flussi
+        while flussi:
+            chiave = next(iter(flussi))
+            if flussi[chiave].ultimo >= limite:
+                break
+            del flussi[chiave]
+            self.scaduti += 1
+
+    def top_flussi(self, n=TOP_DEFAULT):
+        # nlargest tiene solo n elementi: niente ordinamento dell'intera tabella a ogni riepilogo
+        return heapq.nlargest(n, self.flussi.items(), key=lambda voce: voce[1].byte)
+
+
+class Aggregatore:
+    """
+    Riceve gli eventi del sniffer (le tuple di decodifica_veloce) al posto della
+    print e ogni 'intervallo' secondi, misurati sull'ora dei pacchetti (quindi
+    funziona anche rileggendo un pcap), stampa o esporta un riepilogo.
+    'esporta' è un file JSON Lines a cui viene aggiunta una riga per riepilogo.
+    Nella cattura live avvia_timer() fa uscire il riepilogo anche quando sul link
+    non passa nulla: un thread controlla l'orologio al posto dei pacchetti.
+    """
+
+    def __init__(self, intervallo=INTERVALLO_DEFAULT, top=TOP_DEFAULT, esporta=None,
+                 max_flussi=MAX_FLUSSI_DEFAULT, timeout_inattivi=TIMEOUT_INATTIVI_DEFAULT, uscita=None):
+        self.tabella = TabellaFlussi(max_flussi, timeout_inattivi)
+        self.intervallo = intervallo
+        self.top = top
+        self.esporta = esporta
+        self.uscita = uscita or sys.stdout
+        self.inizio_intervallo = None
+        self.errore = None                # es. BrokenPipeError del timer: lo rilancia registra()
+        self._lock = threading.Lock()     # registra() e il timer arrivano da thread diversi
+        self._fermo = threading.Event()
+        self._timer = None
+        self._azzera_intervallo()
+
+    def _azzera_intervallo(self):
+        self.pacchetti = 0
+        self.byte = 0
+        self.arp = 0
+        self.talker = Counter()   # byte inviati per IP sorgente nell'intervallo
+
+    def registra(self, ts, evento, lunghezza):
+        if self.errore is not None:
+            raise self.errore
+        with self._lock:
+            if self.inizio_intervallo is None:
+                self.inizio_intervallo = ts
+            elif ts - self.inizio_intervallo >= self.intervallo:
+                self.riepilogo(ts)
+
+            self.pacchetti += 1
+            self.byte += lunghezza
+            if evento[0] == "ARP":
+                self.arp += 1
+                return
+            _, src, sport, dst, dport, flags, _ = evento
+            self.talker[src] += lunghezza
+            self.tabella.aggiorna(ts, src, sport, dst, dport, flags, lunghezza)
+
+    # ---------- timer per la cattura live ----------
+    def avvia_timer(self):
+        """Riepiloghi a tempo anche senza pacchetti (solo live: usa l'orologio, non l'ora dei pacchetti)."""
+        with self._lock:
+            if self.inizio_intervallo is None:
+                self.inizio_intervallo = time.time()
+        self._timer = threading.Thread(target=self._giro_timer, daemon=True)
+        self._timer.start()
+        return self
+
+    def _giro_timer(self):
+        while not self._fermo.wait(min(self.intervallo, 1.0)):
+            try:
+                self.scadenza(time.time())
+            except OSError as e:       # stdout chiuso (es. "| head") o file di esportazione non scrivibile
+                self.errore = e
+                return
+
+    def scadenza(self, ora):
+        """Chiude l'intervallo se sono passati 'intervallo' secondi, anche se non è arrivato nessun pacchetto."""
+        with self._lock:
+            if self.inizio_intervallo is not None and ora - self.inizio_intervallo >= self.intervallo:
+                self.riepilogo(ora)
+
+    def riepilogo(self, ora):
+        """Stampa/esporta il riepilogo dell'intervallo appena chiuso e ne apre uno nuovo."""
+        self.tabella.scadenza(ora)
+        dati = {
+            "ts": ora,
+            "intervallo": ora - self.inizio_intervallo if self.inizio_intervallo is not None else 0.0,
+            "pacchetti": self.pacchetti,
+            "byte": self.byte,
+            "arp": self.arp,
+            "flussi_attivi": len(self.tabella.flussi),
+            "flussi_scaduti": self.tabella.scaduti,
+            "flussi_espulsi": self.tabella.espulsi,
+            "top_talker": [{"ip": ip, "byte": byte} for ip, byte in self.talker.most_common(self.top)],
+            "top_flussi": [
+                {"src": f"{src}:{sport}", "dst": f"{dst}:{dport}", "pacchetti": f.pacchetti,
+                 "byte": f.byte, "flags": f.flags(), "primo": f.primo, "ultimo": f.ultimo}
+                for (src, sport, dst, dport, _), f in self.tabella.top_flussi(self.top)
+            ],
+        }
+        self.uscita.write(formatta_riepilogo(dati))
+        self.uscita.flush()
+        if self.esporta:
+            with open(self.esporta, "a", encoding="utf-8") as f:
+                f.write(json.dumps(dati) + "\n")
+        self.inizio_intervallo = ora
+        self._azzera_intervallo()
+        return dati
+
+    def chiudi(self):
+        """Ferma il timer e stampa il riepilogo finale con i pacchetti dell'ultimo intervallo parziale."""
+        self._fermo.set()
+        if self._timer is not None:
+            self._timer.join()
+        with self._lock:
+            if self.inizio_intervallo is not None and self.pacchetti:
+                self.riepilogo(max(f.ultimo for f in self.tabella.flussi.values())
+                               if self.tabella.flussi else self.inizio_intervallo)
+
+
+def formatta_riepilogo(dati):
+    orario = datetime.fromtimestamp(dati["ts"]).strftime("%H:%M:%S")
+    durata = dati["intervallo"] or 1.0
+    righe = [
+        f"===== {orario} | {dati['pacchetti']} pacchetti ({dati['pacchetti'] / durata:,.0f}/s), "
+        f"{dati['byte']:,} byte, {dati['arp']} ARP | flussi attivi {dati['flussi_attivi']} "
+        f"(scaduti {dati['flussi_scaduti']}, espulsi {dati['flussi_espulsi']}) =====",
+        "  TOP TALKER (byte inviati nell'intervallo)",
+    ]
+    righe += [f"    {t['ip']:<16} {t['byte']:>14,}" for t in dati["top_talker"]]
+    righe.append("  TOP FLUSSI (byte totali)")
+    righe += [
+        f"    {f['src']:<22} -> {f['dst']:<22} {f['pacchetti']:>9,} pkt {f['byte']:>14,} B  [{f['flags']}]"
+        for f in dati["top_flussi"]
+    ]
+    return "\n".join(righe) + "\n"
@@ -6,19 +6,38 @@ Features:
 - Tests HTTP verbs: GET, POST, HEAD, PUT, DELETE, OPTIONS, PATCH
 - Simple step-by-step GUI wizard (host, port, path)
 - Saves a .txt report with status line, headers, and a short body preview
+- Reuses one keep-alive connection per target across all verbs
+- Batch CLI: verb x path x target matrix on a worker pool, results streamed as they finish
+  e.g. python3 http_scanner_v3.py -t 192.168.1.16 -P paths.txt --workers 32 --per-host 4
+- Reports are streamed to disk as results arrive: .txt, .jsonl and/or .csv (--format)
+- Identical responses are fingerprinted and reported once; bodies are stored once by digest
 - Commented sections for study/maintenance
 
 Use only on systems you own / have permission to test (e.g., Metasploitable/DVWA).
 """
 
+import codecs
+import collections
+import concurrent.futures
+import csv
 import datetime
+import hashlib
 import json
 import os
+import queue
+import shutil
+import socket
+import sys
+import tempfile
 import threading
+import time
 import traceback
 import urllib.parse
 import http.client
 
+import cache_dns
+import metriche
+
 # -----------------------------
 # Config: verbs + defaults
 # -----------------------------
@@ -27,8 +46,30 @@ DEFAULT_PORT = 80
 DEFAULT_PATH = "/"
 DEFAULT_TIMEOUT_SEC = 8
 
+# GUI log window: refresh interval and max lines kept in the widget
+LOG_POLL_MS = 50
+LOG_MAX_LINES = 5000
+
+# Batch mode: total concurrent requests and max concurrent requests per host:port
+DEFAULT_WORKERS = 32
+DEFAULT_PER_HOST = 4
+
 # How much of the response body to store in the report (avoid huge dumps)
 BODY_PREVIEW_CHARS = 1200
+# Distinct bodies kept by the process-wide body_store (least recently seen dropped first)
+BODY_STORE_MAX_ENTRIES = 1024
+
+# Streaming body reads: only the preview is kept in memory, the rest is counted
+# and discarded. Past these limits the connection is dropped instead of drained.
+BODY_READ_CHUNK = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BODY_SECONDS = 10
+
+# Response fingerprint = status + these headers + body digest. Volatile headers
+# (Date, ETag, cookie values...) are left out so the same page collapses into one.
+FINGERPRINT_HEADERS = ("Allow", "Content-Type", "Location", "Server", "WWW-Authenticate")
+# How many requests are listed under each fingerprint in the .txt report
+GROUP_SAMPLE_REQUESTS = 10
 
 
 # -----------------------------
@@ -51,24 +92,242 @@ def safe_filename(s: str) -> str:
     return "".join(keep)
 
 
+# -----------------------------
+# Response headers (case-insensitive, multi-value)
+# -----------------------------
+class HeaderIndex:
+    """
+    Built once per response. Keeps every (name, value) pair in arrival order, so
+    repeated headers such as Set-Cookie are not lost, plus a lowercase-name index
+    so lookups are O(1) instead of a scan over all headers.
+    """
+
+    def __init__(self, pairs=()):
+        self._pairs = []
+        self._index = {}
+        for name, value in pairs:
+            self.add(name, value)
+
+    def add(self, name: str, value: str) -> None:
+        self._pairs.append((name, value))
+        self._index.setdefault(name.lower(), []).append(value)
+
+    def get(self, name: str, default: str = "") -> str:
+        """All values of a header joined with ", " (RFC 9110 list syntax)."""
+        values = self._index.get(name.lower())
+        return ", ".join(values) if values else default
+
+    def get_all(self, name: str) -> list:
+        """Every value of a repeated header, e.g. get_all("Set-Cookie")."""
+        return list(self._index.get(name.lower(), ()))
+
+    def items(self) -> list:
+        """(name, value) pairs with original case, duplicates included."""
+        return list(self._pairs)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._index
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def to_json(self) -> list:
+        return [list(pair) for pair in self._pairs]
+
+    @classmethod
+    def from_json(cls, data) -> "HeaderIndex":
+        """Accepts the list-of-pairs form written by to_json() or a plain dict."""
+        return cls(data.items() if isinstance(data, dict) else data)
+
+
+# -----------------------------
+# Body store + response fingerprints
+# -----------------------------
+class BodyStore:
+    """
+    Content-addressed store: body digest -> decoded body preview. Results only
+    carry the digest, so a 404 page returned thousands of times is decoded and
+    kept once; memory grows with the number of distinct bodies, not requests.
+    With max_entries the least recently seen bodies are dropped past that count.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries
+        self._previews = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, digest: str, preview: str) -> bool:
+        """Stores the preview under digest; returns False if it was already there."""
+        with self._lock:
+            if digest in self._previews:
+                return False
+            self._previews[digest] = preview
+            if self.max_entries is not None and len(self._previews) > self.max_entries:
+                self._previews.popitem(last=False)
+            return True
+
+    def get(self, digest: str, default: str = "") -> str:
+        return self._previews.get(digest, default)
+
+    def __contains__(self, digest: str) -> bool:
+        with self._lock:
+            if digest not in self._previews:
+                return False
+            self._previews.move_to_end(digest)   # seen again: last to be dropped
+            return True
+
+    def __len__(self) -> int:
+        return len(self._previews)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._previews.clear()
+
+
+# Default store for direct send_http_request() callers, bounded because it lives as
+# long as the process. run_scan, run_batch and render_txt_from_jsonl use a store of
+# their own, dropped when the report is written.
+body_store = BodyStore(BODY_STORE_MAX_ENTRIES)
+
+
+def body_hasher():
+    """Hash used for body digests (fed chunk by chunk while the body streams in)."""
+    return hashlib.blake2b(digest_size=16)
+
+
+def response_fingerprint(status: int, headers: HeaderIndex, body_digest: str) -> str:
+    """Short hash of status, FINGERPRINT_HEADERS, Set-Cookie names (not values) and body digest."""
+    h = hashlib.blake2b(digest_size=8)
+    h.update(str(status).encode())
+    for name in FINGERPRINT_HEADERS:
+        h.update(b"\0" + headers.get(name).encode("utf-8", "replace"))
+    cookies = sorted(c.split("=", 1)[0].strip() for c in headers.get_all("Set-Cookie"))
+    h.update(b"\0" + ",".join(cookies).encode("utf-8", "replace"))
+    h.update(b"\0" + body_digest.encode())
+    return h.hexdigest()
+
+
+def error_fingerprint(error: str) -> str:
+    """Fingerprint of a failed request: requests that failed the same way share it."""
+    return "error:" + hashlib.blake2b(error.encode(), digest_size=6).hexdigest()
+
+
+# -----------------------------
+# Keep-alive connection pool
+# -----------------------------
+# Errors that mean "the server closed the idle keep-alive connection under us".
+# On a reused connection they are retried once on a fresh one, but only for
+# idempotent methods: the server may already have processed a POST/PATCH.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class ConnectionPool:
+    """
+    Keeps idle HTTPConnection objects keyed by (host, port), so consecutive requests
+    to the same target reuse one TCP connection instead of paying a new handshake.
+    Safe to share between threads: connections are checked out/in under a lock.
+    New connections go to the address from the shared DNS cache (see open_connection).
+    """
+
+    def __init__(self, max_idle_per_host: int = 4):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str, port: int, timeout: int):
+        """Returns (conn, reused). reused=True means the socket may already be stale."""
+        with self._lock:
+            idle = self._idle.get((host, port))
+            conn = idle.pop() if idle else None
+        if conn is None:
+            return open_connection(host, port, timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def release(self, host: str, port: int, conn) -> None:
+        """Puts a connection back after its response has been fully read."""
+        with self._lock:
+            idle = self._idle.setdefault((host, port), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_connection(host: str, port: int, timeout: int) -> http.client.HTTPConnection:
+    """
+    HTTPConnection to the cached IP of host: the name is resolved once per TTL
+    instead of on every connect. The Host header still carries the name
+    (send_http_request always sets it explicitly).
+    """
+    return http.client.HTTPConnection(cache_dns.risolvi(host, socket.AF_UNSPEC), port, timeout=timeout)
+
+
 # -----------------------------
 # Core HTTP request function
 # -----------------------------
-def send_http_request(host: str, port: int, method: str, path: str, timeout: int):
+def send_http_request(host: str, port: int, method: str, path: str, timeout: int, pool: ConnectionPool = None,
+                      max_body_bytes: int = MAX_BODY_BYTES, max_body_seconds: float = MAX_BODY_SECONDS,
+                      store: BodyStore = None):
     """
     Sends a single HTTP request using http.client, returns a structured dict with:
     - status, reason, http_version
-    - headers (dict)
-    - body_len, body_preview
+    - headers (HeaderIndex)
+    - body_len, body_digest (the preview itself is in store, default body_store, once per digest)
+    - body_truncated: True if the body was cut at max_body_bytes / max_body_seconds
+      (body_len then comes from Content-Length when the server sent it)
+    - fingerprint: equal for responses with the same status, key headers and body
+
+    Without a pool every request opens its own connection and sends Connection: close.
+    With a pool the connection is kept alive and reused; if the server has silently
+    closed a reused connection, an idempotent request is retried once on a fresh one.
+
+    Time per verb, status codes and errors are recorded in metriche.registro.
     """
-    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    m = metriche.registro
+    start = time.perf_counter()
+    try:
+        result = _send_http_request(host, port, method, path, timeout, pool, max_body_bytes, max_body_seconds,
+                                    body_store if store is None else store)
+    except Exception:
+        m.conta("http.errors")
+        raise
+    finally:
+        m.osserva(f"http.request_s.{method}", time.perf_counter() - start)
+    m.conta(f"http.status.{result['status']}")
+    return result
 
-    # Basic headers: keep it simple, close connection each time (easier for lab work)
+
+def _send_http_request(host: str, port: int, method: str, path: str, timeout: int, pool: ConnectionPool,
+                       max_body_bytes: int, max_body_seconds: float, store: BodyStore):
+    # Basic headers: keep it simple
     headers = {
         "Host": host,
         "User-Agent": "Epicode-HTTP-Verb-Tester/1.0",
         "Accept": "*/*",
-        "Connection": "close",
+        "Connection": "keep-alive" if pool is not None else "close",
     }
 
     # Minimal body for methods that commonly accept a body.
@@ -80,42 +339,117 @@ def send_http_request(host: str, port: int, method: str, path: str, timeout: int
         headers["Content-Type"] = "application/json; charset=utf-8"
         headers["Content-Length"] = str(len(body))
 
-    try:
-        conn.request(method, path, body=body, headers=headers)
-        res = conn.getresponse()
-
-        raw = res.read()  # HEAD usually returns empty body
-        text = raw.decode("utf-8", errors="replace")
-
-        # res.version is an int: 9, 10, 11 -> map to HTTP/0.9,1.0,1.1
-        version_map = {9: "0.9", 10: "1.0", 11: "1.1"}
-        http_version = version_map.get(res.version, str(res.version))
-
-        # Convert headers list to a case-preserving dict
-        hdrs = {}
-        for k, v in res.getheaders():
-            hdrs[k] = v
-
-        return {
-            "ok": True,
-            "method": method,
-            "path": path,
-            "status": res.status,
-            "reason": res.reason,
-            "http_version": http_version,
-            "headers": hdrs,
-            "body_len": len(raw),
-            "body_preview": text[:BODY_PREVIEW_CHARS],
-        }
-    finally:
-        conn.close()
+    if pool is None:
+        conn = open_connection(host, port, timeout)
+        try:
+            return _request_on_connection(conn, method, path, body, headers, max_body_bytes, max_body_seconds,
+                                          store)[0]
+        finally:
+            conn.close()
+
+    retried = False
+    while True:
+        if retried:
+            # The single retry goes to a new connection, not to another (possibly stale) idle one
+            conn, reused = open_connection(host, port, timeout), False
+        else:
+            conn, reused = pool.acquire(host, port, timeout)
+        metriche.registro.conta("http.connections.reused" if reused else "http.connections.new")
+        try:
+            result, res = _request_on_connection(conn, method, path, body, headers, max_body_bytes,
+                                                 max_body_seconds, store)
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if reused and method in IDEMPOTENT_METHODS:
+                retried = True
+                continue  # idle connection closed by the server: retry once on a new one
+            raise
+        except BaseException:
+            conn.close()
+            raise
+
+        if res.will_close or not res.isclosed():
+            conn.close()  # server sent Connection: close, or the body was not read to the end
+        else:
+            pool.release(host, port, conn)
+        return result
+
+
+def _read_body_bounded(res, max_bytes: int, max_seconds: float):
+    """
+    Streams the response body in chunks: keeps only the bytes needed for the
+    preview, hashes and counts the rest. Stops after max_bytes or max_seconds.
+    Returns (preview_bytes, bytes_read, complete, digest of the bytes read).
+    """
+    preview_limit = BODY_PREVIEW_CHARS * 4  # worst case: 4 bytes per UTF-8 char
+    deadline = time.monotonic() + max_seconds
+    preview = bytearray()
+    hasher = body_hasher()
+    seen = 0
+    while not res.isclosed() and seen < max_bytes and time.monotonic() < deadline:
+        chunk = res.read1(min(BODY_READ_CHUNK, max_bytes - seen))
+        if not chunk:
+            res.read()  # end of body (or HEAD / empty body): lets http.client mark the response done
+            break
+        seen += len(chunk)
+        hasher.update(chunk)
+        if len(preview) < preview_limit:
+            preview += chunk[:preview_limit - len(preview)]
+    return bytes(preview), seen, res.isclosed(), hasher.hexdigest()
+
+
+def _request_on_connection(conn, method: str, path: str, body, headers: dict,
+                           max_body_bytes: int = MAX_BODY_BYTES, max_body_seconds: float = MAX_BODY_SECONDS,
+                           store: BodyStore = body_store):
+    """Sends the request on conn, streams the response body, returns (result dict, response)."""
+    conn.request(method, path, body=body, headers=headers)
+    res = conn.getresponse()
+
+    raw, body_read, complete, body_digest = _read_body_bounded(res, max_body_bytes, max_body_seconds)
+    m = metriche.registro
+    m.conta("http.body_bytes_read", body_read)
+    if body_digest not in store:
+        # Incremental decoder: a multi-byte char cut at the end of the preview is dropped, not mangled
+        text = codecs.getincrementaldecoder("utf-8")(errors="replace").decode(raw)
+        store.add(body_digest, text[:BODY_PREVIEW_CHARS])
+        m.conta("http.bodies.distinct")
+
+    body_len = body_read
+    if not complete:
+        content_length = res.getheader("Content-Length", "")
+        if content_length.isdigit():
+            body_len = int(content_length)
+
+    # res.version is an int: 9, 10, 11 -> map to HTTP/0.9,1.0,1.1
+    version_map = {9: "0.9", 10: "1.0", 11: "1.1"}
+    http_version = version_map.get(res.version, str(res.version))
+
+    # Case-preserving, case-insensitive header index (keeps repeated headers)
+    hdrs = HeaderIndex(res.getheaders())
+
+    result = {
+        "ok": True,
+        "method": method,
+        "path": path,
+        "status": res.status,
+        "reason": res.reason,
+        "http_version": http_version,
+        "headers": hdrs,
+        "body_len": body_len,
+        "body_digest": body_digest,
+        "body_truncated": not complete,
+        "fingerprint": response_fingerprint(res.status, hdrs, body_digest),
+    }
+    return result, res
 
 
 # -----------------------------
 # Analysis helpers
 # -----------------------------
-def get_header_case_insensitive(headers: dict, name: str) -> str:
-    """Fetch a header ignoring case."""
+def get_header_case_insensitive(headers, name: str) -> str:
+    """Fetch a header ignoring case (HeaderIndex lookup, or a scan for plain dicts)."""
+    if isinstance(headers, HeaderIndex):
+        return headers.get(name)
     low = name.lower()
     for k, v in headers.items():
         if k.lower() == low:
@@ -123,10 +457,10 @@ def get_header_case_insensitive(headers: dict, name: str) -> str:
     return ""
 
 
-def parse_allow(headers: dict) -> list:
+def parse_allow(headers: HeaderIndex) -> list:
     """
     RFC-ish behavior: 405 responses often include Allow: header.
-    OPTIONS may also include Allow:.
+    OPTIONS may also include Allow:. Repeated Allow headers are merged.
     """
     allow_val = get_header_case_insensitive(headers, "Allow")
     if not allow_val:
@@ -147,75 +481,302 @@ def supported_heuristic(status: int) -> bool:
 
 
 # -----------------------------
-# Report writer (.txt)
+# Report sinks (.txt / .jsonl / .csv)
 # -----------------------------
-def write_txt_report(host: str, port: int, path: str, results: list) -> str:
-    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"results_{safe_filename(host)}_{port}_{now}.txt"
-    out_path = os.path.abspath(filename)
+# Every sink receives results one at a time via write(r) as they arrive and keeps
+# only small running summaries in memory, so a batch of any size streams to disk.
+def _verb_order(method: str):
+    return (VERBS_TO_TEST.index(method) if method in VERBS_TO_TEST else len(VERBS_TO_TEST), method)
+
+
+class ReportSummary:
+    """Incremental Allow union + supported verbs, overall and per host:port."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.allow = set()
+        self.supported = set()
+        self.per_target = {}  # (host, port) -> (allow set, supported set)
+
+    def add(self, r: dict) -> None:
+        self.requests += 1
+        if not r.get("ok"):
+            self.errors += 1
+            return
+        allow = parse_allow(r["headers"])
+        supported = supported_heuristic(r["status"])
+        self.allow.update(allow)
+        if supported:
+            self.supported.add(r["method"])
+        if "host" in r:
+            t_allow, t_supported = self.per_target.setdefault((r["host"], r["port"]), (set(), set()))
+            t_allow.update(allow)
+            if supported:
+                t_supported.add(r["method"])
+
+    @staticmethod
+    def format_allow(allow: set) -> str:
+        return ", ".join(sorted(allow)) if allow else "(not present)"
+
+    @staticmethod
+    def format_supported(supported: set) -> str:
+        return ", ".join(sorted(supported, key=_verb_order)) if supported else "(none)"
+
+
+class TxtReportSink:
+    """
+    The human-readable report: Allow/supported summaries, one row per distinct
+    response fingerprint (count + sample requests) and one detail block per
+    fingerprint, so its size grows with distinct responses, not requests.
+    Detail blocks are spooled to a temporary file while results arrive; only a
+    count and a few sample requests per fingerprint are kept in memory.
+    request_rows adds the per-request summary table (also spooled); by default
+    it is on for the classic single-target layout (one row per verb) and off
+    for batch reports, whose rows also show target and path.
+    """
 
-    # Collect "Allow" info seen across responses
-    allow_union = set()
-    for r in results:
+    def __init__(self, out_path: str, host: str = None, port: int = None, path: str = None,
+                 request_rows: bool = None, store: BodyStore = None):
+        self.path = out_path
+        self.single = (host, port, path) if host is not None else None
+        self.store = body_store if store is None else store
+        self.summary = ReportSummary()
+        self.groups = {}  # fingerprint -> [status or "ERR", count, sample request labels]
+        if request_rows is None:
+            request_rows = self.single is not None
+        self._table = tempfile.TemporaryFile("w+", encoding="utf-8") if request_rows else None
+        self._details = tempfile.TemporaryFile("w+", encoding="utf-8")
+
+    def _label(self, r: dict) -> str:
+        if self.single:
+            return f"{r['method']} {r['path']}"
+        return f"{r['method']} {r.get('host', '')}:{r.get('port', '')}{r['path']}"
+
+    def _write_row(self, r: dict, key: str) -> None:
+        target = f"{r.get('host', '')}:{r.get('port', '')}"
+        prefix = "" if self.single else f"{target[:21]:<21} {r['path'][:30]:<30} "
+        if not r.get("ok"):
+            self._table.write(f"{prefix}{r['method']:<8} {'ERR':<6} {r.get('error','')[:25]:<25} {'':<30} {'':<40} {'':<8} {key}\n")
+        else:
+            allow = r["headers"].get("Allow")[:30]
+            loc = r["headers"].get("Location")[:40]
+            self._table.write(f"{prefix}{r['method']:<8} {str(r['status']):<6} {r['reason'][:25]:<25} {allow:<30} {loc:<40} {str(r['body_len']):<8} {key}\n")
+
+    def write(self, r: dict) -> None:
+        self.summary.add(r)
+        key = r["fingerprint"] if r.get("ok") else error_fingerprint(r.get("error", ""))
+        if self._table is not None:
+            self._write_row(r, key)
+
+        label = self._label(r)
+        group = self.groups.get(key)
+        if group is not None:
+            group[1] += 1
+            if len(group[2]) < GROUP_SAMPLE_REQUESTS:
+                group[2].append(label)
+            return
+        self.groups[key] = [r["status"] if r.get("ok") else "ERR", 1, [label]]
+
+        # First response with this fingerprint: the only one written out in full
+        f = self._details
+        f.write("\n" + "=" * 80 + "\n")
+        f.write(f"[{key}] first seen: {label}\n")
+        if not r.get("ok"):
+            f.write(f"ERROR: {r.get('error','unknown error')}\n")
+            return
+
+        f.write(f"HTTP/{r['http_version']} {r['status']} {r['reason']}\n\n")
+        f.write("Headers:\n")
+        for k, v in r["headers"].items():
+            f.write(f"  {k}: {v}\n")
+
+        truncated = " (read stopped early, rest of body skipped)" if r.get("body_truncated") else ""
+        f.write(f"\nBody length: {r['body_len']} bytes{truncated}  digest: {r['body_digest']}\n")
+        preview = self.store.get(r["body_digest"])
+        if preview:
+            f.write(f"Body preview (first {BODY_PREVIEW_CHARS} chars):\n")
+            f.write(preview)
+            f.write("\n")
+        else:
+            f.write("Body preview: (empty)\n")
+
+    def close(self) -> None:
+        summary = self.summary
+        with open(self.path, "w", encoding="utf-8") as f:
+            if self.single:
+                host, port, path = self.single
+                f.write("HTTP Verb Tester Report\n")
+                f.write("======================\n\n")
+                f.write(f"Target: {host}:{port}\n")
+                f.write(f"Path:   {path}\n")
+            else:
+                f.write("HTTP Verb Tester Batch Report\n")
+                f.write("============================\n\n")
+                f.write(f"Targets: {len(summary.per_target)}  Requests: {summary.requests}  Errors: {summary.errors}"
+                        f"  Distinct responses: {len(self.groups)}\n")
+            f.write(f"Time:   {datetime.datetime.now().isoformat(sep=' ', timespec='seconds')}\n\n")
+
+            f.write(f"Allow (observed): {summary.format_allow(summary.allow)}\n")
+            f.write(f"Supported (heuristic): {summary.format_supported(summary.supported)}\n\n")
+            if not self.single:
+                f.write("Per target\n")
+                f.write("----------\n")
+                for (host, port), (allow, supported) in sorted(summary.per_target.items()):
+                    f.write(f"{host}:{port}\n")
+                    f.write(f"  Allow (observed): {summary.format_allow(allow)}\n")
+                    f.write(f"  Supported (heuristic): {summary.format_supported(supported)}\n")
+                f.write("\n")
+
+            f.write("Responses by Fingerprint\n")
+            f.write("------------------------\n")
+            f.write(f"{'FINGERPRINT':<18} {'STATUS':<6} {'COUNT':>7}  REQUESTS\n")
+            for key, (status, count, samples) in sorted(self.groups.items(), key=lambda g: -g[1][1]):
+                more = f" (+{count - len(samples)} more)" if count > len(samples) else ""
+                f.write(f"{key:<18} {str(status):<6} {count:>7}  {', '.join(samples)}{more}\n")
+            f.write("\n")
+
+            if self._table is not None:
+                f.write("Summary Table\n")
+                f.write("-------------\n")
+                prefix = "" if self.single else f"{'TARGET':<21} {'PATH':<30} "
+                f.write(f"{prefix}{'METHOD':<8} {'STATUS':<6} {'REASON':<25} {'ALLOW':<30} {'LOCATION':<40} {'BODY_LEN':<8} {'FINGERPRINT'}\n")
+                f.write("-" * (148 + len(prefix)) + "\n")
+                self._table.seek(0)
+                shutil.copyfileobj(self._table, f)
+                f.write("\n\n")
+
+            f.write("Detailed Results (one per fingerprint)\n")
+            f.write("--------------------------------------\n")
+            self._details.seek(0)
+            shutil.copyfileobj(self._details, f)
+
+        if self._table is not None:
+            self._table.close()
+        self._details.close()
+
+
+def _json_default(obj):
+    if isinstance(obj, HeaderIndex):
+        return obj.to_json()  # list of [name, value] pairs: keeps order and duplicates
+    raise TypeError(f"not JSON serializable: {type(obj).__name__}")
+
+
+class JsonlReportSink:
+    """
+    One JSON object per line, flushed as it arrives (can be re-rendered later).
+    Each distinct body is written once, as a {"type": "body", ...} line before
+    the first result that refers to it; results only carry its body_digest.
+    """
+
+    def __init__(self, out_path: str, store: BodyStore = None):
+        self.path = out_path
+        self.store = body_store if store is None else store
+        self.summary = ReportSummary()
+        self._f = open(out_path, "w", encoding="utf-8")
+        self._written_bodies = set()
+
+    def write(self, r: dict) -> None:
+        self.summary.add(r)
+        digest = r.get("body_digest")
+        if digest is not None and digest not in self._written_bodies:
+            self._written_bodies.add(digest)
+            body = {"type": "body", "body_digest": digest, "body_preview": self.store.get(digest)}
+            self._f.write(json.dumps(body, ensure_ascii=False) + "\n")
+        self._f.write(json.dumps(r, ensure_ascii=False, default=_json_default) + "\n")
+        self._f.flush()  # partial results survive a crash / Ctrl-C
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class CsvReportSink:
+    """Flat CSV: one row per request, good for spreadsheets and grep."""
+
+    COLUMNS = ["host", "port", "path", "method", "status", "reason", "allow", "location", "body_len", "error",
+               "fingerprint"]
+
+    def __init__(self, out_path: str, store: BodyStore = None):
+        self.path = out_path
+        self.summary = ReportSummary()
+        self._f = open(out_path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._f)
+        self._writer.writerow(self.COLUMNS)
+
+    def write(self, r: dict) -> None:
+        self.summary.add(r)
         if r.get("ok"):
-            for m in parse_allow(r["headers"]):
-                allow_union.add(m)
+            allow = r["headers"].get("Allow")
+            loc = r["headers"].get("Location")
+            row = [r.get("host", ""), r.get("port", ""), r["path"], r["method"], r["status"], r["reason"],
+                   allow, loc, r["body_len"], "", r["fingerprint"]]
+        else:
+            error = r.get("error", "")
+            row = [r.get("host", ""), r.get("port", ""), r["path"], r["method"], "", "", "", "", "", error,
+                   error_fingerprint(error)]
+        self._writer.writerow(row)
+        self._f.flush()
 
-    # Collect supported methods (heuristic)
-    supported = []
-    for r in results:
-        if r.get("ok") and supported_heuristic(r["status"]):
-            supported.append(r["method"])
-    supported = sorted(set(supported), key=lambda x: VERBS_TO_TEST.index(x))
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("HTTP Verb Tester Report\n")
-        f.write("======================\n\n")
-        f.write(f"Target: {host}:{port}\n")
-        f.write(f"Path:   {path}\n")
-        f.write(f"Time:   {datetime.datetime.now().isoformat(sep=' ', timespec='seconds')}\n\n")
-
-        if allow_union:
-            f.write(f"Allow (observed): {', '.join(sorted(allow_union))}\n")
+    def close(self) -> None:
+        self._f.close()
+
+
+REPORT_SINKS = {"txt": TxtReportSink, "jsonl": JsonlReportSink, "csv": CsvReportSink}
+
+
+def report_basename(host: str = None, port: int = None) -> str:
+    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    if host is None:
+        return os.path.abspath(f"results_batch_{now}")
+    return os.path.abspath(f"results_{safe_filename(host)}_{port}_{now}")
+
+
+def open_report_sinks(formats, host: str = None, port: int = None, path: str = None,
+                      request_rows: bool = None, store: BodyStore = None) -> list:
+    """One sink per requested format ("txt", "jsonl", "csv"), all sharing the same base name."""
+    base = report_basename(host, port)
+    sinks = []
+    for fmt in formats:
+        if fmt == "txt":
+            sinks.append(TxtReportSink(base + ".txt", host, port, path, request_rows, store))
         else:
-            f.write("Allow (observed): (not present)\n")
-
-        f.write(f"Supported (heuristic): {', '.join(supported) if supported else '(none)'}\n\n")
-
-        f.write("Summary Table\n")
-        f.write("-------------\n")
-        f.write(f"{'METHOD':<8} {'STATUS':<6} {'REASON':<25} {'ALLOW':<30} {'LOCATION':<40} {'BODY_LEN':<8}\n")
-        f.write("-" * 130 + "\n")
-        for r in results:
-            if not r.get("ok"):
-                f.write(f"{r['method']:<8} {'ERR':<6} {r.get('error','')[:25]:<25} {'':<30} {'':<40} {'':<8}\n")
-                continue
-            allow = get_header_case_insensitive(r["headers"], "Allow")[:30]
-            loc = get_header_case_insensitive(r["headers"], "Location")[:40]
-            f.write(f"{r['method']:<8} {str(r['status']):<6} {r['reason'][:25]:<25} {allow:<30} {loc:<40} {str(r['body_len']):<8}\n")
-
-        f.write("\n\nDetailed Results\n")
-        f.write("----------------\n")
-        for r in results:
-            f.write("\n" + "=" * 80 + "\n")
-            f.write(f"{r['method']} {path}\n")
-            if not r.get("ok"):
-                f.write(f"ERROR: {r.get('error','unknown error')}\n")
-                continue
-
-            f.write(f"HTTP/{r['http_version']} {r['status']} {r['reason']}\n\n")
-            f.write("Headers:\n")
-            for k, v in r["headers"].items():
-                f.write(f"  {k}: {v}\n")
-
-            f.write(f"\nBody length: {r['body_len']} bytes\n")
-            if r["body_preview"]:
-                f.write(f"Body preview (first {BODY_PREVIEW_CHARS} chars):\n")
-                f.write(r["body_preview"])
-                f.write("\n")
-            else:
-                f.write("Body preview: (empty)\n")
+            sinks.append(REPORT_SINKS[fmt](f"{base}.{fmt}", store))
+    return sinks
 
+
+def write_txt_report(host: str, port: int, path: str, results: list, store: BodyStore = None) -> str:
+    sink = TxtReportSink(report_basename(host, port) + ".txt", host, port, path, store=store)
+    for r in results:
+        sink.write(r)
+    sink.close()
+    return sink.path
+
+
+def render_txt_from_jsonl(jsonl_path: str, out_path: str = None, request_rows: bool = False) -> str:
+    """Builds the human .txt report from a .jsonl file, streaming it line by line."""
+    if out_path is None:
+        out_path = os.path.splitext(os.path.abspath(jsonl_path))[0] + ".txt"
+    store = BodyStore()
+    sink = TxtReportSink(out_path, request_rows=request_rows, store=store)
+    with open(jsonl_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                if r.get("type") == "body":
+                    store.add(r["body_digest"], r["body_preview"])
+                    continue
+                if r.get("ok"):
+                    r["headers"] = HeaderIndex.from_json(r["headers"])
+                    if "fingerprint" not in r:
+                        # .jsonl written before fingerprints: the inline preview stands in for the body
+                        preview = r.pop("body_preview", "")
+                        h = body_hasher()
+                        h.update(preview.encode("utf-8"))
+                        r["body_digest"] = h.hexdigest()
+                        store.add(r["body_digest"], preview)
+                        r["fingerprint"] = response_fingerprint(r["status"], r["headers"], r["body_digest"])
+                sink.write(r)
+    sink.close()
     return out_path
 
 
@@ -225,37 +786,177 @@ def write_txt_report(host: str, port: int, path: str, results: list) -> str:
 def run_scan(host: str, port: int, path: str, timeout: int, log_fn):
     """
     Runs the verb tests and returns (results, report_path).
+    Each successful result also carries its body_preview (at most BODY_PREVIEW_CHARS),
+    since the store behind body_digest is not kept after the scan.
     log_fn(msg) is used to update UI/log.
     """
     path = normalize_path(path)
     results = []
+    store = BodyStore()  # body previews of this scan only, copied into the results
 
     log_fn(f"Target: {host}:{port}  Path: {path}")
     log_fn(f"Testing verbs: {', '.join(VERBS_TO_TEST)}")
     log_fn("")
 
-    for method in VERBS_TO_TEST:
+    # One keep-alive connection is reused across all verbs for this target
+    with ConnectionPool() as pool:
+        for method in VERBS_TO_TEST:
+            try:
+                log_fn(f"-> {method} {path}")
+                r = send_http_request(host, port, method, path, timeout, pool, store=store)
+                allow = r["headers"].get("Allow")
+                loc = r["headers"].get("Location")
+                log_fn(f"   {r['status']} {r['reason']}  Allow={allow or '-'}  Location={loc or '-'}  BodyLen={r['body_len']}")
+                r["body_preview"] = store.get(r["body_digest"])
+                results.append(r)
+            except Exception as e:
+                results.append({"ok": False, "method": method, "path": path, "error": str(e)})
+                log_fn(f"   ERROR: {e}")
+
+    report_path = write_txt_report(host, port, path, results, store)
+    log_fn("\n✅Sanning Done.")
+    log_fn(f"Saved report: {report_path}")
+
+    return results, report_path
+
+
+# -----------------------------
+# Batch runner (targets x paths x verbs)
+# -----------------------------
+def parse_target(target: str):
+    """'host', 'host:port' or 'http://host:port/' -> (host, port)."""
+    t = target.strip()
+    if "://" in t:
+        u = urllib.parse.urlsplit(t)
+        return u.hostname, u.port or DEFAULT_PORT
+    host, sep, port_s = t.rpartition(":")
+    if sep and port_s.isdigit():
+        return host, int(port_s)
+    return t, DEFAULT_PORT
+
+
+def iter_batch(targets: list, paths: list, timeout: int = DEFAULT_TIMEOUT_SEC,
+               workers: int = DEFAULT_WORKERS, per_host: int = DEFAULT_PER_HOST, store: BodyStore = None):
+    """
+    Runs the full verb x path x target matrix on a thread pool and yields each
+    result dict as soon as it finishes (order is not preserved).
+    - targets: list of (host, port)
+    - per_host: max requests in flight against the same host:port
+    - store: BodyStore for the body previews (default: the process-wide body_store)
+    Each result also carries "host" and "port". Jobs are submitted lazily, so
+    memory does not grow with the size of the matrix.
+    """
+    pool = ConnectionPool(max_idle_per_host=per_host)
+    # Resolve every target up front, concurrently: workers then only hit the DNS cache
+    cache_dns.risolvi_molti([host for host, _ in targets], socket.AF_UNSPEC)
+
+    def job(host, port, path, method):
         try:
-            log_fn(f"-> {method} {path}")
-            r = send_http_request(host, port, method, path, timeout)
-            allow = get_header_case_insensitive(r["headers"], "Allow")
-            loc = get_header_case_insensitive(r["headers"], "Location")
-            log_fn(f"   {r['status']} {r['reason']}  Allow={allow or '-'}  Location={loc or '-'}  BodyLen={r['body_len']}")
-            results.append(r)
+            r = send_http_request(host, port, method, path, timeout, pool, store=store)
         except Exception as e:
-            results.append({"ok": False, "method": method, "error": str(e)})
-            log_fn(f"   ERROR: {e}")
+            r = {"ok": False, "method": method, "path": path, "error": str(e)}
+        r["host"] = host
+        r["port"] = port
+        return r
+
+    # Path-major order: consecutive jobs hit different hosts, so work for every
+    # target is available early instead of one host at a time.
+    jobs = ((host, port, normalize_path(path), method)
+            for path in paths for method in VERBS_TO_TEST for host, port in targets)
+
+    # The per-host limit is applied before submitting: a job for a saturated host
+    # waits in that host's queue, not in a pool thread, so no thread sits idle
+    # blocked on a busy target. More threads than per_host x targets never run.
+    in_flight = dict.fromkeys(targets, 0)
+    waiting = {t: collections.deque() for t in targets}
+    queued = 0
+    window = workers * 4  # bounded number of jobs submitted or queued
+    workers = max(1, min(workers, per_host * len(in_flight)))
+
+    with pool, concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}  # future -> (host, port)
+
+        def submit(args):
+            target = (args[0], args[1])
+            pending[executor.submit(job, *args)] = target
+            in_flight[target] += 1
+
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) + queued < window:
+                args = next(jobs, None)
+                if args is None:
+                    exhausted = True
+                elif in_flight[(args[0], args[1])] < per_host:
+                    submit(args)
+                else:
+                    waiting[(args[0], args[1])].append(args)
+                    queued += 1
+            if not pending:
+                break  # nothing running means nothing queued either: a queue only fills behind running jobs
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                target = pending.pop(fut)
+                in_flight[target] -= 1
+                if waiting[target]:
+                    submit(waiting[target].popleft())
+                    queued -= 1
+                yield fut.result()
+
+
+def run_batch(targets: list, paths: list, timeout: int, log_fn,
+              workers: int = DEFAULT_WORKERS, per_host: int = DEFAULT_PER_HOST, formats=("txt",),
+              request_rows: bool = False):
+    """
+    Batch version of run_scan: streams one log line per finished request and
+    writes every result to the report sinks as soon as it arrives.
+    request_rows adds the per-request summary table to the .txt report.
+    Returns (summary, report_paths); results are not kept in memory.
+    """
+    store = BodyStore()  # body previews of this batch only
+    log_fn(f"Targets: {len(targets)}  Paths: {len(paths)}  Verbs: {', '.join(VERBS_TO_TEST)}")
+    log_fn(f"Requests: {len(targets) * len(paths) * len(VERBS_TO_TEST)}  Workers: {workers}  Per host: {per_host}")
+    log_fn("")
+
+    sinks = open_report_sinks(formats, request_rows=request_rows, store=store)
+    try:
+        for r in iter_batch(targets, paths, timeout, workers, per_host, store):
+            if r.get("ok"):
+                allow = r["headers"].get("Allow")
+                log_fn(f"{r['host']}:{r['port']} {r['method']:<7} {r['path']}  {r['status']} {r['reason']}  "
+                       f"Allow={allow or '-'}  BodyLen={r['body_len']}")
+            else:
+                log_fn(f"{r['host']}:{r['port']} {r['method']:<7} {r['path']}  ERROR: {r['error']}")
+            for sink in sinks:
+                sink.write(r)
+    finally:
+        for sink in sinks:
+            sink.close()  # also on Ctrl-C: whatever arrived so far is saved
 
-    report_path = write_txt_report(host, port, path, results)
     log_fn("\n✅Sanning Done.")
-    log_fn(f"Saved report: {report_path}")
+    for sink in sinks:
+        log_fn(f"Saved report: {sink.path}")
 
-    return results, report_path
+    return sinks[0].summary, [sink.path for sink in sinks]
 
 
 # -----------------------------
 # GUI Wizard (Tkinter)
 # -----------------------------
+def drain_queue(q, max_items: int) -> list:
+    """
+    Everything queued so far, oldest first, without blocking. Only the last
+    max_items are kept: older ones would be trimmed from the log right away.
+    """
+    batch = collections.deque(maxlen=max_items)
+    try:
+        while True:
+            batch.append(q.get_nowait())
+    except queue.Empty:
+        pass
+    return list(batch)
+
+
 def start_gui():
     try:
         import tkinter as tk
@@ -385,11 +1086,31 @@ def start_gui():
             log_box.pack(fill="both", expand=True, padx=12, pady=(0, 12))
             log_box.configure(state="disabled")
 
+            # Tk widgets must only be touched from the main loop: the worker thread
+            # just queues messages, and drain_log() moves them into the widget in
+            # batches every LOG_POLL_MS, keeping at most LOG_MAX_LINES lines.
+            log_queue = queue.SimpleQueue()
+
             def log(msg: str):
-                log_box.configure(state="normal")
-                log_box.insert("end", msg + "\n")
-                log_box.see("end")
-                log_box.configure(state="disabled")
+                log_queue.put(msg)
+
+            def drain_log():
+                batch = drain_queue(log_queue, LOG_MAX_LINES)
+                try:
+                    if batch:
+                        log_box.configure(state="normal")
+                        log_box.insert("end", "\n".join(batch) + "\n")
+                        # the text ends with "\n", so "end-1c" is on the empty line after the last one
+                        extra = int(log_box.index("end-1c").split(".")[0]) - 1 - LOG_MAX_LINES
+                        if extra > 0:
+                            log_box.delete("1.0", f"{extra + 1}.0")
+                        log_box.see("end")
+                        log_box.configure(state="disabled")
+                    runner.after(LOG_POLL_MS, drain_log)
+                except tk.TclError:
+                    pass  # runner window closed: stop polling
+
+            drain_log()
 
             def worker():
                 try:
@@ -426,8 +1147,60 @@ def start_cli_fallback():
     run_scan(host, port, path, DEFAULT_TIMEOUT_SEC, log)
 
 
+# -----------------------------
+# Batch CLI (non-interactive)
+# -----------------------------
+def _read_list_file(path: str) -> list:
+    """One entry per line; blank lines and # comments are skipped."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def batch_cli(argv: list) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="HTTP Verb Tester - batch mode (targets x paths x verbs)")
+    parser.add_argument("-t", "--target", action="append", default=[], help="host[:port], repeatable")
+    parser.add_argument("-T", "--targets-file", help="file with one host[:port] per line")
+    parser.add_argument("-p", "--path", action="append", default=[], help="path to test, repeatable")
+    parser.add_argument("-P", "--paths-file", help="wordlist with one path per line")
+    parser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT_SEC)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="total concurrent requests")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="concurrent requests per host:port")
+    parser.add_argument("--format", default="txt",
+                        help="comma-separated report formats: txt, jsonl, csv (default: txt)")
+    parser.add_argument("--request-rows", action="store_true",
+                        help="also list every request in the .txt summary table (grows with the number of requests)")
+    parser.add_argument("--render-jsonl", metavar="FILE", help="only build the .txt report from an existing .jsonl")
+    args = parser.parse_args(argv)
+
+    if args.render_jsonl:
+        print(f"Saved report: {render_txt_from_jsonl(args.render_jsonl, request_rows=args.request_rows)}")
+        return 0
+    formats = [f.strip() for f in args.format.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in REPORT_SINKS]
+    if unknown or not formats:
+        parser.error(f"unknown report format: {', '.join(unknown) or '(empty)'}")
+
+    targets = list(args.target)
+    if args.targets_file:
+        targets += _read_list_file(args.targets_file)
+    paths = list(args.path)
+    if args.paths_file:
+        paths += _read_list_file(args.paths_file)
+    if not targets:
+        parser.error("at least one --target or --targets-file is required")
+
+    targets = list(dict.fromkeys(parse_target(t) for t in targets))
+    run_batch(targets, paths or [DEFAULT_PATH], args.timeout, print, args.workers, args.per_host, formats,
+              args.request_rows)
+    return 0
+
+
 # -----------------------------
 # Entry point
 # -----------------------------
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(batch_cli(sys.argv[1:]))
     start_gui()
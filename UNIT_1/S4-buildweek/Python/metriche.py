@@ -0,0 +1,287 @@
+"""
+Metriche leggere per gli strumenti della build week: contatori, istogrammi e cronometri.
+
+Di default il registro globale è RegistroNullo: ogni chiamata è un metodo vuoto e
+avvolgi() restituisce la funzione originale, quindi il costo sui percorsi caldi è
+trascurabile. attiva() lo sostituisce con un Registro vero; a fine esecuzione
+esporta() / salva_json() danno per ogni metrica conteggi, somme, percentili e
+(per i contatori) il tasso al secondo.
+
+    import metriche
+    metriche.attiva()
+    ...
+    metriche.registro.salva_json("metriche.json")
+
+I moduli strumentati leggono sempre metriche.registro al momento della chiamata,
+così attivare le metriche dopo averli importati funziona.
+
+profila() avvolge un blocco con cProfile oppure con un profiler a campionamento
+(stack del thread principale ogni pochi ms, in formato "collapsed" per i flame graph).
+"""
+import json
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+SOTTO_INTERVALLI = 8   # bucket per ogni raddoppio di valore: errore sui percentili ~9%
+
+
+class Istogramma:
+    """Istogramma a bucket logaritmici: memoria costante anche con milioni di campioni."""
+
+    __slots__ = ("conteggio", "somma", "minimo", "massimo", "bucket")
+
+    def __init__(self):
+        self.conteggio = 0
+        self.somma = 0.0
+        self.minimo = math.inf
+        self.massimo = -math.inf
+        self.bucket = {}
+
+    def osserva(self, valore):
+        self.conteggio += 1
+        self.somma += valore
+        if valore < self.minimo:
+            self.minimo = valore
+        if valore > self.massimo:
+            self.massimo = valore
+        if valore > 0:
+            mantissa, esponente = math.frexp(valore)          # valore = mantissa * 2**esponente, 0.5 <= mantissa < 1
+            chiave = esponente * SOTTO_INTERVALLI + int((mantissa - 0.5) * 2 * SOTTO_INTERVALLI)
+        else:
+            chiave = None
+        self.bucket[chiave] = self.bucket.get(chiave, 0) + 1
+
+    @staticmethod
+    def _limite_superiore(chiave):
+        if chiave is None:
+            return 0.0
+        esponente, passo = divmod(chiave, SOTTO_INTERVALLI)
+        return math.ldexp(0.5 + (passo + 1) / (2 * SOTTO_INTERVALLI), esponente)
+
+    def percentile(self, p):
+        if not self.conteggio:
+            return 0.0
+        soglia = self.conteggio * p / 100
+        cumulato = 0
+        for chiave in sorted(self.bucket, key=lambda c: -math.inf if c is None else c):
+            cumulato += self.bucket[chiave]
+            if cumulato >= soglia:
+                return min(self._limite_superiore(chiave), self.massimo)
+        return self.massimo
+
+    def esporta(self):
+        if not self.conteggio:
+            return {"conteggio": 0}
+        return {
+            "conteggio": self.conteggio,
+            "somma": self.somma,
+            "media": self.somma / self.conteggio,
+            "min": self.minimo,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.massimo,
+        }
+
+
+class Registro:
+    """Raccoglie le metriche di un'esecuzione. Thread-safe: il lock costa poco rispetto alle operazioni misurate."""
+
+    attivo = True
+
+    def __init__(self):
+        self.inizio = time.time()
+        self.contatori = {}
+        self.istogrammi = {}
+        self._lock = threading.Lock()
+
+    def conta(self, nome, n=1):
+        with self._lock:
+            self.contatori[nome] = self.contatori.get(nome, 0) + n
+
+    def osserva(self, nome, valore):
+        with self._lock:
+            istogramma = self.istogrammi.get(nome)
+            if istogramma is None:
+                istogramma = self.istogrammi[nome] = Istogramma()
+            istogramma.osserva(valore)
+
+    @contextmanager
+    def cronometro(self, nome):
+        """Registra in secondi la durata del blocco with nell'istogramma 'nome'."""
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.osserva(nome, time.perf_counter() - inizio)
+
+    def avvolgi(self, nome, funzione):
+        """La funzione con ogni chiamata cronometrata in 'nome' (con il registro nullo: la funzione stessa)."""
+        osserva = self.osserva
+        perf_counter = time.perf_counter
+
+        def cronometrata(*args, **kwargs):
+            inizio = perf_counter()
+            try:
+                return funzione(*args, **kwargs)
+            finally:
+                osserva(nome, perf_counter() - inizio)
+        return cronometrata
+
+    def esporta(self):
+        durata = time.time() - self.inizio
+        with self._lock:
+            return {
+                "inizio": self.inizio,
+                "durata_s": durata,
+                "contatori": {
+                    nome: {"totale": valore, "al_secondo": valore / durata if durata else 0.0}
+                    for nome, valore in sorted(self.contatori.items())
+                },
+                "istogrammi": {nome: ist.esporta() for nome, ist in sorted(self.istogrammi.items())},
+            }
+
+    def salva_json(self, percorso):
+        with open(percorso, "w", encoding="utf-8") as f:
+            json.dump(self.esporta(), f, indent=2)
+        return percorso
+
+
+class _BloccoNullo:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RegistroNullo:
+    """Stessa interfaccia di Registro, senza fare nulla."""
+
+    attivo = False
+    _blocco = _BloccoNullo()
+
+    def conta(self, nome, n=1):
+        pass
+
+    def osserva(self, nome, valore):
+        pass
+
+    def cronometro(self, nome):
+        return self._blocco
+
+    def avvolgi(self, nome, funzione):
+        return funzione
+
+    def esporta(self):
+        return {}
+
+
+registro = RegistroNullo()
+
+
+def attiva():
+    """Sostituisce il registro nullo con uno vero (se non è già attivo) e lo ritorna."""
+    global registro
+    if not registro.attivo:
+        registro = Registro()
+    return registro
+
+
+def disattiva():
+    global registro
+    registro = RegistroNullo()
+
+
+# ---PROFILAZIONE---
+class ProfilatoreCampioni:
+    """
+    Ogni 'intervallo' secondi legge lo stack del thread indicato con sys._current_frames()
+    e conta gli stack uguali. Costo quasi nullo sul programma misurato, nessuna modifica al codice.
+    """
+
+    def __init__(self, intervallo=0.005, thread_id=None):
+        self.intervallo = intervallo
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.campioni = {}
+        self._fermo = threading.Event()
+        self._thread = threading.Thread(target=self._campiona, daemon=True)
+
+    def _campiona(self):
+        while not self._fermo.wait(self.intervallo):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                codice = frame.f_code
+                stack.append(f"{codice.co_filename.rsplit('/', 1)[-1]}:{codice.co_name}")
+                frame = frame.f_back
+            if stack:
+                chiave = ";".join(reversed(stack))
+                self.campioni[chiave] = self.campioni.get(chiave, 0) + 1
+
+    def avvia(self):
+        self._thread.start()
+
+    def ferma(self):
+        self._fermo.set()
+        self._thread.join()
+
+    def salva(self, percorso):
+        """Formato "collapsed" (stack;separati;da;punto_e_virgola conteggio), leggibile da flamegraph.pl / speedscope."""
+        with open(percorso, "w", encoding="utf-8") as f:
+            for stack, n in sorted(self.campioni.items(), key=lambda voce: -voce[1]):
+                f.write(f"{stack} {n}\n")
+
+    def riepilogo(self, n=15):
+        """Le funzioni in cima allo stack più spesso (tempo "self")."""
+        cima = {}
+        for stack, conteggio in self.campioni.items():
+            funzione = stack.rsplit(";", 1)[-1]
+            cima[funzione] = cima.get(funzione, 0) + conteggio
+        totale = sum(cima.values()) or 1
+        return [(funzione, conteggio * 100 / totale) for funzione, conteggio in
+                sorted(cima.items(), key=lambda voce: -voce[1])[:n]]
+
+
+@contextmanager
+def profila(modo, percorso=None, uscita=None):
+    """
+    modo: None (nessuna profilazione), "cprofile" o "campioni".
+    Alla fine salva il profilo in 'percorso' (se dato) e stampa le funzioni più costose su 'uscita' (stderr).
+    """
+    uscita = uscita or sys.stderr
+    if not modo:
+        yield
+        return
+
+    if modo == "cprofile":
+        import cProfile
+        import pstats
+
+        profilo = cProfile.Profile()
+        profilo.enable()
+        try:
+            yield
+        finally:
+            profilo.disable()
+            if percorso:
+                profilo.dump_stats(percorso)
+                print(f"[*] Profilo cProfile salvato in {percorso} (python -m pstats {percorso})", file=uscita)
+            pstats.Stats(profilo, stream=uscita).sort_stats("cumulative").print_stats(15)
+    elif modo == "campioni":
+        profilatore = ProfilatoreCampioni()
+        profilatore.avvia()
+        try:
+            yield
+        finally:
+            profilatore.ferma()
+            if percorso:
+                profilatore.salva(percorso)
+                print(f"[*] Campioni salvati in {percorso} (formato collapsed per flame graph)", file=uscita)
+            for funzione, quota in profilatore.riepilogo():
+                print(f"    {quota:5.1f}%  {funzione}", file=uscita)
+    else:
+        raise ValueError(f"modo di profilazione sconosciuto: {modo}")
@@ -0,0 +1,151 @@
+"""
+Lettura di file pcap / pcapng senza copie: il file viene mappato in memoria (mmap)
+e ogni frame è restituito come memoryview sulla mappatura. Niente read() per
+pacchetto, niente bytes intermedi: su file da diversi GB il costo è solo quello
+di scorrere gli header dei record.
+"""
+import mmap
+import struct
+
+# Link type (https://www.tcpdump.org/linktypes.html) che la decodifica veloce sa gestire
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),   # little endian, microsecondi
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),   # little endian, nanosecondi
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+
+
+class LettorePcap:
+    """
+    Itera i record di un pcap o pcapng come tuple (timestamp, linktype, frame).
+    'frame' è una memoryview valida solo fino alla chiusura del lettore:
+    chi vuole conservarla deve copiarla con bytes(frame).
+
+        with LettorePcap("cattura.pcap") as lettore:
+            for ts, linktype, frame in lettore:
+                ...
+    """
+
+    def __init__(self, percorso):
+        self.percorso = percorso
+        self._file = open(percorso, "rb")
+        try:
+            self._mappa = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:                      # file vuoto: mmap non accetta lunghezza 0
+            self._mappa = None
+        self._dati = memoryview(self._mappa) if self._mappa is not None else memoryview(b"")
+        if hasattr(self._mappa, "madvise"):
+            self._mappa.madvise(mmap.MADV_SEQUENTIAL)   # lettura in avanti: readahead aggressivo
+
+        try:
+            self.formato = self._formato()
+        except ValueError:
+            self.close()
+            raise
+
+    def _formato(self):
+        if len(self._dati) < 4:
+            raise ValueError(f"{self.percorso}: file troppo corto per essere un pcap")
+        magic = bytes(self._dati[:4])
+        if magic in PCAP_MAGIC:
+            if len(self._dati) < 24:
+                raise ValueError(f"{self.percorso}: header pcap troncato ({len(self._dati)} byte su 24)")
+            return "pcap"
+        if struct.unpack("<I", magic)[0] == PCAPNG_SHB:
+            return "pcapng"
+        raise ValueError(f"{self.percorso}: formato non riconosciuto (né pcap né pcapng)")
+
+    def __iter__(self):
+        return self._record_pcap() if self.formato == "pcap" else self._record_pcapng()
+
+    def _record_pcap(self):
+        dati = self._dati
+        ordine, risoluzione = PCAP_MAGIC[bytes(dati[:4])]
+        (linktype,) = struct.unpack_from(ordine + "I", dati, 20)
+        linktype &= 0x0FFFFFFF                  # i 4 bit alti possono contenere info sull'FCS
+        header = struct.Struct(ordine + "IIII")
+        fine = len(dati)
+        pos = 24
+        while pos + 16 <= fine:
+            sec, frazione, incl_len, _ = header.unpack_from(dati, pos)
+            pos += 16
+            if pos + incl_len > fine:
+                return                          # ultimo record troncato (cattura interrotta)
+            yield sec + frazione * risoluzione, linktype, dati[pos:pos + incl_len]
+            pos += incl_len
+
+    def _record_pcapng(self):
+        dati = self._dati
+        fine = len(dati)
+        ordine = "<"
+        interfacce = []                         # (linktype, risoluzione timestamp) per ogni IDB
+        pos = 0
+        while pos + 12 <= fine:
+            (tipo,) = struct.unpack_from(ordine + "I", dati, pos)
+            if tipo == PCAPNG_SHB:              # nuova sezione: può cambiare l'ordine dei byte
+                ordine = "<" if bytes(dati[pos + 8:pos + 12]) == b"\x4d\x3c\x2b\x1a" else ">"
+                interfacce = []
+            (lunghezza,) = struct.unpack_from(ordine + "I", dati, pos + 4)
+            if lunghezza < 12 or pos + lunghezza > fine:
+                return                          # blocco corrotto o troncato
+
+            if tipo == PCAPNG_EPB:
+                if lunghezza < 32:
+                    return                      # EPB più corto dei suoi campi fissi: file corrotto
+                interfaccia, ts_alto, ts_basso, cap_len, _ = struct.unpack_from(ordine + "IIIII", dati, pos + 8)
+                if interfaccia >= len(interfacce) or cap_len > lunghezza - 32:
+                    return                      # interfaccia mai descritta da un IDB o frame che esce dal blocco
+                linktype, risoluzione = interfacce[interfaccia]
+                inizio = pos + 28
+                yield ((ts_alto << 32) | ts_basso) * risoluzione, linktype, dati[inizio:inizio + cap_len]
+            elif tipo == PCAPNG_SPB:
+                if not interfacce or lunghezza < 16:
+                    return                      # SPB prima di ogni IDB o senza la lunghezza del pacchetto
+                linktype, _ = interfacce[0]
+                (orig_len,) = struct.unpack_from(ordine + "I", dati, pos + 8)
+                cap_len = min(orig_len, lunghezza - 16)
+                yield 0.0, linktype, dati[pos + 12:pos + 12 + cap_len]
+            elif tipo == PCAPNG_IDB:
+                (linktype,) = struct.unpack_from(ordine + "H", dati, pos + 8)
+                interfacce.append((linktype, self._risoluzione_idb(dati, pos, lunghezza, ordine)))
+            pos += lunghezza
+
+    @staticmethod
+    def _risoluzione_idb(dati, pos, lunghezza, ordine):
+        """Legge l'opzione if_tsresol (codice 9) dell'Interface Description Block."""
+        opzione = pos + 16
+        fine = pos + lunghezza - 4
+        while opzione + 4 <= fine:
+            codice, lung = struct.unpack_from(ordine + "HH", dati, opzione)
+            if codice == 0:
+                break
+            if codice == 9 and lung >= 1:
+                valore = dati[opzione + 4]
+                return 2.0 ** -(valore & 0x7F) if valore & 0x80 else 10.0 ** -valore
+            opzione += 4 + (lung + 3) // 4 * 4  # le opzioni sono allineate a 32 bit
+        return 1e-6
+
+    def close(self):
+        self._dati.release()
+        if self._mappa is not None:
+            try:
+                self._mappa.close()
+            except BufferError:
+                pass                            # qualcuno tiene ancora una memoryview: ci pensa il GC
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
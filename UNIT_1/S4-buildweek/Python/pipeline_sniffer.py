@@ -0,0 +1,280 @@
+"""
+Pipeline a stadi per il sniffer: cattura -> anello -> decodifica -> scrittura.
+
+Nella cattura "in linea" (cattura_live) lo stesso thread legge il socket, decodifica
+e stampa: se la decodifica o il terminale rallentano, il buffer del kernel si riempie
+e i pacchetti vengono persi senza che ce ne accorgiamo. Qui invece:
+
+- il thread di cattura fa solo recv e mette il frame grezzo in un anello limitato
+  (AnelloFrame); se l'anello è pieno il frame viene scartato e contato;
+- un thread di smistamento toglie i frame a lotti e li passa ai decodificatori,
+  processi separati (niente GIL condiviso) oppure thread con workers=0;
+- lo stadio di scrittura rimette i lotti in ordine e scrive una sola volta per
+  lotto (o li passa all'aggregatore dei flussi).
+
+I contatori (catturati, scartati, profondità dell'anello e delle code) sono in
+statistiche() e con 'intervallo_statistiche' vengono stampati su stderr.
+"""
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+
+import metriche
+import sniffer_tool4 as sniffer
+
+CAPACITA_DEFAULT = 65536      # frame in attesa fra cattura e decodifica
+LOTTO_DEFAULT = 256           # frame per lotto passato a un decodificatore
+LOTTI_PER_WORKER = 4          # lotti in coda per ogni decodificatore prima di rallentare lo smistamento
+
+
+class AnelloFrame:
+    """
+    Buffer circolare a capacità fissa fra il thread di cattura e lo smistamento.
+    metti() non blocca mai la cattura (salvo blocca=True, usato per i pcap dove
+    non ha senso perdere frame): se non c'è posto il frame è contato in 'scartati'.
+    """
+
+    def __init__(self, capacita=CAPACITA_DEFAULT):
+        self.capacita = capacita
+        self.slot = [None] * capacita
+        self.testa = 0                 # prossimo slot da leggere
+        self.conta = 0
+        self.chiuso = False
+        self.inseriti = 0
+        self.scartati = 0
+        self.picco = 0
+        self._lock = threading.Lock()
+        self._non_vuoto = threading.Condition(self._lock)
+        self._non_pieno = threading.Condition(self._lock)
+
+    def __len__(self):
+        return self.conta
+
+    def metti(self, elemento, blocca=False):
+        with self._lock:
+            while self.conta == self.capacita:
+                if not blocca or self.chiuso:
+                    self.scartati += 1
+                    return False
+                self._non_pieno.wait()
+            self.slot[(self.testa + self.conta) % self.capacita] = elemento
+            self.conta += 1
+            self.inseriti += 1
+            if self.conta > self.picco:
+                self.picco = self.conta
+            if self.conta == 1:
+                self._non_vuoto.notify()
+            return True
+
+    def prendi_lotto(self, massimo, timeout=0.1):
+        """
+        Fino a 'massimo' elementi in ordine di arrivo. Lista vuota se entro 'timeout'
+        non arriva nulla, None quando l'anello è chiuso e svuotato.
+        """
+        with self._lock:
+            if not self.conta:
+                if self.chiuso:
+                    return None
+                self._non_vuoto.wait(timeout)
+                if not self.conta:
+                    return None if self.chiuso else []
+            n = min(massimo, self.conta)
+            fine = self.testa + n
+            if fine <= self.capacita:
+                lotto = self.slot[self.testa:fine]
+                self.slot[self.testa:fine] = [None] * n
+            else:
+                fine -= self.capacita
+                lotto = self.slot[self.testa:] + self.slot[:fine]
+                self.slot[self.testa:] = [None] * (self.capacita - self.testa)
+                self.slot[:fine] = [None] * fine
+            self.testa = fine % self.capacita
+            self.conta -= n
+            self._non_pieno.notify_all()
+            return lotto
+
+    def chiudi(self):
+        with self._lock:
+            self.chiuso = True
+            self._non_vuoto.notify_all()
+            self._non_pieno.notify_all()
+
+
+def _decodifica_lotti(lavori, risultati):
+    """
+    Corpo di un decodificatore: riceve (numero, [(ts, linktype, frame), ...]) e
+    restituisce (numero, [(ts, evento, lunghezza), ...]) con i soli frame da stampare.
+    """
+    if multiprocessing.parent_process() is not None:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)   # il Ctrl-C lo gestisce il processo principale
+    decodifica = sniffer.decodifica_frame
+    while True:
+        lavoro = lavori.get()
+        if lavoro is None:
+            risultati.put(None)
+            return
+        numero, lotto = lavoro
+        eventi = []
+        for ts, linktype, frame in lotto:
+            evento = decodifica(frame, linktype)
+            if evento:
+                eventi.append((ts, evento, len(frame)))
+        risultati.put((numero, eventi, len(lotto)))
+
+
+class PipelineSniffer:
+    """
+    workers > 0: decodificatori in processi separati; workers == 0: un solo thread
+    (utile dove fork non è disponibile o per confronto).
+    'aggregatore' è un flussi.Aggregatore opzionale al posto delle righe per pacchetto.
+    'registratore' (registratore_pcap.RegistratorePcap) riceve anche ogni frame catturato.
+    """
+
+    def __init__(self, workers=2, capacita=CAPACITA_DEFAULT, lotto=LOTTO_DEFAULT,
+                 aggregatore=None, uscita=None, intervallo_statistiche=None, registratore=None):
+        self.workers = workers
+        self.anello = AnelloFrame(capacita)
+        self.lotto = lotto
+        self.aggregatore = aggregatore
+        self.registratore = registratore
+        self.uscita = uscita or sys.stdout
+        self.intervallo_statistiche = intervallo_statistiche
+
+        if workers > 0:
+            self._lavori = multiprocessing.Queue(workers * LOTTI_PER_WORKER)
+            self._risultati = multiprocessing.Queue()
+        else:
+            self._lavori = queue.Queue(LOTTI_PER_WORKER)
+            self._risultati = queue.Queue()
+        self._fermo = threading.Event()
+        self.lotti_inviati = 0
+        self._in_attesa = {}          # lotti decodificati arrivati prima del loro turno
+        self._prossimo = 0            # numero del prossimo lotto da scrivere
+        self._attivi = max(workers, 1)
+        self.decodificati = 0
+        self.righe = 0
+        self.errore = None            # eccezione che ha fermato lo stadio di cattura
+
+    # ---------- stadi ----------
+    def _cattura(self, sorgente, senza_perdite):
+        metti = self.anello.metti
+        salva = self.registratore.metti if self.registratore is not None else None
+        try:
+            for ts, linktype, frame in sorgente:
+                if self._fermo.is_set():
+                    break
+                frame = bytes(frame)
+                metti((ts, linktype, frame), senza_perdite)
+                if salva is not None:
+                    salva(ts, linktype, frame, senza_perdite)
+        except BaseException as e:
+            self.errore = e            # es. il registratore non riesce a scrivere: esegui() lo rilancia
+        finally:
+            self.anello.chiudi()
+
+    def _smista(self):
+        while True:
+            lotto = self.anello.prendi_lotto(self.lotto)
+            if lotto is None:
+                break
+            if lotto:
+                self._lavori.put((self.lotti_inviati, lotto))
+                self.lotti_inviati += 1
+        for _ in range(max(self.workers, 1)):
+            self._lavori.put(None)
+
+    def _scrivi(self):
+        """Riordina i lotti per numero e li scrive: una write() per lotto."""
+        in_attesa = self._in_attesa
+        orario = sniffer.orologio.orario
+        formatta = sniffer.formatta_evento
+        while self._attivi:
+            risultato = self._risultati.get()
+            if risultato is None:
+                self._attivi -= 1
+                continue
+            numero, eventi, n_frame = risultato
+            in_attesa[numero] = eventi
+            self.decodificati += n_frame
+            metriche.registro.conta("sniffer.pacchetti", n_frame)
+            while self._prossimo in in_attesa:
+                eventi = in_attesa.pop(self._prossimo)
+                self._prossimo += 1
+                if self.aggregatore is not None:
+                    for ts, evento, lunghezza in eventi:
+                        self.aggregatore.registra(ts, evento, lunghezza)
+                elif eventi:
+                    self.uscita.write("".join(formatta(orario(ts), evento) + "\n" for ts, evento, _ in eventi))
+                self.righe += len(eventi)
+
+    def _stampa_statistiche(self):
+        while not self._fermo.wait(self.intervallo_statistiche):
+            print(formatta_statistiche(self.statistiche()), file=sys.stderr)
+
+    def statistiche(self):
+        try:
+            lotti_in_coda = self._lavori.qsize()
+        except NotImplementedError:    # macOS: qsize() non supportato da multiprocessing.Queue
+            lotti_in_coda = -1
+        return {
+            "catturati": self.anello.inseriti + self.anello.scartati,
+            "scartati": self.anello.scartati,
+            "anello": len(self.anello),
+            "anello_picco": self.anello.picco,
+            "anello_capacita": self.anello.capacita,
+            "lotti_in_coda": lotti_in_coda,
+            "decodificati": self.decodificati,
+            "righe": self.righe,
+        }
+
+    # ---------- avvio ----------
+    def esegui(self, sorgente, senza_perdite=False):
+        """
+        Consuma 'sorgente' (tuple (ts, linktype, frame), es. sniffer.sorgente_live() o
+        un pcap_io.LettorePcap) fino alla fine o al Ctrl-C. Ritorna le statistiche finali.
+        senza_perdite=True fa attendere la cattura quando l'anello è pieno (file pcap).
+        """
+        if self.workers > 0:
+            decodificatori = [
+                multiprocessing.Process(target=_decodifica_lotti, args=(self._lavori, self._risultati), daemon=True)
+                for _ in range(self.workers)
+            ]
+        else:
+            decodificatori = [threading.Thread(target=_decodifica_lotti, args=(self._lavori, self._risultati),
+                                               daemon=True)]
+        for d in decodificatori:
+            d.start()
+
+        # La cattura è daemon: recv_raw() non si può interrompere, al Ctrl-C la abbandoniamo
+        cattura = threading.Thread(target=self._cattura, args=(sorgente, senza_perdite), daemon=True)
+        smista = threading.Thread(target=self._smista, daemon=True)
+        cattura.start()
+        smista.start()
+        if self.intervallo_statistiche:
+            threading.Thread(target=self._stampa_statistiche, daemon=True).start()
+
+        try:
+            self._scrivi()
+        except KeyboardInterrupt:
+            # Smettiamo di catturare ma scriviamo quello che è già nell'anello
+            self._fermo.set()
+            self.anello.chiudi()
+            self._scrivi()
+        finally:
+            self._fermo.set()
+            self.uscita.flush()
+            for d in decodificatori:
+                d.join(timeout=1)
+        if self.errore is not None:
+            raise self.errore
+        return self.statistiche()
+
+
+def formatta_statistiche(dati):
+    return (
+        f"[pipeline] catturati {dati['catturati']:,} | scartati {dati['scartati']:,} | "
+        f"anello {dati['anello']:,}/{dati['anello_capacita']:,} (picco {dati['anello_picco']:,}) | "
+        f"lotti in coda {dati['lotti_in_coda']} | decodificati {dati['decodificati']:,} | righe {dati['righe']:,}"
+    )
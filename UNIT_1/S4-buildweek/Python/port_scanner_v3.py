@@ -1,45 +1,908 @@
+import asyncio
+import errno
+import ipaddress
+import os
+import random
+import re
+import select
 import socket
+import struct
 import subprocess
 import sys
+import time
+import zlib
+from array import array
+from collections import deque
 from datetime import datetime
 
+import cache_dns
+import metriche
+
+# Numero massimo di connect "in volo" contemporaneamente nella modalità asincrona
+CONCORRENZA_DEFAULT = 1000
+# Massimo di probe in volo sullo stesso host durante uno sweep di più host
+PER_HOST_DEFAULT = 64
+# Probe in volo su un host finché non c'è un primo campione di RTT (vedi StatoHost.limite)
+FINESTRA_INIZIALE = 8
+
+# Stati possibili di una porta
+APERTA = "aperta"      # SYN/ACK -> connect riuscito
+CHIUSA = "chiusa"      # RST -> connect rifiutato
+FILTRATA = "filtrata"  # nessuna risposta entro il timeout
+
+# ---STIMA DEL TEMPO DI RISPOSTA (RTT) PER HOST---
+class StimatoreRTT:
+    """
+    Timeout adattivo calcolato come fa TCP (RFC 6298):
+      SRTT   = 7/8 * SRTT + 1/8 * R
+      RTTVAR = 3/4 * RTTVAR + 1/4 * |SRTT - R|
+      timeout = SRTT + 4 * RTTVAR   (limitato tra 'minimo' e 'massimo')
+    I campioni R arrivano dal ping iniziale e da ogni connect che riceve una risposta
+    (SYN/ACK oppure RST). Finché non ci sono campioni si usa 'timeout_iniziale'.
+    """
+
+    def __init__(self, timeout_iniziale=0.3, minimo=0.05, massimo=3.0):
+        self.timeout_iniziale = timeout_iniziale
+        self.minimo = minimo
+        self.massimo = massimo
+        self.srtt = None
+        self.rttvar = None
+        self.risposte = 0      # probe che hanno avuto una risposta (aperta o chiusa)
+        self.ritentativi = 0   # probe rimandati dopo un timeout
+        self.recuperati = 0    # ritentativi che questa volta hanno avuto risposta
+
+    def campione(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def timeout(self):
+        if self.srtt is None:
+            return self.timeout_iniziale
+        return min(self.massimo, max(self.minimo, self.srtt + 4 * self.rttvar))
+
+    def vale_la_pena_ritentare(self, tentativo=0):
+        """
+        Un timeout può voler dire "porta filtrata" oppure "pacchetto perso".
+        Ritentiamo solo se l'host ha già risposto ad altri probe e, dopo i primi 20
+        ritentativi, solo se almeno il 2% di essi ha recuperato una risposta
+        (segno di perdita reale). Se i ritentativi non trovano mai nulla,
+        l'host sta filtrando e ripetere i probe è solo tempo perso.
+        'tentativo' è il numero di ritentativi già fatti sulla porta: dal secondo in
+        poi si ritenta solo se almeno un ritentativo ha già recuperato una risposta.
+        """
+        if self.risposte == 0:
+            return False
+        if tentativo and not self.recuperati:
+            return False
+        return self.ritentativi < 20 or self.recuperati * 50 >= self.ritentativi
+
 # ---PING MACCHINA BERSAGLIO ---
-def check_host_up(ip):
+def ping_rtt(ip):
     """
-    Invia un singolo pacchetto PING all'IP target.
-    Ritorna True se risponde, False se non risponde.
+    Invia un singolo pacchetto PING e ritorna il round-trip time in secondi,
+    oppure None se l'host non risponde.
     """
     try:
         output = subprocess.run( # Eseguiamo il comando ping; -c 1: Invia solo 1 pacchetto; -W 1: Aspetta massimo 1 secondo per la risposta.
             ['ping', '-c', '1', '-W', '1', ip],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL # stdout/stderr=DEVNULL serve a nascondere l'output del ping nel terminale.
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, # catturiamo stdout per leggere "time=0.42 ms", lo stderr lo nascondiamo
+            text=True
         )
-
-        return output.returncode == 0 # Se il codice di ritorno è 0, il ping ha avuto successo (fa un return True)
     except Exception:
+        return None
+
+    if output.returncode != 0:
+        return None
+    trovato = re.search(r"time[=<]\s*([\d.]+)\s*ms", output.stdout)
+    return float(trovato.group(1)) / 1000 if trovato else 0.0  # risposta senza tempo leggibile: host comunque attivo
+
+def check_host_up(ip, rtt=None):
+    """
+    Invia un singolo pacchetto PING all'IP target.
+    Ritorna True se risponde, False se non risponde.
+    Se viene passato uno StimatoreRTT, il tempo del ping diventa il primo campione.
+    """
+    tempo = ping_rtt(ip)
+    if tempo is None:
         return False # Se il ping NON ha avuto successo (fa un return False)
+    if rtt is not None and tempo > 0:
+        rtt.campione(tempo)
+    return True
 
 # ---TEMPO PER LO SCAN DI OGNI PORTA---
-def scan_time(target_ip, port, timeout=0.3):
+def sonda_porta(target_ip, port, timeout=0.3):
+    """
+    Probe bloccante di una porta: ritorna (stato, secondi impiegati).
+    """
+    inizio = time.perf_counter()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(timeout)
         result = sock.connect_ex((target_ip, port))
+    finally:
         sock.close()
+    trascorso = time.perf_counter() - inizio
 
-        if result == 0:
-            return True
-        else:
-            return False
+    if result == 0:
+        return APERTA, trascorso
+    if result == errno.ECONNREFUSED:
+        return CHIUSA, trascorso
+    return FILTRATA, trascorso  # EAGAIN/timeout, host unreachable, ecc.
+
+def stato_porta(target_ip, port, timeout=0.3, rtt=None):
+    """
+    Ritorna lo stato della porta (APERTA, CHIUSA o FILTRATA).
+    Con uno StimatoreRTT il timeout viene preso dalla stima e ogni risposta la aggiorna.
+    """
+    try:
+        if rtt is not None:
+            timeout = rtt.timeout()
+        stato, trascorso = sonda_porta(target_ip, port, timeout)
     except socket.error:
         print('Connessione interrotta!')
-        return False
+        return FILTRATA
+
+    m = metriche.registro
+    m.conta(f"porte.esito.{stato}")
+    m.osserva("porte.connect_s", trascorso)
+
+    if rtt is not None and stato != FILTRATA:
+        rtt.risposte += 1
+        rtt.campione(trascorso)
+    return stato
+
+def scan_time(target_ip, port, timeout=0.3, rtt=None):
+    """Ritorna True se la porta è aperta."""
+    return stato_porta(target_ip, port, timeout, rtt) == APERTA
+
+# ---STATO SU DISCO: RIPRESA E CACHE DEI RISULTATI---
+class StatoScansione:
+    """
+    File di stato compatto (compresso con zlib) che contiene, per ogni host:
+    - tre bitmap da 65536 bit: porte sondate, aperte, chiuse
+      (sondata ma né aperta né chiusa = filtrata)
+    - un timestamp per ogni blocco di 256 porte: l'ora del probe più vecchio del blocco
+    Serve a riprendere uno sweep interrotto (le porte già sondate vengono saltate) e,
+    nelle scansioni ripetute, a rifare solo i blocchi il cui risultato è più vecchio
+    di 'ttl' secondi. Un host occupa ~25 KB prima della compressione.
+    """
+
+    MAGIC = b"PSV3STATO1"
+    BLOCCO = 256
+    N_BLOCCHI = 65536 // BLOCCO
+    DIM_BITMAP = 65536 // 8
+
+    def __init__(self, percorso, ttl=24 * 3600):
+        self.percorso = percorso
+        self.ttl = ttl
+        self.host = {}  # ip -> [sondate, aperte, chiuse, tempi]
+        self.modificato = False
+        self.ultimo_salvataggio = time.monotonic()
+        if os.path.exists(percorso):
+            try:
+                self.carica()
+            except (OSError, ValueError, zlib.error, struct.error) as e:
+                print(f"[!] File di stato {percorso} illeggibile ({e}): si riparte da zero.")
+                self.host = {}
+
+    def _record(self, ip):
+        rec = self.host.get(ip)
+        if rec is None:
+            rec = [bytearray(self.DIM_BITMAP), bytearray(self.DIM_BITMAP), bytearray(self.DIM_BITMAP),
+                   array("I", bytes(4 * self.N_BLOCCHI))]
+            self.host[ip] = rec
+        return rec
+
+    @staticmethod
+    def _bit(bitmap, port):
+        return bitmap[port >> 3] >> (port & 7) & 1
+
+    def da_sondare(self, ip, ports, ora=None):
+        """
+        Ritorna (porte da sondare, porte aperte secondo la cache).
+        I blocchi con risultati più vecchi del TTL vengono azzerati e quindi rifatti.
+        """
+        ports = list(ports)
+        rec = self.host.get(ip)
+        if rec is None:
+            return ports, []
+        sondate, aperte, chiuse, tempi = rec
+        ora = time.time() if ora is None else ora
+
+        for blocco in {port // self.BLOCCO for port in ports}:
+            if tempi[blocco] and ora - tempi[blocco] > self.ttl:
+                inizio = blocco * self.BLOCCO // 8
+                fine = inizio + self.BLOCCO // 8
+                for bitmap in (sondate, aperte, chiuse):
+                    bitmap[inizio:fine] = bytes(fine - inizio)
+                tempi[blocco] = 0
+                self.modificato = True
+
+        da_fare = [port for port in ports if not self._bit(sondate, port)]
+        in_cache = [port for port in ports if self._bit(sondate, port) and self._bit(aperte, port)]
+        return da_fare, in_cache
+
+    def registra(self, ip, port, stato):
+        sondate, aperte, chiuse, tempi = self._record(ip)
+        maschera = 1 << (port & 7)
+        sondate[port >> 3] |= maschera
+        if stato == APERTA:
+            aperte[port >> 3] |= maschera
+        elif stato == CHIUSA:
+            chiuse[port >> 3] |= maschera
+        blocco = port // self.BLOCCO
+        if not tempi[blocco]:
+            tempi[blocco] = int(time.time())
+        self.modificato = True
+
+    def checkpoint(self, intervallo=5.0):
+        """Salva su disco al massimo ogni 'intervallo' secondi durante la scansione."""
+        if self.modificato and time.monotonic() - self.ultimo_salvataggio >= intervallo:
+            self.salva()
+
+    def carica(self):
+        with open(self.percorso, "rb") as f:
+            dati = zlib.decompress(f.read())
+        if not dati.startswith(self.MAGIC):
+            raise ValueError("formato sconosciuto")
+        pos = len(self.MAGIC)
+        (n_host,) = struct.unpack_from("<I", dati, pos)
+        pos += 4
+        for _ in range(n_host):
+            lunghezza = dati[pos]
+            ip = dati[pos + 1:pos + 1 + lunghezza].decode("ascii")
+            pos += 1 + lunghezza
+            bitmap = []
+            for _ in range(3):
+                bitmap.append(bytearray(dati[pos:pos + self.DIM_BITMAP]))
+                pos += self.DIM_BITMAP
+            tempi = array("I")
+            tempi.frombytes(dati[pos:pos + 4 * self.N_BLOCCHI])
+            if sys.byteorder != "little":
+                tempi.byteswap()
+            pos += 4 * self.N_BLOCCHI
+            if len(tempi) != self.N_BLOCCHI:
+                raise ValueError("file troncato")
+            self.host[ip] = bitmap + [tempi]
+
+    def salva(self):
+        parti = [self.MAGIC, struct.pack("<I", len(self.host))]
+        for ip, (sondate, aperte, chiuse, tempi) in self.host.items():
+            nome = ip.encode("ascii")
+            parti += [bytes([len(nome)]), nome, sondate, aperte, chiuse]
+            if sys.byteorder != "little":
+                tempi = array("I", tempi)
+                tempi.byteswap()
+            parti.append(tempi.tobytes())
+
+        temporaneo = self.percorso + ".tmp"
+        with open(temporaneo, "wb") as f:
+            f.write(zlib.compress(b"".join(parti), 6))
+        os.replace(temporaneo, self.percorso)  # atomico: un Ctrl-C non lascia mai un file a metà
+        self.modificato = False
+        self.ultimo_salvataggio = time.monotonic()
+
+# ---LIMITE DI FILE DESCRIPTOR---
+def limite_concorrenza(concorrenza):
+    """
+    Ogni connect aperto occupa un file descriptor: alziamo il soft limit (RLIMIT_NOFILE)
+    fino all'hard limit se serve e riduciamo la concorrenza a quello che il sistema permette.
+    """
+    try:
+        import resource  # disponibile solo su sistemi Unix
+    except ImportError:
+        return max(1, min(concorrenza, 500))  # su Windows select() gestisce al massimo ~512 socket
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    richiesto = concorrenza + 64  # margine per stdin/stdout, file di log, ecc.
+    if soft != resource.RLIM_INFINITY and soft < richiesto:
+        nuovo = richiesto if hard == resource.RLIM_INFINITY else min(richiesto, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (nuovo, hard))
+            soft = nuovo
+        except (ValueError, OSError):
+            pass
+    if soft != resource.RLIM_INFINITY:
+        concorrenza = min(concorrenza, soft - 64)
+    return max(1, concorrenza)
+
+# ---SCAN ASINCRONO DI UNA SINGOLA PORTA---
+async def sonda_porta_async(target_ip, port, timeout=0.3):
+    """
+    Versione non bloccante di sonda_porta: il connect viene affidato all'event loop,
+    così migliaia di porte possono essere in attesa nello stesso momento.
+    Ritorna (stato, secondi impiegati).
+    """
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    inizio = loop.time()
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (target_ip, port)), timeout)
+        return APERTA, loop.time() - inizio
+    except asyncio.TimeoutError:
+        return FILTRATA, timeout
+    except ConnectionRefusedError:
+        return CHIUSA, loop.time() - inizio  # RST: anche questa è una misura valida del RTT
+    except OSError:
+        return FILTRATA, loop.time() - inizio  # es. ICMP host/net unreachable
+    finally:
+        sock.close()
+
+async def scan_time_async(target_ip, port, timeout=0.3):
+    stato, _ = await sonda_porta_async(target_ip, port, timeout)
+    return stato == APERTA
+
+# ---ORDINE DELLE PORTE E ARRESTO ANTICIPATO---
+# Porte TCP più spesso aperte, dalla più frequente (top 100 di nmap-services),
+# seguite da quelle dei servizi tipici delle macchine del corso (Metasploitable)
+TOP_PORTE = (
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080, 1723, 111, 995, 993, 5900,
+    1025, 587, 8888, 199, 1720, 465, 548, 113, 81, 6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000,
+    32768, 554, 26, 1433, 49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153, 8081,
+    2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357, 427, 49156, 543, 544, 5101, 144,
+    7, 389, 8009, 3128, 444, 9999, 5009, 7070, 5190, 3000, 5432, 1900, 3986, 13, 1029, 9, 5051, 6646,
+    49157, 1028, 873, 1755, 2717, 4899, 9100, 119, 37,
+    512, 1099, 1524, 3632, 6667, 6697, 8180, 6379, 27017, 5901, 8787,
+)
+ORDINI = ("crescente", "top")
+
+def ordina_porte(ports, ordine="crescente", seme=None):
+    """
+    ordine="crescente": le porte così come sono.
+    ordine="top": prima le porte di TOP_PORTE presenti in 'ports' (dalla più comune), poi
+    tutte le altre in ordine casuale ('seme' rende l'ordine ripetibile). I servizi
+    interessanti escono nei primi istanti invece che sparsi lungo tutta la scansione.
+    """
+    if ordine == "crescente":
+        return ports
+    if ordine != "top":
+        raise ValueError(f"ordine delle porte sconosciuto: {ordine} (validi: {', '.join(ORDINI)})")
+    ports = list(ports)
+    presenti = set(ports)
+    prime = [port for port in TOP_PORTE if port in presenti]
+    gia_prese = set(prime)
+    resto = [port for port in ports if port not in gia_prese]
+    random.Random(seme).shuffle(resto)
+    return prime + resto
+
+class Arresto:
+    """
+    Politica di arresto anticipato della scansione: dopo 'max_aperte' porte aperte
+    e/o dopo 'budget' secondi dalla creazione. I probe già in volo vengono completati,
+    quindi il budget può essere superato al massimo di un timeout.
+    """
+
+    def __init__(self, max_aperte=None, budget=None):
+        self.max_aperte = max_aperte
+        self.scadenza = time.monotonic() + budget if budget else None
+        self.aperte = 0
+        self.motivo = None   # perché ci siamo fermati (None = non ancora)
+
+    def porta_aperta(self):
+        self.aperte += 1
+
+    def scattato(self):
+        if self.motivo is None:
+            if self.max_aperte and self.aperte >= self.max_aperte:
+                self.motivo = f"raggiunto il limite di {self.max_aperte} porte aperte"
+            elif self.scadenza is not None and time.monotonic() >= self.scadenza:
+                self.motivo = "budget di tempo esaurito"
+        return self.motivo is not None
+
+# ---MOTORE ASINCRONO CON FINESTRA LIMITATA---
+class StatoHost:
+    """Porte ancora da provare, ritentativi e probe in volo di un singolo host."""
+
+    def __init__(self, ip, ports, rtt):
+        self.ip = ip
+        self.rtt = rtt
+        self.porte_da_fare = iter(ports)
+        self.da_ritentare = deque()  # (porta, tentativo)
+        self.in_volo = 0
+        self.open_ports = []
+        self.esaurito = False  # True quando l'iteratore di porte è finito
+        self.scaduti = 0       # probe andati in timeout
+
+    def limite(self, per_host):
+        """
+        Probe in volo permessi sull'host. Senza campioni di RTT ogni probe userebbe il
+        timeout iniziale: finché non arriva la prima risposta ne mandiamo solo
+        FINESTRA_INIZIALE, così le porte filtrate vengono sondate con il timeout misurato.
+        Se invece il primo probe va in timeout l'host non dà campioni da aspettare.
+        """
+        if self.rtt.srtt is None and not self.scaduti:
+            return min(per_host, FINESTRA_INIZIALE)
+        return per_host
+
+    def prossima(self):
+        if self.da_ritentare:
+            return self.da_ritentare.popleft()
+        if not self.esaurito:
+            port = next(self.porte_da_fare, None)
+            if port is not None:
+                return port, 0
+            self.esaurito = True
+        return None
+
+    def finito(self):
+        return self.esaurito and not self.da_ritentare and self.in_volo == 0
+
+
+async def _motore_scansione(hosts, concorrenza, per_host, tentativi, on_open=None, on_esito=None, arresto=None):
+    """
+    Scheduler comune a scan_ports_async e sweep_async.
+    - 'concorrenza' worker in tutto: è il budget globale di connect in volo.
+    - al massimo 'per_host' probe in volo sullo stesso host (equità e meno rischio
+      di saturare/allarmare il singolo bersaglio).
+    - gli host vengono attivati solo quando quelli già attivi sono saturi, quindi
+      in memoria ci sono solo ~concorrenza/per_host iteratori di porte alla volta
+      anche su una /16; i worker girano a rotazione sugli host attivi.
+    on_open(ip, port) viene chiamata appena una porta risulta aperta.
+    on_esito(ip, port, stato) viene chiamata per ogni risultato definitivo (anche chiuse/filtrate).
+    Con un Arresto i worker smettono di prendere nuovi probe appena la politica scatta.
+    Un host senza campioni di RTT ha al massimo FINESTRA_INIZIALE probe in volo (StatoHost.limite).
+    """
+    in_attesa = iter(hosts)  # StatoHost non ancora attivati
+    attivi = deque()
+    risultati = {}
+    cambiamento = asyncio.Condition()
+    fermi = 0  # worker che aspettano su 'cambiamento' (si modifica solo tenendo il lock)
+
+    def prossimo_lavoro():
+        for _ in range(len(attivi)):
+            host = attivi[0]
+            attivi.rotate(-1)
+            if host.in_volo < host.limite(per_host):
+                lavoro = host.prossima()
+                if lavoro is not None:
+                    return host, lavoro
+        # tutti gli host attivi sono saturi o in attesa di risposte: ne attiviamo uno nuovo
+        for host in in_attesa:
+            risultati[host.ip] = host.open_ports
+            lavoro = host.prossima()
+            if lavoro is None:
+                continue  # lista di porte vuota
+            attivi.append(host)
+            return host, lavoro
+        return None
+
+    def fine():
+        return not attivi or (arresto is not None and arresto.scattato())
+
+    async def sveglia_tutti():
+        # Un solo notify_all per tutti quelli fermi: chi è già stato svegliato e non è
+        # ancora ripartito non va svegliato di nuovo (notify scorre tutta la lista d'attesa)
+        nonlocal fermi
+        if fermi:
+            async with cambiamento:
+                fermi = 0
+                cambiamento.notify_all()
+
+    async def worker():
+        nonlocal fermi
+        while True:
+            if arresto is not None and arresto.scattato():
+                return
+            scelto = prossimo_lavoro()
+            if scelto is None:
+                # Un host può risultare finito anche qui: prossima() ha appena scoperto che
+                # le porte erano esaurite dopo che il suo ultimo probe era già tornato
+                for host in [h for h in attivi if h.finito()]:
+                    host.open_ports.sort()
+                    attivi.remove(host)
+                if not attivi:
+                    await sveglia_tutti()
+                    return
+                async with cambiamento:
+                    if not fine():  # ricontrollo: prendere il lock può aver ceduto il turno
+                        fermi += 1
+                        await cambiamento.wait()  # host attivi tutti saturi e nessun host nuovo da attivare
+                continue
+
+            host, (port, tentativo) = scelto
+            rtt = host.rtt
+            limite = host.limite(per_host)
+            host.in_volo += 1
+            try:
+                stato, trascorso = await sonda_porta_async(host.ip, port, min(rtt.massimo, rtt.timeout() * (2 ** tentativo)))
+            finally:
+                host.in_volo -= 1
+            m = metriche.registro
+            m.osserva("porte.connect_s", trascorso)
+
+            if stato == FILTRATA:
+                host.scaduti += 1
+                if tentativo < tentativi and rtt.vale_la_pena_ritentare(tentativo):
+                    m.conta("porte.ritentativi")
+                    rtt.ritentativi += 1
+                    host.da_ritentare.append((port, tentativo + 1))
+                else:
+                    m.conta(f"porte.esito.{stato}")
+                    if on_esito:
+                        on_esito(host.ip, port, stato)
+            else:
+                m.conta(f"porte.esito.{stato}")
+                if on_esito:
+                    on_esito(host.ip, port, stato)
+                rtt.risposte += 1
+                rtt.campione(trascorso)
+                if tentativo:
+                    rtt.recuperati += 1
+                if stato == APERTA:
+                    host.open_ports.append(port)
+                    if arresto is not None:
+                        arresto.porta_aperta()
+                    if on_open:
+                        on_open(host.ip, port)
+
+            if host.finito():
+                host.open_ports.sort()  # i worker finiscono in ordine sparso
+                attivi.remove(host)
+            # Lo slot appena liberato (o il ritentativo appena messo in coda) lo prende
+            # questo stesso worker al giro successivo: chi aspetta va svegliato solo
+            # quando non c'è più nessun host attivo (o la scansione va fermata), per farlo uscire,
+            # o quando la finestra dell'host si è appena aperta (primo campione di RTT).
+            if fermi and (fine() or host.limite(per_host) > limite):
+                await sveglia_tutti()
+
+    n_worker = limite_concorrenza(concorrenza)
+    await asyncio.gather(*(worker() for _ in range(n_worker)))
+    for open_ports in risultati.values():
+        open_ports.sort()   # con l'arresto anticipato gli host non finiti non sono stati ordinati
+    return risultati
+
+
+async def scan_ports_async(target_ip, ports, timeout=0.3, concorrenza=CONCORRENZA_DEFAULT, on_open=None,
+                           rtt=None, tentativi=2, on_esito=None, arresto=None):
+    """
+    Scansiona la lista di porte tenendo al massimo 'concorrenza' connect in volo.
+    Invece di creare un task per ogni porta (65535 task in memoria) avviamo solo
+    'concorrenza' worker che si dividono lo stesso iteratore di porte.
+    on_open(port) viene chiamata appena una porta risulta aperta.
+
+    Il timeout di ogni probe viene dallo StimatoreRTT dell'host ('timeout' è solo il
+    valore di partenza). Le porte andate in timeout vengono rimesse in coda, con
+    timeout raddoppiato, al massimo 'tentativi' volte e solo se lo stimatore pensa
+    che il pacchetto sia andato perso.
+    Le porte vengono provate nell'ordine di 'ports' (vedi ordina_porte); con un
+    Arresto la scansione si ferma appena la politica scatta.
+    """
+    if rtt is None:
+        rtt = StimatoreRTT(timeout_iniziale=timeout)
+    ports = list(ports)
+    concorrenza = min(concorrenza, len(ports)) or 1
+    callback = (lambda ip, port: on_open(port)) if on_open else None
+
+    risultati = await _motore_scansione([StatoHost(target_ip, ports, rtt)], concorrenza, concorrenza,
+                                        tentativi, callback, on_esito, arresto)
+    return risultati.get(target_ip, [])
+
+# ---SCOPERTA HOST SENZA UN PROCESSO PING PER INDIRIZZO---
+def _checksum_icmp(data):
+    if len(data) % 2:
+        data += b"\0"
+    somma = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    somma = (somma >> 16) + (somma & 0xFFFF)
+    somma += somma >> 16
+    return ~somma & 0xFFFF
+
+def scopri_host_icmp(ips, timeout=1.0, pacchetti_al_secondo=2000):
+    """
+    Manda un echo request a ogni IP da un unico socket ICMP e raccoglie le risposte.
+    Prova prima il "ping socket" non privilegiato di Linux (SOCK_DGRAM + IPPROTO_ICMP),
+    poi il socket raw (serve root). Ritorna {ip: rtt_in_secondi} degli host che
+    rispondono, oppure None se nessuno dei due socket è disponibile.
+    """
+    raw = False
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except OSError:
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            raw = True
+        except OSError:
+            return None
+
+    identificativo = os.getpid() & 0xFFFF  # con il ping socket il kernel lo sostituisce con il suo
+    inviati = {}
+    vivi = {}
+    intervallo = 1.0 / pacchetti_al_secondo
+
+    def ricevi(fino_a):
+        while True:
+            attesa = fino_a - time.perf_counter()
+            if attesa <= 0 or not select.select([sock], [], [], attesa)[0]:
+                return
+            try:
+                dati, (ip, _) = sock.recvfrom(1024)
+            except OSError:
+                continue
+            if raw:
+                dati = dati[(dati[0] & 0x0F) * 4:]  # il socket raw include l'header IP
+            if len(dati) >= 8 and dati[0] == 0 and ip in inviati and ip not in vivi:  # tipo 0 = echo reply
+                if raw and struct.unpack("!H", dati[4:6])[0] != identificativo:
+                    continue  # risposta a un ping di un altro processo
+                vivi[ip] = time.perf_counter() - inviati[ip]
+
+    try:
+        for seq, ip in enumerate(ips):
+            header = struct.pack("!BBHHH", 8, 0, 0, identificativo, seq & 0xFFFF)
+            payload = b"port_scanner_v3!"
+            pacchetto = struct.pack("!BBHHH", 8, 0, _checksum_icmp(header + payload), identificativo, seq & 0xFFFF) + payload
+            inviati[ip] = time.perf_counter()
+            try:
+                sock.sendto(pacchetto, (ip, 0))
+            except OSError:
+                pass  # es. indirizzo di broadcast o rete non raggiungibile
+            ricevi(time.perf_counter() + intervallo)  # intanto leggiamo le risposte già arrivate
+        ricevi(time.perf_counter() + timeout)
+    finally:
+        sock.close()
+    return vivi
+
+async def scopri_host_tcp(ips, porte=(80, 443, 22, 445, 139, 21, 23, 25, 3389, 8080), timeout=1.0,
+                          concorrenza=CONCORRENZA_DEFAULT):
+    """
+    "TCP ping": un host è vivo se almeno una delle porte risponde, con SYN/ACK o con RST.
+    Serve per gli host che bloccano l'ICMP. Ritorna {ip: rtt_in_secondi}.
+    """
+    ips = list(ips)
+    vivi = {}
+    coppie = iter([(ip, port) for port in porte for ip in ips])  # prima la porta 80 di tutti, poi la 443, ...
+
+    async def worker():
+        for ip, port in coppie:
+            if ip in vivi:
+                continue
+            stato, trascorso = await sonda_porta_async(ip, port, timeout)
+            if stato != FILTRATA and ip not in vivi:
+                vivi[ip] = trascorso
+
+    n_worker = min(limite_concorrenza(concorrenza), len(ips) * len(porte)) or 1
+    await asyncio.gather(*(worker() for _ in range(n_worker)))
+    return vivi
+
+async def scopri_host(ips, timeout=1.0, concorrenza=CONCORRENZA_DEFAULT):
+    """
+    Scoperta host in parallelo: ICMP da un unico socket (in un thread, così non
+    blocca l'event loop) e TCP ping asincrono per chi non ha risposto al ping.
+    Ritorna {ip: StimatoreRTT} con il primo campione di RTT già inserito.
+    """
+    ips = list(dict.fromkeys(ips))  # niente doppioni, ordine preservato
+    loop = asyncio.get_running_loop()
+    vivi = await loop.run_in_executor(None, scopri_host_icmp, ips, timeout) or {}
+    restanti = [ip for ip in ips if ip not in vivi]
+    if restanti:
+        vivi.update(await scopri_host_tcp(restanti, timeout=timeout, concorrenza=concorrenza))
+
+    stimatori = {}
+    for ip in ips:  # manteniamo l'ordine di input
+        if ip in vivi:
+            stimatori[ip] = StimatoreRTT()
+            if vivi[ip] > 0:
+                stimatori[ip].campione(vivi[ip])
+    return stimatori
+
+# ---SWEEP DI PIÙ HOST / RETI CIDR---
+def espandi_target(targets):
+    """
+    Accetta IP, hostname e reti CIDR (es. "192.168.50.0/24") e ritorna la lista di IP.
+    Gli hostname vengono risolti tutti insieme in parallelo (e messi in cache);
+    quelli non risolvibili vengono segnalati e saltati.
+    """
+    targets = [t.strip() for t in targets if t.strip()]
+    nomi = []
+    for t in targets:
+        try:
+            ipaddress.ip_network(t, strict=False)
+        except ValueError:
+            nomi.append(t)
+    risolti = cache_dns.risolvi_molti(nomi) if nomi else {}
+
+    ips = []
+    for t in targets:
+        if t in risolti:
+            if risolti[t] is None:
+                print(f"[!] Errore: Hostname non risolvibile o non valido: {t}")
+            else:
+                ips.append(risolti[t])
+            continue
+        rete = ipaddress.ip_network(t, strict=False)
+        if rete.version != 4:
+            print(f"[!] Solo IPv4 supportato, salto {t}")
+            continue
+        if rete.num_addresses == 1:
+            ips.append(str(rete.network_address))
+        else:
+            ips.extend(str(ip) for ip in rete.hosts())  # esclude indirizzo di rete e broadcast
+    return ips
+
+async def sweep_async(stimatori, ports, concorrenza=CONCORRENZA_DEFAULT, per_host=PER_HOST_DEFAULT,
+                      tentativi=2, on_open=None, stato=None, arresto=None):
+    """
+    Scansiona le stesse porte su tutti gli host in 'stimatori' ({ip: StimatoreRTT}),
+    alternando i probe fra gli host con un unico budget globale di connect in volo.
+    Con uno StatoScansione vengono sondate solo le porte senza un risultato recente
+    e ogni esito viene registrato (con salvataggi periodici).
+    Ritorna {ip: [porte aperte]}, comprese quelle note dalla cache.
+    """
+    ports = list(ports)
+    in_cache = {}
+
+    def hosts():  # generatore: i filtri sulla cache si fanno solo quando l'host viene attivato
+        for ip, rtt in stimatori.items():
+            porte_host = ports
+            if stato is not None:
+                porte_host, in_cache[ip] = stato.da_sondare(ip, ports)
+            yield StatoHost(ip, porte_host, rtt)
+
+    on_esito = None
+    if stato is not None:
+        def on_esito(ip, port, esito):
+            stato.registra(ip, port, esito)
+            stato.checkpoint()
+
+    risultati = await _motore_scansione(hosts(), concorrenza, per_host, tentativi, on_open, on_esito, arresto)
+    for ip, aperte in in_cache.items():
+        risultati[ip] = sorted(set(risultati.get(ip, [])) | set(aperte))
+    return risultati
+
+# ---BANNER DEI SERVIZI---
+CONCORRENZA_BANNER = 100   # connessioni contemporanee per la lettura dei banner
+TIMEOUT_BANNER = 5.0       # tempo massimo per porta (connect compreso)
+ATTESA_BANNER = 2.0        # quanto aspettare che il servizio parli per primo prima di sollecitarlo
+SILENZIO_BANNER = 0.3      # dopo i primi byte, pausa che consideriamo "fine del banner"
+MAX_BYTE_BANNER = 1024
+
+_RICHIESTA_HTTP = b"HEAD / HTTP/1.0\r\nUser-Agent: port_scanner_v3\r\n\r\n"
+# porta -> (da mandare subito, da mandare dopo il primo banner)
+# HTTP non parla mai per primo; SMTP/POP3/IMAP salutano e rispondono a un comando innocuo con le loro capacità
+SOLLECITI = {
+    80: (_RICHIESTA_HTTP, None), 8000: (_RICHIESTA_HTTP, None), 8080: (_RICHIESTA_HTTP, None),
+    8180: (_RICHIESTA_HTTP, None), 8888: (_RICHIESTA_HTTP, None),
+    25: (None, b"EHLO port-scanner.local\r\n"), 587: (None, b"EHLO port-scanner.local\r\n"),
+    110: (None, b"CAPA\r\n"), 143: (None, b"a1 CAPABILITY\r\n"),
+    6379: (b"INFO server\r\n", None),
+    6667: (None, b"NICK scanner\r\nUSER scanner 0 * :scanner\r\n"),
+}
+SOLLECITO_GENERICO = b"\r\n\r\n"   # per i servizi muti: molti rispondono con un errore che li identifica
+
+
+def _testo_banner(dati):
+    """Byte del banner -> testo stampabile (i byte di controllo, es. la negoziazione telnet, diventano \\xNN)."""
+    try:
+        testo, binario = dati.decode("utf-8"), False
+    except UnicodeDecodeError:
+        testo, binario = dati.decode("latin-1"), True   # un carattere per byte: i byte alti diventano \\xNN
+    return "".join(c if c in "\r\n\t" or (c.isprintable() and not (binario and ord(c) >= 0x80))
+                   else f"\\x{ord(c):02x}" for c in testo).strip()
+
+
+async def _leggi_fino_al_silenzio(reader, dati, scadenza, primo_timeout):
+    """Aggiunge a 'dati' quello che arriva finché c'è silenzio, EOF, MAX_BYTE_BANNER o la scadenza."""
+    loop = asyncio.get_running_loop()
+    attesa = primo_timeout
+    while len(dati) < MAX_BYTE_BANNER:
+        resta = scadenza - loop.time()
+        if resta <= 0:
+            break
+        try:
+            blocco = await asyncio.wait_for(reader.read(MAX_BYTE_BANNER - len(dati)), min(attesa, resta))
+        except (asyncio.TimeoutError, OSError):
+            break
+        if not blocco:
+            break
+        dati += blocco
+        attesa = SILENZIO_BANNER
+
+async def leggi_banner(ip, port, timeout=TIMEOUT_BANNER):
+    """
+    Riapre la connessione alla porta e ne legge il banner. Se il servizio non parla per
+    primo entro ATTESA_BANNER lo sollecita (richiesta specifica per la porta o generica).
+    Ritorna il testo del banner, "" se il servizio resta muto, None se il connect fallisce.
+    """
+    loop = asyncio.get_running_loop()
+    scadenza = loop.time() + timeout
+    subito, dopo = SOLLECITI.get(port, (None, None))
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+    dati = bytearray()
+    try:
+        if subito:
+            writer.write(subito)
+            await writer.drain()
+            await _leggi_fino_al_silenzio(reader, dati, scadenza, timeout)
+        else:
+            await _leggi_fino_al_silenzio(reader, dati, scadenza, ATTESA_BANNER)
+            sollecito = dopo if dati else SOLLECITO_GENERICO
+            if sollecito and len(dati) < MAX_BYTE_BANNER and loop.time() < scadenza:
+                writer.write(sollecito)
+                await writer.drain()
+                await _leggi_fino_al_silenzio(reader, dati, scadenza, min(ATTESA_BANNER, timeout))
+    except OSError:
+        pass  # connessione chiusa dal servizio: teniamo quello che ha mandato
+    finally:
+        writer.close()
+    return _testo_banner(bytes(dati))
+
+async def leggi_banner_async(bersagli, concorrenza=CONCORRENZA_BANNER, timeout=TIMEOUT_BANNER, on_banner=None):
+    """
+    Legge i banner di tutte le coppie (ip, porta) in parallelo, con al massimo
+    'concorrenza' connessioni aperte: il tempo totale è circa quello del servizio
+    più lento. on_banner(ip, port, testo) viene chiamata appena un banner è pronto.
+    Ritorna {(ip, porta): testo}.
+    """
+    bersagli = list(bersagli)
+    coda = iter(bersagli)
+    banner = {}
+
+    async def worker():
+        for ip, port in coda:
+            inizio = time.perf_counter()
+            testo = await leggi_banner(ip, port, timeout)
+            m = metriche.registro
+            m.osserva("porte.banner_s", time.perf_counter() - inizio)
+            m.conta("porte.banner.letti" if testo else "porte.banner.muti")
+            banner[(ip, port)] = testo
+            if on_banner:
+                on_banner(ip, port, testo)
+
+    n_worker = min(limite_concorrenza(concorrenza), len(bersagli)) or 1
+    await asyncio.gather(*(worker() for _ in range(n_worker)))
+    return banner
+
+def stampa_banner(ip, port, testo, con_ip=False):
+    prefisso = f"{ip}: porta {port}" if con_ip else f"Porta {port}"
+    if testo is None:
+        print(f"[-] {prefisso}: connessione non riuscita per il banner")
+    elif not testo:
+        print(f"[-] {prefisso}: nessun banner")
+    else:
+        righe = testo.splitlines()
+        altro = f"  (+{len(righe) - 1} righe)" if len(righe) > 1 else ""
+        print(f"[+] {prefisso}: {righe[0][:120]}{altro}")
 
 # ---SCAN E OUTPUT SU TERMINALE---
-def port_scan(target, start_port, end_port):
+class PorteAperte(list):
+    """Porte aperte trovate da port_scan; 'banner' è {(ip, porta): testo} se i banner sono stati letti."""
+
+    def __init__(self, porte=(), banner=None):
+        super().__init__(porte)
+        self.banner = banner if banner is not None else {}
+
+class RisultatiSweep(dict):
+    """{ip: [porte aperte]} trovate da sweep; 'banner' come in PorteAperte."""
+
+    def __init__(self, risultati=(), banner=None):
+        super().__init__(risultati)
+        self.banner = banner if banner is not None else {}
+
+def port_scan(target, start_port, end_port, modalita="async", concorrenza=CONCORRENZA_DEFAULT, timeout=0.3,
+              stato=None, banner=False, ordine="crescente", seme=None, max_aperte=None, budget=None):
+    """
+    modalita="sync": una porta alla volta con socket bloccanti (comportamento originale).
+    modalita="async": connect non bloccanti con al massimo 'concorrenza' porte in volo.
+    In entrambi i casi 'timeout' è solo il valore iniziale: viene poi adattato al RTT misurato.
+    Con 'stato' (StatoScansione) la scansione riprende da dove si era fermata e
+    salta le porte con un risultato più recente del TTL.
+    Con banner=True alla fine legge in parallelo il banner di ogni porta aperta.
+    ordine="top" prova prima le porte più comuni e poi le altre in ordine casuale (ordina_porte);
+    max_aperte e budget (secondi) fermano la scansione in anticipo (Arresto).
+    Le porte aperte vengono stampate appena trovate, con il tempo dall'inizio della scansione.
+    Ritorna la lista delle porte aperte (PorteAperte, con i banner letti in .banner),
+    None se l'host non è risolvibile o non risponde.
+    """
     try:
-        target_ip = socket.gethostbyname(target)
+        target_ip = cache_dns.risolvi(target)
     except socket.gaierror:
         print("\n[!] Errore: Hostname non risolvibile o non valido.")
         return
@@ -47,7 +910,8 @@ def port_scan(target, start_port, end_port):
     # --- NUOVO BLOCCO: CONTROLLO HOST ---
     print(f"\n[*] Verifica stato host {target_ip} in corso...")
 
-    if  not check_host_up(target_ip):
+    rtt = StimatoreRTT(timeout_iniziale=timeout)
+    if  not check_host_up(target_ip, rtt):
         print(f"[!] Host {target_ip} non raggiungibile (sembra spento o blocca i ping).")
         print("[!] Scansione annullata.")
         return
@@ -56,40 +920,219 @@ def port_scan(target, start_port, end_port):
     # ------------------------------------
 
     print(f"[*] Scansione porte {start_port}–{end_port}")
+    porte = range(start_port, end_port + 1)
+    in_cache = []
+    registra = None
+    if stato is not None:
+        porte, in_cache = stato.da_sondare(target_ip, porte)
+        print(f"[*] File di stato {stato.percorso}: {end_port - start_port + 1 - len(porte)} porte già sondate, {len(porte)} da sondare")
+        for port in in_cache:
+            print(f"[+] Porta {port} APERTA (cache)")
+
+        def registra(ip, port, esito):
+            stato.registra(ip, port, esito)
+            stato.checkpoint()
+    porte = ordina_porte(porte, ordine, seme)
+    if ordine == "top":
+        print("[*] Ordine delle porte: prima le più comuni, poi le altre in ordine casuale")
+    print(f"[*] Timeout iniziale per probe: {rtt.timeout() * 1000:.1f} ms (si adatta durante la scansione)")
     print("[*] Ora di inizio:", datetime.now())
 
 
     open_ports = []
+    arresto = Arresto(max_aperte, budget) if max_aperte or budget else None
+    inizio = time.monotonic()
+    trovate = 0
+
+    def trovata(port):
+        # flush: anche con l'output rediretto su file/pipe la porta esce subito, non a fine scansione
+        nonlocal trovate
+        trascorso = time.monotonic() - inizio
+        if not trovate:
+            metriche.registro.osserva("porte.primo_risultato_s", trascorso)
+        trovate += 1
+        print(f"\n[+] Porta {port} APERTA  ({trascorso:.2f} s)", flush=True)
 
     try:
-        for port in range(start_port, end_port + 1):
-            # Opzionale: stampa un puntino per far vedere che sta lavorando
-            # print(".", end="", flush=True)
+        if modalita == "async":
+            print(f"[*] Modalità asincrona: massimo {concorrenza} connessioni contemporanee")
+            open_ports = asyncio.run(scan_ports_async(
+                target_ip, porte, timeout, concorrenza,
+                on_open=trovata, rtt=rtt, on_esito=registra, arresto=arresto,
+            ))
+        else:
+            for port in porte:
+                # Opzionale: stampa un puntino per far vedere che sta lavorando
+                # print(".", end="", flush=True)
+                if arresto is not None and arresto.scattato():
+                    break
 
-            if scan_time(target_ip, port):
-                # \n serve per andare a capo se stavi stampando i puntini
-                print(f"\n[+] Porta {port} APERTA")
-                open_ports.append(port)
+                esito = stato_porta(target_ip, port, timeout, rtt)
+                if registra:
+                    registra(target_ip, port, esito)
+                if esito == APERTA:
+                    # \n serve per andare a capo se stavi stampando i puntini
+                    trovata(port)
+                    open_ports.append(port)
+                    if arresto is not None:
+                        arresto.porta_aperta()
+            open_ports.sort()
 
     except KeyboardInterrupt:
         print("\n\n[!] Scansione interrotta dall'utente.")
+        if stato is not None:
+            stato.salva()
+            print(f"[*] Progressi salvati in {stato.percorso}: rilancia la scansione per riprendere.")
         sys.exit()
 
+    if stato is not None:
+        stato.salva()
+        open_ports = sorted(set(open_ports) | set(in_cache))
+
     print("\nScansione completata:", datetime.now())
+    if arresto is not None and arresto.motivo:
+        print(f"[*] Scansione fermata in anticipo: {arresto.motivo}")
+    if rtt.srtt is not None:
+        print(f"RTT medio stimato: {rtt.srtt * 1000:.2f} ms  -  timeout finale: {rtt.timeout() * 1000:.1f} ms")
 
     if open_ports:
         print(f"Totale porte aperte trovate: {len(open_ports)}")
     else:
         print("\nNessuna porta aperta trovata")
 
+    banner_letti = {}
+    if banner and open_ports:
+        print(f"\n[*] Lettura dei banner di {len(open_ports)} servizi...")
+        banner_letti = asyncio.run(leggi_banner_async([(target_ip, port) for port in open_ports],
+                                                      on_banner=stampa_banner))
+
+    return PorteAperte(open_ports, banner_letti)
+
+# ---SWEEP DI UNA RETE E OUTPUT SU TERMINALE---
+def sweep(targets, start_port, end_port, concorrenza=CONCORRENZA_DEFAULT, per_host=PER_HOST_DEFAULT, timeout=1.0,
+          stato=None, banner=False, ordine="crescente", seme=None, max_aperte=None, budget=None):
+    """
+    Scoperta host + scansione porte su più target (IP, hostname, reti CIDR).
+    Con 'stato' (StatoScansione) lo sweep è riprendibile e usa la cache dei risultati.
+    Con banner=True alla fine legge in parallelo il banner di ogni porta aperta trovata.
+    ordine, seme, max_aperte e budget come in port_scan (max_aperte vale su tutti gli host insieme).
+    Ritorna {ip: [porte aperte]} per gli host attivi (RisultatiSweep, con i banner letti in .banner).
+    """
+    ips = espandi_target(targets)
+    if not ips:
+        print("\n[!] Nessun indirizzo valido da scansionare.")
+        return RisultatiSweep()
+
+    print(f"\n[*] Scoperta host su {len(ips)} indirizzi in corso...")
+    print("[*] Ora di inizio:", datetime.now())
+
+    try:
+        stimatori = asyncio.run(scopri_host(ips, timeout, concorrenza))
+        print(f"[*] Host attivi: {len(stimatori)}/{len(ips)}")
+        if not stimatori:
+            return RisultatiSweep()
+
+        print(f"[*] Scansione porte {start_port}–{end_port} (max {concorrenza} connessioni, {per_host} per host)")
+        arresto = Arresto(max_aperte, budget) if max_aperte or budget else None
+        inizio = time.monotonic()
+        risultati = asyncio.run(sweep_async(
+            stimatori, ordina_porte(range(start_port, end_port + 1), ordine, seme), concorrenza, per_host,
+            on_open=lambda ip, port: print(f"[+] {ip}: porta {port} APERTA  ({time.monotonic() - inizio:.2f} s)",
+                                           flush=True),
+            stato=stato, arresto=arresto,
+        ))
+    except KeyboardInterrupt:
+        print("\n\n[!] Scansione interrotta dall'utente.")
+        if stato is not None:
+            stato.salva()
+            print(f"[*] Progressi salvati in {stato.percorso}: rilancia lo sweep per riprendere.")
+        sys.exit()
+
+    if stato is not None:
+        stato.salva()
+
+    print("\nScansione completata:", datetime.now())
+    if arresto is not None and arresto.motivo:
+        print(f"[*] Scansione fermata in anticipo: {arresto.motivo}")
+    for ip, open_ports in risultati.items():
+        if open_ports:
+            print(f"{ip}: {', '.join(str(p) for p in open_ports)}")
+    print(f"Totale porte aperte trovate: {sum(len(p) for p in risultati.values())}")
+
+    bersagli = [(ip, port) for ip, open_ports in risultati.items() for port in open_ports]
+    banner_letti = {}
+    if banner and bersagli:
+        print(f"\n[*] Lettura dei banner di {len(bersagli)} servizi...")
+        banner_letti = asyncio.run(leggi_banner_async(
+            bersagli, concorrenza, on_banner=lambda ip, port, testo: stampa_banner(ip, port, testo, con_ip=True)))
+    return RisultatiSweep(risultati, banner_letti)
+
+# ---RIGA DI COMANDO (NON INTERATTIVA)---
+def _intervallo_porte(testo):
+    """"80", "1-1024" -> (inizio, fine)"""
+    inizio, _, fine = testo.partition("-")
+    inizio, fine = int(inizio), int(fine or inizio)
+    if not 1 <= inizio <= fine <= 65535:
+        raise ValueError(testo)
+    return inizio, fine
+
+def cli(argv=None):
+    """Stessa scansione del menu interattivo, ma guidata dagli argomenti (per script e cicli)."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="portscan", description="Port scanner TCP connect (singolo host o sweep)")
+    parser.add_argument("target", help="IP, hostname o rete CIDR; più target separati da virgola")
+    parser.add_argument("-p", "--porte", default="1-1024", help="porta o intervallo, es. 80 o 1-65535 (default 1-1024)")
+    parser.add_argument("-c", "--concorrenza", type=int, default=CONCORRENZA_DEFAULT,
+                        help=f"connessioni contemporanee (default {CONCORRENZA_DEFAULT}, 1 = scansione classica)")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_DEFAULT, help="connessioni per host nello sweep")
+    parser.add_argument("--timeout", type=float, help="timeout iniziale per probe in secondi")
+    parser.add_argument("--stato", metavar="FILE", help="file di stato per riprendere la scansione / cache")
+    parser.add_argument("-b", "--banner", action="store_true", help="legge il banner dei servizi sulle porte aperte")
+    parser.add_argument("--ordine", choices=ORDINI, default="crescente",
+                        help="crescente, oppure top: prima le porte più comuni, poi le altre in ordine casuale")
+    parser.add_argument("--seme", type=int, help="seme dell'ordine casuale (per ripetere la stessa scansione)")
+    parser.add_argument("--max-aperte", type=int, metavar="N", help="si ferma dopo N porte aperte")
+    parser.add_argument("--budget", type=float, metavar="SECONDI", help="si ferma dopo SECONDI secondi di scansione")
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = _intervallo_porte(args.porte)
+    except ValueError:
+        parser.error(f"intervallo di porte non valido: {args.porte}")
+    stato = StatoScansione(args.stato) if args.stato else None
+
+    if "," in args.target or "/" in args.target:
+        sweep(args.target.split(","), start, end, concorrenza=max(args.concorrenza, 1), per_host=args.per_host,
+              timeout=args.timeout or 1.0, stato=stato, banner=args.banner, ordine=args.ordine, seme=args.seme,
+              max_aperte=args.max_aperte, budget=args.budget)
+    else:
+        modalita = "sync" if args.concorrenza <= 1 else "async"
+        if port_scan(args.target, start, end, modalita=modalita, concorrenza=args.concorrenza,
+                     timeout=args.timeout or 0.3, stato=stato, banner=args.banner, ordine=args.ordine,
+                     seme=args.seme, max_aperte=args.max_aperte, budget=args.budget) is None:
+            return 1
+    return 0
+
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
     try:
-        target_host = input("Inserisci IP o hostname: ")
+        target_host = input("Inserisci IP, hostname o rete CIDR (più target separati da virgola): ")
         start = int(input("Porta iniziale: "))
         end = int(input("Porta finale: "))
+        concorrenza = input(f"Connessioni contemporanee (invio = {CONCORRENZA_DEFAULT}, 1 = scansione classica): ").strip()
+        concorrenza = int(concorrenza) if concorrenza else CONCORRENZA_DEFAULT
+        file_stato = input("File di stato per riprendere/cache (invio = nessuno): ").strip()
+        stato = StatoScansione(file_stato) if file_stato else None
 
-        port_scan(target_host, start, end)
+        if "," in target_host or "/" in target_host:
+            sweep(target_host.split(","), start, end, concorrenza=max(concorrenza, 1), stato=stato)
+        elif concorrenza <= 1:
+            port_scan(target_host, start, end, modalita="sync", stato=stato)
+        else:
+            port_scan(target_host, start, end, concorrenza=concorrenza, stato=stato)
     except ValueError:
         print("Errore: Le porte devono essere numeri interi.")
     except KeyboardInterrupt:
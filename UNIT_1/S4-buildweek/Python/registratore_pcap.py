@@ -0,0 +1,242 @@
+"""
+Salvataggio dei frame grezzi in file pcap, a segmenti, senza rallentare la cattura.
+
+sniff(..., store=False) butta ogni pacchetto dopo averlo stampato: per tenere il
+traffico di una sessione lunga serve uno stadio di scrittura separato.
+
+- metti() è l'unica cosa che fa il percorso di cattura: copia il frame in un
+  AnelloFrame limitato e ritorna subito; se il disco non tiene il passo il frame
+  viene scartato e contato, la cattura non si ferma mai;
+- un thread di scrittura toglie i frame a lotti e scrive ogni lotto (header dei
+  record compresi) con una sola write() su un file con buffer grande;
+- il file viene chiuso e se ne apre uno nuovo ("segmento") oltre 'max_byte' o
+  'max_secondi'; un pcap ha un solo linktype, quindi catturando su interfacce di
+  tipo diverso (Ethernet e tun/wireguard) resta aperto un segmento per linktype;
+- con comprimi=True i segmenti chiusi vengono compressi in .pcap.gz da un altro
+  thread, così la compressione non ritarda la scrittura;
+- se la scrittura fallisce (cartella sparita, disco pieno, permessi) il thread si
+  ferma, chiude l'anello e l'errore viene rilanciato da metti() e da chiudi().
+
+I file sono pcap classici (microsecondi, little endian), rileggibili con
+pcap_io.LettorePcap, tcpdump -r e Wireshark.
+"""
+import concurrent.futures
+import errno
+import gzip
+import os
+import shutil
+import struct
+import threading
+import time
+from datetime import datetime
+
+import metriche
+from pipeline_sniffer import AnelloFrame
+
+MAGIC_PCAP = 0xA1B2C3D4
+PCAP_HEADER = struct.Struct("<IHHiIII")   # magic, versione 2.4, fuso, precisione, snaplen, linktype
+RECORD_HEADER = struct.Struct("<IIII")    # secondi, microsecondi, byte salvati, lunghezza originale
+SNAPLEN = 262144
+
+MAX_BYTE_DEFAULT = 100 * 1024 * 1024      # un segmento ogni 100 MB...
+MAX_SECONDI_DEFAULT = None                # ...e, se indicato, ogni tot secondi
+BUFFER_FILE = 1024 * 1024                 # buffer del file: le write() al kernel sono da 1 MB
+LOTTO = 4096                              # frame tolti dall'anello a ogni giro
+CAPACITA_DEFAULT = 65536                  # frame in attesa di essere scritti
+
+
+class RegistratorePcap:
+    """
+    Stadio di scrittura su disco a segmenti. Uso:
+
+        registratore = RegistratorePcap("cattura", max_byte=50_000_000, comprimi=True)
+        registratore.avvia()
+        ...
+        registratore.metti(ts, linktype, frame)    # dal percorso di cattura, non blocca
+        ...
+        registratore.chiudi()                      # scrive quello che resta e aspetta la compressione
+
+    I segmenti si chiamano <prefisso>-<numero>-<data_ora>.pcap (.pcap.gz se compressi);
+    il numero è unico anche fra segmenti di linktype diversi aperti insieme.
+    """
+
+    def __init__(self, prefisso, max_byte=MAX_BYTE_DEFAULT, max_secondi=MAX_SECONDI_DEFAULT,
+                 comprimi=False, capacita=CAPACITA_DEFAULT):
+        self.prefisso = prefisso
+        self.max_byte = max_byte
+        self.max_secondi = max_secondi
+        self.anello = AnelloFrame(capacita)
+        self.segmenti = []            # percorsi finali, nell'ordine in cui sono stati chiusi
+        self.scritti = 0
+        self.byte_scritti = 0
+        self._aperti = {}             # linktype -> Segmento aperto
+        self._numero = 0
+        self._compressore = concurrent.futures.ThreadPoolExecutor(1) if comprimi else None
+        self._compressioni = []
+        self.errore = None            # eccezione che ha fermato il thread di scrittura
+        self._thread = threading.Thread(target=self._scrivi, daemon=True)
+
+    def avvia(self):
+        """Controlla che la cartella dei segmenti sia scrivibile e fa partire il thread di scrittura."""
+        cartella = os.path.dirname(os.path.abspath(self.prefisso))
+        if not os.path.isdir(cartella):
+            raise FileNotFoundError(errno.ENOENT, "cartella dei segmenti inesistente", cartella)
+        if not os.access(cartella, os.W_OK | os.X_OK):
+            raise PermissionError(errno.EACCES, "cartella dei segmenti non scrivibile", cartella)
+        self._thread.start()
+        return self
+
+    def __enter__(self):
+        return self.avvia()
+
+    def __exit__(self, *exc):
+        self.chiudi()
+        return False
+
+    # ---------- percorso di cattura ----------
+    def metti(self, ts, linktype, frame, blocca=False):
+        """
+        Accoda una copia del frame; False se l'anello era pieno e il frame è stato scartato.
+        blocca=True aspetta invece che si liberi posto (riscrittura di un file, nessuna perdita).
+        Se il thread di scrittura si è fermato per un errore, lo rilancia.
+        """
+        if self.errore is None and self.anello.metti((ts, linktype, bytes(frame)), blocca):
+            return True
+        if self.errore is not None:
+            raise self.errore
+        return False
+
+    # ---------- thread di scrittura ----------
+    def _apri_segmento(self, linktype):
+        self._numero += 1
+        ora = datetime.now().strftime("%Y%m%d_%H%M%S")
+        segmento = Segmento(f"{self.prefisso}-{self._numero:05d}-{ora}.pcap", linktype)
+        self._aperti[linktype] = segmento
+        return segmento
+
+    def _chiudi_segmento(self, segmento):
+        del self._aperti[segmento.linktype]
+        try:
+            self.byte_scritti += segmento.svuota()
+        finally:
+            segmento.file.close()
+        if self._compressore is not None:
+            self._compressioni.append(self._compressore.submit(_comprimi, segmento.percorso))
+            self.segmenti.append(segmento.percorso + ".gz")
+        else:
+            self.segmenti.append(segmento.percorso)
+
+    def _chiudi_scaduti(self):
+        if not self.max_secondi:
+            return
+        limite = time.monotonic() - self.max_secondi
+        for segmento in [s for s in self._aperti.values() if s.apertura <= limite]:
+            self._chiudi_segmento(segmento)   # anche senza traffico il segmento scaduto si chiude
+
+    def _scrivi(self):
+        try:
+            self._ciclo_scrittura()
+        except BaseException as e:
+            self.errore = e
+            self.anello.chiudi()      # sblocca chi aspetta in metti(blocca=True)
+            for segmento in list(self._aperti.values()):
+                try:
+                    self._chiudi_segmento(segmento)
+                except OSError:
+                    pass
+
+    def _ciclo_scrittura(self):
+        pack = RECORD_HEADER.pack
+        dim_header = RECORD_HEADER.size
+        limite = self.max_byte or float("inf")
+        aperti = self._aperti
+        m = metriche.registro
+        while True:
+            lotto = self.anello.prendi_lotto(LOTTO, timeout=0.5)
+            if lotto is None:
+                break
+            self._chiudi_scaduti()
+            if not lotto:
+                continue
+
+            # I controlli per frame sono solo linktype e dimensione; il tempo si guarda una volta per lotto
+            segmento = None
+            for ts, linktype, frame in lotto:
+                if segmento is None or linktype != segmento.linktype:
+                    segmento = aperti.get(linktype) or self._apri_segmento(linktype)
+                if segmento.byte >= limite:
+                    self._chiudi_segmento(segmento)
+                    segmento = self._apri_segmento(linktype)
+                secondi = int(ts)
+                lunghezza = len(frame)
+                blocco = segmento.blocco
+                blocco += pack(secondi, int((ts - secondi) * 1e6), lunghezza, lunghezza)
+                blocco += frame
+                segmento.byte += dim_header + lunghezza
+            for segmento in aperti.values():
+                self.byte_scritti += segmento.svuota()
+            self.scritti += len(lotto)
+            m.conta("sniffer.scritti", len(lotto))
+        for segmento in list(aperti.values()):
+            self._chiudi_segmento(segmento)
+
+    # ---------- chiusura ----------
+    def chiudi(self):
+        """
+        Scrive i frame ancora nell'anello, chiude l'ultimo segmento e aspetta le compressioni.
+        Rilancia l'eventuale errore del thread di scrittura o della compressione.
+        """
+        self.anello.chiudi()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self._compressore is not None:
+            self._compressore.shutdown(wait=True)
+            for compressione in self._compressioni:
+                compressione.result()   # fa emergere eventuali errori (es. disco pieno)
+        metriche.registro.conta("sniffer.scartati_scrittura", self.anello.scartati)
+        if self.errore is not None:
+            raise self.errore
+
+    def statistiche(self):
+        return {
+            "scritti": self.scritti,
+            "scartati": self.anello.scartati,
+            "byte": self.byte_scritti,
+            "segmenti": len(self.segmenti),
+        }
+
+
+class Segmento:
+    """Un file pcap aperto: un linktype solo, con il blocco di record in attesa della prossima write()."""
+    __slots__ = ("percorso", "linktype", "file", "blocco", "byte", "apertura")
+
+    def __init__(self, percorso, linktype):
+        self.percorso = percorso
+        self.linktype = linktype
+        self.file = open(percorso, "wb", buffering=BUFFER_FILE)
+        self.file.write(PCAP_HEADER.pack(MAGIC_PCAP, 2, 4, 0, 0, SNAPLEN, linktype))
+        self.blocco = bytearray()
+        self.byte = PCAP_HEADER.size
+        self.apertura = time.monotonic()
+
+    def svuota(self):
+        """Scrive il blocco in attesa con una sola write(); ritorna i byte scritti."""
+        n = len(self.blocco)
+        if n:
+            self.file.write(self.blocco)
+            self.blocco = bytearray()
+        return n
+
+
+def _comprimi(percorso):
+    """percorso -> percorso.gz, poi cancella l'originale (gira nel thread di compressione)."""
+    with open(percorso, "rb") as sorgente, gzip.open(percorso + ".gz", "wb", compresslevel=6) as destinazione:
+        shutil.copyfileobj(sorgente, destinazione, BUFFER_FILE)
+    os.remove(percorso)
+    return percorso + ".gz"
+
+
+def formatta_statistiche(dati):
+    return (f"[registratore] frame scritti {dati['scritti']:,} | scartati {dati['scartati']:,} | "
+            f"{dati['byte'] / 1e6:,.1f} MB in {dati['segmenti']} segmenti")
+
@@ -1,39 +1,391 @@
-from scapy.all import sniff, IP, TCP, ARP    #---> libreria scapy è uno strumento molto potente per i pacchetti di rete, ci permette di creare pacchetti, inviare ricevere pacchetti, analizzare il traffico ed effettuare scansioni
+# scapy ---> libreria molto potente per i pacchetti di rete, ci permette di creare pacchetti, inviare ricevere pacchetti, analizzare il traffico ed effettuare scansioni
+# Il suo import richiede secondi: la importiamo solo dentro le funzioni che la usano (cattura live e
+# ripiego della decodifica), così "-r file.pcap" o "--help" partono subito.
 from datetime import datetime        #---> usiamo datetime per aggiungere un tempo di scansione
+import socket
+import struct
+import sys
+import time
+
+import metriche
+import pcap_io
                                                       #abbiamo scritto questo programma per intercettare i protocolli ARP,TCP,IPv4, PAYLOAD
-def packet_handler(packet):
-    timestamp = datetime.now().strftime("%H:%M:%S")       
 
+# ===== DECODIFICA VELOCE =====
+# La dissezione completa di scapy costruisce un oggetto per ogni layer e ogni campo:
+# per stampare una riga ci servono però solo pochi campi a offset fissi.
+# decodifica_veloce() li legge direttamente dai byte del frame con struct e ricorre
+# a scapy solo per i frame che non sa interpretare (NON_DECODIFICATO).
+ETH_HDR = struct.Struct("!6s6sH")                    # MAC dst, MAC src, ethertype
+VLAN_HDR = struct.Struct("!HH")                      # TCI, ethertype interno
+ARP_HDR = struct.Struct("!HHBBH6s4s6s4s")            # hwtype, ptype, hwlen, plen, op, hwsrc, psrc, hwdst, pdst
+IPV4_HDR = struct.Struct("!BxHxxHxB2x4s4s")          # ver/ihl, len, flags/frag, proto, src, dst
+TCP_HDR = struct.Struct("!HH8xBB")                   # sport, dport, data offset (+NS), flags
+
+NON_DECODIFICATO = object()  # il frame va passato a scapy
+
+# Stessa resa di str(tcp.flags) in scapy: una lettera per ogni bit acceso, dal bit 0 al bit 8
+TCP_FLAG_LETTERE = "FSRPAUECN"
+TCP_FLAGS = [
+    "".join(lettera for bit, lettera in enumerate(TCP_FLAG_LETTERE) if valore >> bit & 1)
+    for valore in range(512)
+]
+
+# Protocolli che scapy può "aprire" fino a trovare un IP/TCP interno: lì serve la dissezione completa
+IP_PROTO_INCAPSULATI = {1, 4, 41, 47}                # ICMP (TCP citato negli errori), IP-in-IP, IPv6, GRE
+UDP_PORTE_TUNNEL = {4789, 6081}                      # VXLAN, GENEVE
+IPV6_NH_DA_SCAPY = {0, 4, 43, 44, 50, 51, 60}        # header di estensione / IPv4 incapsulato
+
+
+def decodifica_veloce(frame):
+    """
+    Ritorna:
+    - ("ARP", op, psrc, pdst, hwsrc)
+    - ("TCP", ip_src, sport, ip_dst, dport, flags, payload_len)
+    - None se il frame non contiene nulla da stampare
+    - NON_DECODIFICATO se il frame va lasciato a scapy
+    """
+    if len(frame) < 14:
+        return NON_DECODIFICATO
+    _, _, ethertype = ETH_HDR.unpack_from(frame, 0)
+    return decodifica_l3(frame, ethertype, 14)
+
+
+def decodifica_l3(frame, ethertype, offset):
+    """Come decodifica_veloce(), partendo dal payload di livello 2 (ethertype + offset)."""
+    while ethertype in (0x8100, 0x88A8):             # tag VLAN (anche doppi): li saltiamo
+        if len(frame) < offset + 4:
+            return NON_DECODIFICATO
+        ethertype = VLAN_HDR.unpack_from(frame, offset)[1]
+        offset += 4
+
+    # ===== ARP =====
+    if ethertype == 0x0806:
+        if len(frame) < offset + 28:
+            return NON_DECODIFICATO
+        hwtype, ptype, hwlen, plen, op, hwsrc, psrc, _, pdst = ARP_HDR.unpack_from(frame, offset)
+        if hwtype != 1 or ptype != 0x0800 or hwlen != 6 or plen != 4:
+            return NON_DECODIFICATO
+        return ("ARP", op, socket.inet_ntoa(psrc), socket.inet_ntoa(pdst), bytes(hwsrc).hex(":"))
+
+    # ===== IPv4 / TCP =====
+    if ethertype == 0x0800:
+        if len(frame) < offset + 20:
+            return NON_DECODIFICATO
+        ver_ihl, ip_len, frag, proto, src, dst = IPV4_HDR.unpack_from(frame, offset)
+        ihl = (ver_ihl & 0x0F) * 4
+        if ver_ihl >> 4 != 4 or ihl < 20 or len(frame) < offset + ihl:
+            return NON_DECODIFICATO
+        if frag & 0x1FFF:
+            return None                               # frammento successivo al primo: scapy non vede un TCP
+        if proto != 6:
+            if proto in IP_PROTO_INCAPSULATI:
+                return NON_DECODIFICATO
+            if proto == 17 and len(frame) >= offset + ihl + 4:
+                sport, dport = VLAN_HDR.unpack_from(frame, offset + ihl)
+                if sport in UDP_PORTE_TUNNEL or dport in UDP_PORTE_TUNNEL:
+                    return NON_DECODIFICATO
+            return None
+
+        offset += ihl
+        if len(frame) < offset + 20:
+            return NON_DECODIFICATO
+        sport, dport, data_offset, flags = TCP_HDR.unpack_from(frame, offset)
+        tcp_len = (data_offset >> 4) * 4
+        if tcp_len < 20 or len(frame) < offset + tcp_len or (ip_len and ip_len - ihl < tcp_len):
+            return NON_DECODIFICATO
+        flags |= (data_offset & 1) << 8               # bit NS
+        # Come len(tcp.payload) in scapy: tutto quello che segue l'header TCP, padding Ethernet compreso
+        payload_len = len(frame) - offset - tcp_len
+        return ("TCP", socket.inet_ntoa(src), sport, socket.inet_ntoa(dst), dport, TCP_FLAGS[flags], payload_len)
+
+    if ethertype == 0x86DD:                           # IPv6: nessun IPv4/ARP da stampare, salvo incapsulamenti
+        if len(frame) < offset + 40:
+            return NON_DECODIFICATO
+        return NON_DECODIFICATO if frame[offset + 6] in IPV6_NH_DA_SCAPY else None
+
+    return NON_DECODIFICATO
+
+
+def decodifica_linktype(frame, linktype):
+    """Decodifica veloce per i link type più comuni nei pcap; gli altri vanno a scapy."""
+    if linktype == pcap_io.LINKTYPE_ETHERNET:
+        return decodifica_veloce(frame)
+    if linktype == pcap_io.LINKTYPE_LINUX_SLL and len(frame) >= 16:   # cattura su "any"
+        return decodifica_l3(frame, struct.unpack_from("!H", frame, 14)[0], 16)
+    if linktype in (pcap_io.LINKTYPE_RAW, pcap_io.LINKTYPE_IPV4) and frame:
+        versione = frame[0] >> 4
+        if versione == 4:
+            return decodifica_l3(frame, 0x0800, 0)
+        if versione == 6:
+            return decodifica_l3(frame, 0x86DD, 0)
+    return NON_DECODIFICATO
+
+
+def decodifica_frame(frame, linktype):
+    """decodifica_linktype() con ripiego su scapy: ritorna l'evento da stampare o None."""
+    evento = decodifica_linktype(frame, linktype)
+    if evento is NON_DECODIFICATO:
+        from scapy.all import conf
+        evento = evento_da_scapy(conf.l2types.get(linktype, conf.raw_layer)(bytes(frame)))
+    return evento
+
+
+def evento_da_scapy(packet):
+    """Stessi campi di decodifica_veloce(), presi da un pacchetto già sezionato da scapy."""
+    from scapy.all import IP, TCP, ARP
     # ===== ARP ===== ----- essendo ARP un protocollo di livello 2/3 va gestito prima di IP/TCP
     if packet.haslayer(ARP):     #verifica se il pacchetto contiene l'Arp
         arp = packet[ARP]
+        return ("ARP", arp.op, arp.psrc, arp.pdst, arp.hwsrc)
+
+    # ===== TCP =====
+    if packet.haslayer(IP) and packet.haslayer(TCP):    #verifica che il pacchetto contiene IP/TCP
+        ip = packet[IP]
+        tcp = packet[TCP]
+        return ("TCP", ip.src, tcp.sport, ip.dst, tcp.dport, str(tcp.flags), len(tcp.payload))
+    return None
 
-        if arp.op == 1:
+
+def formatta_evento(timestamp, evento):
+    if evento[0] == "ARP":
+        _, op_code, psrc, pdst, hwsrc = evento
+        if op_code == 1:
             op = "who-has"
-        elif arp.op == 2:
+        elif op_code == 2:
             op = "is-at"
         else:
-            op = f"op={arp.op}"
-
-        print(
+            op = f"op={op_code}"
+        return (
             f"{timestamp} ARP {op} "
-            f"{arp.psrc} -> {arp.pdst} "     #{arp.psrc}= IP SORGENTE / {arp.pdst}= IP destinatario
-            f"({arp.hwsrc})"  # ----> MAC sorgente
+            f"{psrc} -> {pdst} "     #{psrc}= IP SORGENTE / {pdst}= IP destinatario
+            f"({hwsrc})"  # ----> MAC sorgente
         )
 
-    # ===== TCP =====
-    elif packet.haslayer(IP) and packet.haslayer(TCP):    #verifica che il pacchetto contiene IP/TCP
-        ip = packet[IP]
-        tcp = packet[TCP]
+    _, src, sport, dst, dport, flags, payload_len = evento
+    return (
+        f"{timestamp} TCP "
+        f"{src}:{sport} -> {dst}:{dport} "
+        f"FLAGS=[{flags}] PAYLOAD={payload_len}B"
+    )
+
+
+class Orologio:
+    """strftime costa: l'orario "%H:%M:%S" viene ricalcolato solo quando cambia il secondo."""
+
+    def __init__(self):
+        self.secondo = None
+        self.testo = ""
+
+    def orario(self, t=None):
+        secondo = int(time.time() if t is None else t)
+        if secondo != self.secondo:
+            self.secondo = secondo
+            self.testo = datetime.fromtimestamp(secondo).strftime("%H:%M:%S")
+        return self.testo
+
+
+orologio = Orologio()
+
+# Modalità aggregata (--aggrega N): se impostato, gli eventi vanno nella tabella dei
+# flussi (flussi.Aggregatore) e ogni N secondi si stampa un riepilogo al posto delle righe.
+aggregatore = None
+
+# Salvataggio su disco (--scrivi PREFISSO): se impostato, ogni frame catturato viene anche
+# passato a un registratore_pcap.RegistratorePcap, che lo scrive in un altro thread.
+registratore = None
+
+
+def emetti(evento, ts=None, lunghezza=0):
+    """Stampa la riga dell'evento oppure lo passa all'aggregatore."""
+    if aggregatore is not None:
+        aggregatore.registra(time.time() if ts is None else ts, evento, lunghezza)
+    else:
+        print(formatta_evento(orologio.orario(ts), evento))
+
+
+def gestisci_frame(frame, cls=None, ts=None):
+    """
+    Percorso veloce per un frame grezzo. 'cls' è il tipo di link dato dal socket di
+    cattura (Ether nella quasi totalità dei casi); per gli altri tipi e per i frame
+    non riconosciuti si usa la dissezione di scapy.
+    'ts' è l'ora di cattura (dai pcap); se manca si usa l'ora attuale.
+    """
+    if cls is None or cls.__name__ == "Ether":
+        evento = decodifica_frame(frame, pcap_io.LINKTYPE_ETHERNET)
+    else:
+        evento = evento_da_scapy(cls(bytes(frame)))
+    if evento:
+        emetti(evento, ts, len(frame))
+
+
+def analizza_pcap(percorso):
+    """
+    Modalità offline: rilegge una cattura pcap/pcapng (anche di GB) con lo stesso
+    output della cattura live, usando l'ora registrata nel file. Non serve root.
+    """
+    with pcap_io.LettorePcap(percorso) as lettore:
+        elabora(lettore, senza_perdite=True)
+
+
+def elabora(sorgente, senza_perdite=False):
+    """
+    Decodifica ed emette ogni (ts, linktype, frame) di 'sorgente' (pcap o cattura live).
+    senza_perdite=True fa aspettare il registratore invece di scartare frame (file pcap).
+    """
+    m = metriche.registro
+    decodifica = m.avvolgi("sniffer.decodifica_s", decodifica_frame)  # senza metriche: decodifica_frame stessa
+    salva = registratore.metti if registratore is not None else None
+    pacchetti = 0
+    try:
+        for ts, linktype, frame in sorgente:
+            pacchetti += 1
+            if salva is not None:
+                salva(ts, linktype, frame, senza_perdite)
+            evento = decodifica(frame, linktype)
+            if evento:
+                emetti(evento, ts, len(frame))
+    finally:
+        m.conta("sniffer.pacchetti", pacchetti)
+
+
+def packet_handler(packet):
+    """Gestore originale per pacchetti già sezionati da scapy (es. sniff(prn=packet_handler))."""
+    m = metriche.registro
+    m.conta("sniffer.pacchetti")
+    if registratore is not None:
+        from scapy.config import conf
+        registratore.metti(float(getattr(packet, "time", time.time())),
+                           conf.l2types.layer2num.get(type(packet), pcap_io.LINKTYPE_ETHERNET), bytes(packet))
+    with m.cronometro("sniffer.decodifica_s"):
+        evento = evento_da_scapy(packet)
+    if evento:
+        emetti(evento, getattr(packet, "time", None), len(packet))
+
+
+def sorgente_live(filtro="tcp or arp", iface=None, tpacket=False):
+    """
+    Frame grezzi dal socket di cattura come tuple (timestamp, linktype, frame), senza decodifica.
+    Con tpacket=True (solo Linux) i frame arrivano dall'anello TPACKET_V3 di tpacket_ring, a blocchi,
+    invece che da scapy un recv alla volta.
+    """
+    if tpacket:
+        import tpacket_ring
+        yield from tpacket_ring.sorgente_tpacket(filtro, iface)
+        return
+    from scapy.all import conf
+    sock = conf.L2listen(iface=iface, filter=filtro)
+    try:
+        while True:
+            cls, frame, ts = sock.recv_raw()
+            if frame:
+                yield ts or time.time(), conf.l2types.layer2num.get(cls, pcap_io.LINKTYPE_ETHERNET), frame
+    finally:
+        sock.close()
+
+
+def cattura_live(filtro="tcp or arp", iface=None, tpacket=False):
+    """
+    Come sniff(filter=..., prn=packet_handler, store=False), ma i frame vengono letti
+    grezzi con recv_raw() (o dall'anello TPACKET_V3) e passano dalla decodifica veloce:
+    scapy seziona solo quelli che non riconosce.
+    """
+    elabora(sorgente_live(filtro, iface, tpacket))
+
+
+def cli(argv=None):
+    """Riga di comando: cattura live o analisi di un pcap, per riga o aggregata, in linea o a stadi."""
+    global aggregatore, registratore
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="sniff", description="Sniffer ARP/TCP (live o da file pcap/pcapng)")
+    parser.add_argument("-r", "--read", metavar="FILE", help="analizza un file pcap/pcapng invece di catturare")
+    parser.add_argument("-i", "--iface", help="interfaccia per la cattura live (default: tutte)")
+    parser.add_argument("-t", "--tpacket", action="store_true",
+                        help="cattura live da socket AF_PACKET con anello TPACKET_V3 e filtro BPF nel kernel (Linux)")
+    parser.add_argument("-a", "--aggrega", type=float, metavar="SECONDI",
+                        help="niente riga per pacchetto: riepilogo dei flussi TCP ogni SECONDI secondi")
+    parser.add_argument("--top", type=int, default=10, help="righe dei top talker/flussi nel riepilogo (default 10)")
+    parser.add_argument("--esporta", metavar="FILE.jsonl", help="aggiunge ogni riepilogo al file in formato JSON Lines")
+    parser.add_argument("--max-flussi", type=int, default=65536, help="flussi tenuti in memoria (LRU, default 65536)")
+    parser.add_argument("--timeout-flussi", type=float, default=120.0,
+                        help="secondi di inattività dopo cui un flusso viene chiuso (default 120)")
+    parser.add_argument("-p", "--pipeline", type=int, metavar="WORKERS",
+                        help="cattura, decodifica (WORKERS processi, 0 = un thread) e scrittura in stadi separati")
+    parser.add_argument("--anello", type=int, default=65536, help="frame in attesa fra cattura e decodifica (default 65536)")
+    parser.add_argument("--statistiche", type=float, metavar="SECONDI",
+                        help="con --pipeline: stampa su stderr scarti e profondità delle code ogni SECONDI secondi")
+    parser.add_argument("-w", "--scrivi", metavar="PREFISSO",
+                        help="salva anche i frame grezzi in file pcap PREFISSO-NNNNN-<data_ora>.pcap")
+    parser.add_argument("--ruota-mb", type=float, default=100.0, help="con --scrivi: nuovo file ogni N MB (default 100)")
+    parser.add_argument("--ruota-secondi", type=float, help="con --scrivi: nuovo file anche ogni N secondi")
+    parser.add_argument("--comprimi", action="store_true", help="con --scrivi: comprime in .gz i file chiusi")
+    args = parser.parse_args(argv)
+    if args.tpacket and args.read:
+        parser.error("-t/--tpacket vale solo per la cattura live, non con -r/--read")
+
+    errore = None
+    if args.scrivi:
+        import registratore_pcap
+        try:
+            registratore = registratore_pcap.RegistratorePcap(args.scrivi, int(args.ruota_mb * 1024 * 1024),
+                                                              args.ruota_secondi, args.comprimi).avvia()
+        except OSError as e:
+            print(f"errore: {e}", file=sys.stderr)
+            return 1
+    if args.aggrega:
+        import flussi
+        aggregatore = flussi.Aggregatore(args.aggrega, args.top, args.esporta,
+                                         args.max_flussi, args.timeout_flussi)
+        if not args.read:
+            aggregatore.avvia_timer()   # live: riepilogo ogni N secondi anche a link fermo
+
+    try:
+        if args.pipeline is not None:
+            import pipeline_sniffer
+            pipeline = pipeline_sniffer.PipelineSniffer(args.pipeline, args.anello, aggregatore=aggregatore,
+                                                        intervallo_statistiche=args.statistiche,
+                                                        registratore=registratore)
+            if args.read:
+                with pcap_io.LettorePcap(args.read) as lettore:
+                    finale = pipeline.esegui(lettore, senza_perdite=True)
+            else:
+                finale = pipeline.esegui(sorgente_live(iface=args.iface, tpacket=args.tpacket))
+            print(pipeline_sniffer.formatta_statistiche(finale), file=sys.stderr)
+        elif args.read:
+            analizza_pcap(args.read)
+        else:
+            cattura_live(iface=args.iface, tpacket=args.tpacket)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        _stdout_chiuso()  # es. output mandato a "head"
+    except OSError as e:
+        errore = e        # es. il registratore non riesce a scrivere i segmenti
+    finally:
+        # Prima il registratore: i frame già catturati finiscono su disco anche se stdout è chiuso
+        if registratore is not None:
+            try:
+                registratore.chiudi()
+            except OSError as e:
+                errore = errore or e
+            print(registratore_pcap.formatta_statistiche(registratore.statistiche()), file=sys.stderr)
+        if aggregatore is not None:
+            try:
+                aggregatore.chiudi()
+            except BrokenPipeError:
+                _stdout_chiuso()
+    if errore is not None:
+        print(f"errore: {errore}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _stdout_chiuso():
+    """Chi leggeva l'output (es. "head") ha chiuso la pipe: il resto va in /dev/null, senza traceback all'uscita."""
+    import os
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
 
-        print(
-            f"{timestamp} TCP "
-            f"{ip.src}:{tcp.sport} -> {ip.dst}:{tcp.dport} "
-            f"FLAGS=[{tcp.flags}] PAYLOAD={len(tcp.payload)}B"
-        )
 
-sniff(
-    filter="tcp or arp",
-    prn=packet_handler,
-    store=False
-)
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(cli())
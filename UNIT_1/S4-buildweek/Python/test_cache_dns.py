@@ -0,0 +1,124 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import cache_dns
+
+
+@pytest.fixture
+def dns_finto(monkeypatch):
+    """getaddrinfo finto: 'nomi' decide la risposta, 'chiamate' conta le risoluzioni vere."""
+    stato = {"nomi": {}, "chiamate": [], "sblocca": None}
+
+    def getaddrinfo(nome, porta, famiglia=0, tipo=0, *args):
+        stato["chiamate"].append(nome)
+        if stato["sblocca"] is not None:
+            stato["sblocca"].wait(5)
+        risposta = stato["nomi"].get(nome, socket.EAI_NONAME)
+        if isinstance(risposta, int):
+            raise socket.gaierror(risposta, "errore finto")
+        return [(f, socket.SOCK_STREAM, 6, "", (ip, 0)) for f, ip in risposta]
+
+    monkeypatch.setattr(cache_dns.socket, "getaddrinfo", getaddrinfo)
+    return stato
+
+
+def test_ttl_negativo_solo_per_i_nomi_inesistenti(dns_finto):
+    dns_finto["nomi"]["lento.example"] = socket.EAI_AGAIN
+    cache = cache_dns.CacheDNS(ttl_negativo=0.2)
+    for _ in range(3):
+        with pytest.raises(socket.gaierror) as errore:
+            cache.risolvi("inesistente.example")
+        assert errore.value.errno == socket.EAI_NONAME
+    assert dns_finto["chiamate"] == ["inesistente.example"]
+
+    time.sleep(0.25)                                   # scaduto il TTL negativo si riprova
+    with pytest.raises(socket.gaierror):
+        cache.risolvi("inesistente.example")
+    assert len(dns_finto["chiamate"]) == 2
+
+    for _ in range(2):                                 # errore temporaneo: mai in cache
+        with pytest.raises(socket.gaierror):
+            cache.risolvi("lento.example")
+    assert dns_finto["chiamate"][2:] == ["lento.example", "lento.example"]
+
+    dns_finto["nomi"]["lento.example"] = [(socket.AF_INET, "10.0.0.9")]
+    assert cache.risolvi("lento.example") == "10.0.0.9"
+
+
+def test_ttl_positivo_e_maiuscole(dns_finto):
+    dns_finto["nomi"]["a.example"] = [(socket.AF_INET, "10.0.0.1")]
+    cache = cache_dns.CacheDNS(ttl=0.2)
+    assert cache.risolvi("a.example") == cache.risolvi("A.EXAMPLE") == "10.0.0.1"
+    assert len(dns_finto["chiamate"]) == 1
+    time.sleep(0.25)
+    assert cache.risolvi("a.example") == "10.0.0.1" and len(dns_finto["chiamate"]) == 2
+
+
+def test_una_sola_risoluzione_in_corso_per_nome(dns_finto):
+    dns_finto["nomi"]["condiviso.example"] = [(socket.AF_INET, "10.0.0.2")]
+    dns_finto["sblocca"] = threading.Event()
+    cache = cache_dns.CacheDNS()
+    risultati = []
+    thread = [threading.Thread(target=lambda: risultati.append(cache.risolvi("condiviso.example")))
+              for _ in range(8)]
+    for t in thread:
+        t.start()
+    time.sleep(0.1)                                    # tutti dentro risolvi(): uno risolve, gli altri aspettano
+    assert dns_finto["chiamate"] == ["condiviso.example"]
+    dns_finto["sblocca"].set()
+    for t in thread:
+        t.join(5)
+    assert risultati == ["10.0.0.2"] * 8 and len(dns_finto["chiamate"]) == 1
+
+
+def test_chi_aspetta_riceve_anche_l_errore(dns_finto):
+    dns_finto["sblocca"] = threading.Event()
+    cache = cache_dns.CacheDNS()
+    errori = []
+
+    def risolvi():
+        try:
+            cache.risolvi("inesistente.example")
+        except socket.gaierror as e:
+            errori.append(e.errno)
+    thread = [threading.Thread(target=risolvi) for _ in range(4)]
+    for t in thread:
+        t.start()
+    time.sleep(0.1)
+    dns_finto["sblocca"].set()
+    for t in thread:
+        t.join(5)
+    assert errori == [socket.EAI_NONAME] * 4 and len(dns_finto["chiamate"]) == 1
+
+
+def test_lru_ip_letterali_e_preferenza_ipv4(dns_finto):
+    dns_finto["nomi"].update({f"h{i}.example": [(socket.AF_INET, f"10.0.1.{i}")] for i in range(3)})
+    dns_finto["nomi"]["doppio.example"] = [(socket.AF_INET6, "::1"), (socket.AF_INET, "127.0.0.1")]
+    cache = cache_dns.CacheDNS(max_voci=2)
+    assert cache.risolvi("192.168.1.1") == "192.168.1.1" and cache.risolvi("::0001") == "::1"
+    assert dns_finto["chiamate"] == []
+
+    cache.risolvi("h0.example")
+    cache.risolvi("h1.example")
+    cache.risolvi("h0.example")                        # h0 usato di recente: esce h1
+    cache.risolvi("h2.example")
+    cache.risolvi("h0.example")
+    cache.risolvi("h1.example")
+    assert dns_finto["chiamate"] == ["h0.example", "h1.example", "h2.example", "h1.example"]
+
+    assert cache.risolvi("doppio.example", socket.AF_UNSPEC) == "127.0.0.1"
+
+
+def test_risolvi_molti(dns_finto):
+    dns_finto["nomi"]["a.example"] = [(socket.AF_INET, "10.0.0.1")]
+    cache = cache_dns.CacheDNS()
+    nomi = ["a.example", "10.9.9.9", "a.example", "no.example"]
+    atteso = {"a.example": "10.0.0.1", "10.9.9.9": "10.9.9.9", "no.example": None}
+    assert cache.risolvi_molti(nomi) == atteso
+    assert sorted(dns_finto["chiamate"]) == ["a.example", "no.example"]
+    cache.svuota()
+    assert asyncio.run(cache.risolvi_molti_async(nomi)) == atteso
@@ -0,0 +1,77 @@
+import io
+import json
+import time
+
+import pytest
+
+import flussi
+
+
+def _tcp(src, sport=1000, dst="10.0.0.9", dport=80, flags="A"):
+    return ("TCP", src, sport, dst, dport, flags, 0)
+
+
+def test_tabella_espulsione_lru():
+    tabella = flussi.TabellaFlussi(max_flussi=2)
+    tabella.aggiorna(1.0, "10.0.0.1", 1, "10.0.0.9", 80, "S", 60)
+    tabella.aggiorna(2.0, "10.0.0.2", 2, "10.0.0.9", 80, "S", 60)
+    tabella.aggiorna(3.0, "10.0.0.1", 1, "10.0.0.9", 80, "A", 100)    # il primo torna il più recente
+    tabella.aggiorna(4.0, "10.0.0.3", 3, "10.0.0.9", 80, "S", 60)     # espelle 10.0.0.2, non 10.0.0.1
+    assert [chiave[0] for chiave in tabella.flussi] == ["10.0.0.1", "10.0.0.3"]
+    assert tabella.espulsi == 1
+    primo = tabella.flussi[("10.0.0.1", 1, "10.0.0.9", 80, "TCP")]
+    assert (primo.pacchetti, primo.byte, primo.flags(), primo.primo, primo.ultimo) == (2, 160, "S", 1.0, 3.0)
+
+
+def test_tabella_scadenza_inattivi():
+    tabella = flussi.TabellaFlussi(timeout_inattivi=10)
+    for i in range(5):
+        tabella.aggiorna(float(i), f"10.0.0.{i}", 1, "10.0.0.9", 80, "A", 1)
+    tabella.scadenza(12.5)                                            # fermi da più di 10 s: 0, 1 e 2
+    assert [chiave[0] for chiave in tabella.flussi] == ["10.0.0.3", "10.0.0.4"]
+    assert tabella.scaduti == 3
+
+
+def test_top_flussi():
+    tabella = flussi.TabellaFlussi()
+    for i, byte in enumerate([5, 50, 1, 50, 20]):
+        tabella.aggiorna(0.0, f"10.0.0.{i}", 1, "10.0.0.9", 80, "A", byte)
+    assert [(chiave[0], f.byte) for chiave, f in tabella.top_flussi(3)] == [
+        ("10.0.0.1", 50), ("10.0.0.3", 50), ("10.0.0.4", 20)]
+
+
+def test_aggregatore_riepilogo_sull_ora_dei_pacchetti(tmp_path):
+    uscita = io.StringIO()
+    esporta = tmp_path / "riepiloghi.jsonl"
+    aggregatore = flussi.Aggregatore(intervallo=5, top=2, esporta=str(esporta), uscita=uscita)
+    aggregatore.registra(100.0, _tcp("10.0.0.1"), 60)
+    aggregatore.registra(101.0, ("ARP", 1, "10.0.0.1", "10.0.0.2", "aa:bb:cc:dd:ee:ff"), 42)
+    aggregatore.registra(106.0, _tcp("10.0.0.2"), 1500)               # chiude il primo intervallo
+    aggregatore.chiudi()                                              # riepilogo finale parziale
+
+    righe = [json.loads(riga) for riga in esporta.read_text().splitlines()]
+    assert [(r["pacchetti"], r["arp"], r["byte"]) for r in righe] == [(2, 1, 102), (1, 0, 1500)]
+    assert righe[0]["top_talker"] == [{"ip": "10.0.0.1", "byte": 60}]
+    assert righe[1]["flussi_attivi"] == 2 and righe[1]["top_flussi"][0]["src"] == "10.0.0.2:1000"
+    assert uscita.getvalue().count("=====") == 4                      # due intestazioni, aperte e chiuse
+
+
+def test_aggregatore_timer_senza_pacchetti():
+    uscita = io.StringIO()
+    aggregatore = flussi.Aggregatore(intervallo=0.05, uscita=uscita).avvia_timer()
+    time.sleep(0.3)
+    aggregatore.chiudi()
+    assert uscita.getvalue().count("| 0 pacchetti") >= 2
+
+
+class _PipeChiusa(io.StringIO):
+    def write(self, testo):
+        raise BrokenPipeError("stdout chiuso")
+
+
+def test_aggregatore_errore_del_timer_rilanciato():
+    aggregatore = flussi.Aggregatore(intervallo=0.05, uscita=_PipeChiusa()).avvia_timer()
+    time.sleep(0.2)
+    with pytest.raises(BrokenPipeError):
+        aggregatore.registra(time.time(), _tcp("10.0.0.1"), 60)
+    aggregatore.chiudi()
@@ -0,0 +1,296 @@
+import csv
+import http.server
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import http_scanner_v3 as hs
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """/grande: 3 MB; /lento: 1 KB ogni 50 ms per sempre; il resto: "ciao"."""
+    protocol_version = "HTTP/1.1"
+
+    def _rispondi(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        corpo = {"/grande": b"x" * 3_000_000}.get(self.path, b"ciao")
+        lunghezza = 10_000_000 if self.path == "/lento" else len(corpo)
+        self.send_response(200)
+        self.send_header("Allow", "GET, HEAD, OPTIONS")
+        self.send_header("Set-Cookie", "a=1")
+        self.send_header("set-cookie", "b=2")
+        self.send_header("Content-Length", str(lunghezza))
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        try:
+            if self.path == "/lento":
+                while True:
+                    self.wfile.write(b"y" * 1024)
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            self.wfile.write(corpo)
+        except OSError:
+            pass   # il client ha smesso di leggere
+
+    do_GET = do_HEAD = do_OPTIONS = do_POST = do_PUT = do_DELETE = do_PATCH = _rispondi
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_http():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def porta_chiusa():
+    """Porta legata ma non in ascolto: ogni connect riceve subito RST."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        yield s.getsockname()[1]
+
+
+@pytest.fixture
+def server_che_chiude():
+    """Risponde a una sola richiesta per connessione e poi chiude, senza 'Connection: close'."""
+    ascolto = socket.create_server(("127.0.0.1", 0))
+    connessioni = []
+
+    def servi():
+        while True:
+            try:
+                conn, _ = ascolto.accept()
+            except OSError:
+                return
+            connessioni.append(conn)
+            with conn:
+                dati = b""
+                while b"\r\n\r\n" not in dati:
+                    pezzo = conn.recv(4096)
+                    if not pezzo:
+                        break
+                    dati += pezzo
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+
+    threading.Thread(target=servi, daemon=True).start()
+    yield ascolto.getsockname()[1], connessioni
+    ascolto.close()
+
+
+@pytest.mark.parametrize("metodo, riprova", [("GET", True), ("PUT", True), ("POST", False), ("PATCH", False)])
+def test_riprova_solo_metodi_idempotenti(server_che_chiude, metodo, riprova):
+    porta, connessioni = server_che_chiude
+    with hs.ConnectionPool() as pool:
+        assert hs.send_http_request("127.0.0.1", porta, "GET", "/", 5, pool, store=hs.BodyStore())["status"] == 200
+        if riprova:
+            r = hs.send_http_request("127.0.0.1", porta, metodo, "/", 5, pool, store=hs.BodyStore())
+            assert r["status"] == 200 and len(connessioni) == 2
+        else:
+            with pytest.raises(hs.STALE_CONNECTION_ERRORS):
+                hs.send_http_request("127.0.0.1", porta, metodo, "/", 5, pool, store=hs.BodyStore())
+
+
+def test_un_solo_ritentativo_con_piu_connessioni_morte(server_che_chiude):
+    # Tre connessioni inattive già chiuse dal server: la richiesta ne prova una e poi ne apre una nuova
+    porta, connessioni = server_che_chiude
+    with hs.ConnectionPool() as pool:
+        for _ in range(3):
+            conn = hs.open_connection("127.0.0.1", porta, 5)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            pool.release("127.0.0.1", porta, conn)
+        r = hs.send_http_request("127.0.0.1", porta, "GET", "/", 5, pool, store=hs.BodyStore())
+        assert r["status"] == 200 and len(connessioni) == 4
+        assert len(pool._idle[("127.0.0.1", porta)]) == 3   # due morte mai toccate + quella nuova
+
+
+def test_iter_batch_limite_per_host_senza_thread_fermi(monkeypatch):
+    # Richieste finte: si misura quante sono in volo per host e quanti thread le eseguono
+    lock = threading.Lock()
+    in_volo, massimo, thread = {}, {}, set()
+
+    def finta(host, port, method, path, timeout, pool=None, store=None):
+        with lock:
+            in_volo[host] = in_volo.get(host, 0) + 1
+            massimo[host] = max(massimo.get(host, 0), in_volo[host])
+            thread.add(threading.get_ident())
+        try:
+            if path == "/boom":
+                raise OSError("connessione rifiutata")
+            threading.Event().wait(0.002)
+            return {"ok": True, "method": method, "path": path, "status": 200}
+        finally:
+            with lock:
+                in_volo[host] -= 1
+
+    monkeypatch.setattr(hs, "send_http_request", finta)
+    targets = [("a.invalid", 80), ("b.invalid", 8080)]
+    percorsi = ["/", "/boom"] + [f"/p{i}" for i in range(20)]
+    risultati = list(hs.iter_batch(targets, percorsi, 1, workers=32, per_host=3))
+
+    chiavi = {(r["host"], r["port"], r["path"], r["method"]) for r in risultati}
+    assert len(risultati) == len(chiavi) == len(targets) * len(percorsi) * len(hs.VERBS_TO_TEST)
+    assert all(not r["ok"] and "rifiutata" in r["error"] for r in risultati if r["path"] == "/boom")
+    assert max(massimo.values()) <= 3
+    assert len(thread) <= 3 * len(targets)          # nessun thread in più fermo ad aspettare un host
+
+
+def test_corpo_completo(server_http):
+    store = hs.BodyStore()
+    r = hs.send_http_request("127.0.0.1", server_http, "GET", "/", 5, store=store)
+    atteso = hs.body_hasher()
+    atteso.update(b"ciao")
+    assert r["body_len"] == 4 and not r["body_truncated"]
+    assert r["body_digest"] == atteso.hexdigest() and store.get(r["body_digest"]) == "ciao"
+    head = hs.send_http_request("127.0.0.1", server_http, "HEAD", "/", 5, store=store)
+    assert head["body_len"] == 0 and not head["body_truncated"]
+
+
+def test_corpo_fermato_a_max_body_bytes(server_http):
+    with hs.ConnectionPool() as pool:
+        r = hs.send_http_request("127.0.0.1", server_http, "GET", "/grande", 5, pool,
+                                 max_body_bytes=100_000, store=hs.BodyStore())
+        assert r["body_truncated"] and r["body_len"] == 3_000_000      # dal Content-Length
+        assert not pool._idle.get(("127.0.0.1", server_http))          # connessione a metà: non riusata
+    store = hs.BodyStore()
+    r = hs.send_http_request("127.0.0.1", server_http, "GET", "/grande", 5, store=store)
+    assert r["body_truncated"] and hs.MAX_BODY_BYTES < 3_000_000     # limite di default
+    assert len(store.get(r["body_digest"])) == hs.BODY_PREVIEW_CHARS
+
+
+def test_corpo_fermato_alla_scadenza(server_http):
+    inizio = time.monotonic()
+    r = hs.send_http_request("127.0.0.1", server_http, "GET", "/lento", 5, max_body_seconds=0.3,
+                             store=hs.BodyStore())
+    assert time.monotonic() - inizio < 2
+    assert r["body_truncated"] and r["body_len"] == 10_000_000
+
+
+def test_run_scan_senza_server(tmp_path, monkeypatch, porta_chiusa):
+    # Tutte le richieste falliscono: i risultati d'errore devono bastare al report
+    monkeypatch.chdir(tmp_path)
+    righe = []
+    results, report = hs.run_scan("127.0.0.1", porta_chiusa, "x", 1, righe.append)
+
+    assert [r["method"] for r in results] == hs.VERBS_TO_TEST
+    assert all(not r["ok"] and r["path"] == "/x" and r["error"] for r in results)
+    testo = open(report, encoding="utf-8").read()
+    assert "GET /x" in testo and "ERROR:" in testo and "Saved report: " + report in righe
+    assert hs.error_fingerprint(results[0]["error"]) in testo
+
+
+def test_run_scan_con_server(tmp_path, monkeypatch, server_http):
+    monkeypatch.chdir(tmp_path)
+    results, report = hs.run_scan("127.0.0.1", server_http, "/", 5, lambda msg: None)
+
+    assert all(r["ok"] and r["status"] == 200 for r in results)
+    # lo store della scansione non sopravvive: l'anteprima del corpo resta nei risultati
+    assert {r["method"]: r["body_preview"] for r in results}["GET"] == "ciao"
+    assert {r["method"]: r["body_preview"] for r in results}["HEAD"] == ""
+    testo = open(report, encoding="utf-8").read()
+    assert "Allow (observed): GET, HEAD, OPTIONS" in testo
+    assert "Summary Table" in testo and "ciao" in testo
+
+
+def test_batch_impronte_errori_uguali_fra_report(tmp_path, monkeypatch, porta_chiusa):
+    monkeypatch.chdir(tmp_path)
+    summary, percorsi = hs.run_batch([("127.0.0.1", porta_chiusa)], ["/a", "/b"], 1, lambda msg: None,
+                                     workers=4, per_host=2, formats=("txt", "csv"))
+    txt, csv_path = percorsi
+    assert summary.errors == summary.requests == 2 * len(hs.VERBS_TO_TEST)
+
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        righe = list(csv.DictReader(f))
+    impronte = {r["fingerprint"] for r in righe}
+    assert len(impronte) == 1 and impronte.pop().startswith("error:")
+    testo = open(txt, encoding="utf-8").read()
+    assert righe[0]["fingerprint"] in testo
+    assert "Summary Table" not in testo   # nel batch la tabella per richiesta è opzionale
+
+
+def test_batch_report_non_cresce_con_le_richieste(tmp_path, monkeypatch, server_http):
+    monkeypatch.chdir(tmp_path)
+    percorsi = [f"/p{i}" for i in range(40)]
+    _, (txt,) = hs.run_batch([("127.0.0.1", server_http)], percorsi, 5, lambda msg: None, workers=8, per_host=4)
+    testo = open(txt, encoding="utf-8").read()
+    # una riga e un dettaglio per risposta distinta (GET/POST/... con corpo, HEAD senza), non 280 righe
+    assert "Requests: 280" in testo and "Distinct responses: 2" in testo
+    assert testo.count("first seen:") == 2
+
+
+def test_body_store_limitato():
+    store = hs.BodyStore(max_entries=2)
+    assert store.add("a", "A") and store.add("b", "B") and not store.add("a", "altro")
+    assert "a" in store                       # visto di nuovo: ora il più vecchio è "b"
+    assert store.add("c", "C")
+    assert len(store) == 2 and "b" not in store and store.get("a") == "A" and store.get("c") == "C"
+    assert hs.body_store.max_entries == hs.BODY_STORE_MAX_ENTRIES
+    assert hs.BodyStore().max_entries is None     # quelli dei report tengono ogni corpo distinto
+
+
+def test_store_globale_per_le_chiamate_dirette(server_http, monkeypatch):
+    monkeypatch.setattr(hs, "body_store", hs.BodyStore(max_entries=1))
+    hs.send_http_request("127.0.0.1", server_http, "GET", "/", 5)
+    hs.send_http_request("127.0.0.1", server_http, "HEAD", "/", 5)
+    assert len(hs.body_store) == 1
+
+
+def test_run_batch_report_in_streaming(tmp_path, monkeypatch, server_http, porta_chiusa):
+    monkeypatch.chdir(tmp_path)
+    targets = [("127.0.0.1", server_http), ("127.0.0.1", porta_chiusa)]
+    summary, (txt, jsonl, csv_path) = hs.run_batch(targets, ["/", "/a"], 2, lambda msg: None, workers=4,
+                                                   per_host=2, formats=("txt", "jsonl", "csv"))
+    n = len(targets) * 2 * len(hs.VERBS_TO_TEST)
+    assert summary.requests == n and summary.errors == n // 2
+
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        righe = list(csv.DictReader(f))
+    assert len(righe) == n and {r["status"] for r in righe} == {"200", ""}
+    with open(jsonl, encoding="utf-8") as f:
+        risultati = [r for r in map(json.loads, f) if r.get("type") != "body"]
+    assert len(risultati) == n
+
+    # il .txt rigenerato dal .jsonl ha le stesse sezioni di quello scritto in streaming
+    rigenerato = hs.render_txt_from_jsonl(jsonl, str(tmp_path / "rigenerato.txt"))
+    def sezioni(percorso):
+        return [riga for riga in open(percorso, encoding="utf-8") if not riga.startswith("Time:")]
+    assert sezioni(rigenerato) == sezioni(txt)
+
+
+def test_header_index_ripetuti():
+    h = hs.HeaderIndex([("Set-Cookie", "a=1"), ("Content-Type", "text/html"), ("set-cookie", "b=2")])
+    assert h.get("SET-COOKIE") == "a=1, b=2" and h.get_all("Set-Cookie") == ["a=1", "b=2"]
+    assert h.get("Location") == "" and h.get("Location", "-") == "-" and h.get_all("Location") == []
+    assert "content-type" in h and "Allow" not in h and len(h) == 3
+    assert h.items()[2] == ("set-cookie", "b=2")                     # maiuscole e ordine originali
+    copia = hs.HeaderIndex.from_json(json.loads(json.dumps(h.to_json())))
+    assert copia.items() == h.items()
+    assert hs.HeaderIndex.from_json({"Allow": "GET"}).get("allow") == "GET"
+    assert hs.get_header_case_insensitive({"ALLOW": "GET"}, "Allow") == "GET"
+
+
+def test_header_ripetuti_nella_risposta(server_http):
+    r = hs.send_http_request("127.0.0.1", server_http, "GET", "/", 5, store=hs.BodyStore())
+    assert r["headers"].get_all("Set-Cookie") == ["a=1", "b=2"]
+    assert hs.parse_allow(r["headers"]) == ["GET", "HEAD", "OPTIONS"]
+
+
+def test_drain_queue():
+    q = hs.queue.SimpleQueue()
+    assert hs.drain_queue(q, 3) == []
+    for i in range(10):
+        q.put(f"riga {i}")
+    assert hs.drain_queue(q, 3) == ["riga 7", "riga 8", "riga 9"]
+    assert q.empty()
+    q.put("ultima")
+    assert hs.drain_queue(q, 3) == ["ultima"]
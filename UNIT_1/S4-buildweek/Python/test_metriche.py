@@ -0,0 +1,102 @@
+import io
+import json
+import random
+import time
+
+import pytest
+
+import bench_sniffer
+import metriche
+import sniffer_tool4 as sniffer
+
+
+@pytest.fixture
+def registro():
+    """Registro vero per il test, poi di nuovo quello nullo."""
+    yield metriche.attiva()
+    metriche.disattiva()
+
+
+def test_percentili_entro_l_errore_dei_bucket():
+    rnd = random.Random(1)
+    valori = [rnd.lognormvariate(-6, 1.5) for _ in range(50_000)]
+    ist = metriche.Istogramma()
+    for v in valori:
+        ist.osserva(v)
+    ordinati = sorted(valori)
+    for p in (50, 90, 99):
+        esatto = ordinati[int(len(ordinati) * p / 100) - 1]
+        assert abs(ist.percentile(p) - esatto) / esatto < 0.1
+    assert len(ist.bucket) < 200                       # memoria costante, non un campione per valore
+    dati = ist.esporta()
+    assert dati["conteggio"] == 50_000 and dati["min"] == min(valori) and dati["max"] == max(valori)
+
+
+def test_valori_zero_e_negativi():
+    ist = metriche.Istogramma()
+    assert ist.percentile(50) == 0.0 and ist.esporta() == {"conteggio": 0}
+    for v in (0, 0, -1, 5):
+        ist.osserva(v)
+    assert ist.percentile(50) == 0.0 and ist.percentile(100) == 5
+    assert ist.esporta()["min"] == -1
+
+
+def test_contatori_istogrammi_e_json(registro, tmp_path):
+    registro.conta("richieste")
+    registro.conta("richieste", 4)
+    registro.osserva("latenza_s", 0.002)
+    with registro.cronometro("blocco_s"):
+        time.sleep(0.01)
+
+    def fallisce():
+        raise OSError("boom")
+    with pytest.raises(OSError):
+        registro.avvolgi("fallisce_s", fallisce)()
+    assert registro.avvolgi("somma_s", lambda a, b=0: a + b)(2, b=3) == 5
+
+    dati = json.load(open(registro.salva_json(str(tmp_path / "m.json")), encoding="utf-8"))
+    assert dati["contatori"]["richieste"]["totale"] == 5 and dati["contatori"]["richieste"]["al_secondo"] > 0
+    ist = dati["istogrammi"]
+    assert ist["blocco_s"]["min"] >= 0.01
+    assert ist["fallisce_s"]["conteggio"] == ist["somma_s"]["conteggio"] == ist["latenza_s"]["conteggio"] == 1
+
+
+def test_registro_nullo_non_tocca_le_funzioni():
+    metriche.disattiva()
+    nullo = metriche.registro
+
+    def f():
+        return 1
+    assert nullo.avvolgi("f_s", f) is f
+    with nullo.cronometro("x"):
+        nullo.conta("x")
+        nullo.osserva("x", 1)
+    assert nullo.esporta() == {}
+    assert metriche.attiva() is metriche.registro is metriche.attiva()    # attiva() due volte: stesso registro
+    metriche.disattiva()
+    assert not metriche.registro.attivo
+
+
+def test_attivato_dopo_l_import(registro):
+    # sniffer_tool4 legge metriche.registro a ogni chiamata, non quello presente all'import
+    sniffer.elabora(iter([]))
+    frame = bench_sniffer.frame_sintetico(random.Random(2))
+    sniffer.elabora(iter([(0.0, 1, frame)] * 3))
+    assert registro.contatori["sniffer.pacchetti"] == 3
+    assert registro.istogrammi["sniffer.decodifica_s"].conteggio == 3
+
+
+def test_profilo_a_campioni(tmp_path):
+    percorso = tmp_path / "campioni.txt"
+    uscita = io.StringIO()
+    with metriche.profila("campioni", str(percorso), uscita):
+        fine = time.perf_counter() + 0.2
+        while time.perf_counter() < fine:
+            pass
+    righe = percorso.read_text(encoding="utf-8").splitlines()
+    assert righe and all(riga.rsplit(" ", 1)[1].isdigit() for riga in righe)
+    assert any("test_profilo_a_campioni" in riga for riga in righe)
+    assert "%" in uscita.getvalue()
+    with pytest.raises(ValueError):
+        with metriche.profila("dtrace"):
+            pass
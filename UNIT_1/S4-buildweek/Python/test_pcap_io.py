@@ -0,0 +1,107 @@
+import struct
+
+import pytest
+
+import pcap_io
+
+
+def _pcap(record, magic=b"\xd4\xc3\xb2\xa1", ordine="<", linktype=pcap_io.LINKTYPE_ETHERNET):
+    """pcap classico: record = [(secondi, frazione, frame)]."""
+    dati = magic + struct.pack(ordine + "HHiIII", 2, 4, 0, 0, 65535, linktype)
+    for secondi, frazione, frame in record:
+        dati += struct.pack(ordine + "IIII", secondi, frazione, len(frame), len(frame)) + frame
+    return dati
+
+
+def _leggi(percorso):
+    with pcap_io.LettorePcap(str(percorso)) as lettore:
+        return lettore.formato, [(ts, linktype, bytes(f)) for ts, linktype, f in lettore]
+
+
+@pytest.mark.parametrize("magic, ordine, risoluzione", [
+    (b"\xd4\xc3\xb2\xa1", "<", 1e-6),
+    (b"\xa1\xb2\xc3\xd4", ">", 1e-6),
+    (b"\x4d\x3c\xb2\xa1", "<", 1e-9),
+])
+def test_pcap_classico(tmp_path, magic, ordine, risoluzione):
+    percorso = tmp_path / "c.pcap"
+    frame = [bytes([i]) * (i + 1) for i in range(50)]
+    percorso.write_bytes(_pcap([(100 + i, 500, f) for i, f in enumerate(frame)], magic, ordine))
+    formato, letti = _leggi(percorso)
+    assert formato == "pcap" and [f for _, _, f in letti] == frame
+    assert letti[3][:2] == (pytest.approx(103 + 500 * risoluzione), pcap_io.LINKTYPE_ETHERNET)
+
+
+def test_pcap_ultimo_record_troncato(tmp_path):
+    percorso = tmp_path / "t.pcap"
+    percorso.write_bytes(_pcap([(1, 0, b"intero"), (2, 0, b"tagliato")])[:-3])
+    assert [f for _, _, f in _leggi(percorso)[1]] == [b"intero"]
+
+
+def _blocco_pcapng(tipo, corpo, lunghezza=None):
+    corpo += bytes(-len(corpo) % 4)
+    lunghezza = lunghezza or 12 + len(corpo)
+    return struct.pack("<II", tipo, lunghezza) + corpo + struct.pack("<I", lunghezza)
+
+
+def _pcapng(*blocchi):
+    shb = _blocco_pcapng(pcap_io.PCAPNG_SHB, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    return shb + b"".join(blocchi)
+
+
+def _idb(linktype, tsresol=None):
+    opzioni = b""
+    if tsresol is not None:
+        opzioni = struct.pack("<HHB3x", 9, 1, tsresol) + struct.pack("<HH", 0, 0)
+    return _blocco_pcapng(pcap_io.PCAPNG_IDB, struct.pack("<HHI", linktype, 0, 0) + opzioni)
+
+
+def _epb(interfaccia, ts, frame, cap_len=None):
+    cap_len = len(frame) if cap_len is None else cap_len
+    corpo = struct.pack("<IIIII", interfaccia, ts >> 32, ts & 0xFFFFFFFF, cap_len, len(frame)) + frame
+    return _blocco_pcapng(pcap_io.PCAPNG_EPB, corpo)
+
+
+def test_pcapng_due_interfacce(tmp_path):
+    percorso = tmp_path / "due.pcapng"
+    percorso.write_bytes(_pcapng(
+        _idb(pcap_io.LINKTYPE_ETHERNET),
+        _idb(pcap_io.LINKTYPE_RAW, tsresol=9),
+        _epb(0, 1_500_000, b"eth"),
+        _epb(1, 2_000_000_000, b"raw!"),
+        _blocco_pcapng(pcap_io.PCAPNG_SPB, struct.pack("<I", 3) + b"spb"),
+    ))
+    formato, letti = _leggi(percorso)
+    assert formato == "pcapng"
+    assert letti == [(1.5, pcap_io.LINKTYPE_ETHERNET, b"eth"), (2.0, pcap_io.LINKTYPE_RAW, b"raw!"),
+                     (0.0, pcap_io.LINKTYPE_ETHERNET, b"spb")]
+
+
+@pytest.mark.parametrize("blocchi", [
+    (_epb(0, 1, b"x"),),                                                        # EPB senza nessun IDB
+    (_idb(pcap_io.LINKTYPE_ETHERNET), _epb(3, 1, b"x")),                        # interfaccia mai descritta
+    (_blocco_pcapng(pcap_io.PCAPNG_SPB, struct.pack("<I", 1) + b"x"),),         # SPB prima dell'IDB
+    (_idb(pcap_io.LINKTYPE_ETHERNET), _epb(0, 1, b"abcd", cap_len=100), _epb(0, 2, b"dopo")),  # cap_len oltre il blocco
+    (_idb(pcap_io.LINKTYPE_ETHERNET), _blocco_pcapng(pcap_io.PCAPNG_EPB, bytes(12))),          # EPB di 24 byte
+    (_idb(pcap_io.LINKTYPE_ETHERNET), _blocco_pcapng(pcap_io.PCAPNG_SPB, b"")),                # SPB di 12 byte
+])
+def test_pcapng_corrotto_si_ferma(tmp_path, blocchi):
+    percorso = tmp_path / "corrotto.pcapng"
+    percorso.write_bytes(_pcapng(*blocchi))
+    assert _leggi(percorso)[1] == []
+
+
+@pytest.mark.parametrize("contenuto", [b"", b"ab", b"non sono un pcap", b"\xd4\xc3\xb2\xa1" + bytes(10)])
+def test_file_non_pcap_chiude_il_file(tmp_path, monkeypatch, contenuto):
+    percorso = tmp_path / "finto.pcap"
+    percorso.write_bytes(contenuto)
+    aperti = []
+
+    def open_tracciato(*args, **kwargs):
+        aperti.append(open(*args, **kwargs))
+        return aperti[-1]
+
+    monkeypatch.setattr(pcap_io, "open", open_tracciato, raising=False)
+    with pytest.raises(ValueError):
+        pcap_io.LettorePcap(str(percorso))
+    assert aperti and all(f.closed for f in aperti)
@@ -0,0 +1,88 @@
+import io
+import random
+import threading
+
+import pytest
+
+import bench_sniffer
+import pcap_io
+import pipeline_sniffer as ps
+import sniffer_tool4 as sniffer
+
+
+def test_anello_giro_completo():
+    # Letture e scritture a cavallo della fine degli slot: l'ordine di arrivo resta quello
+    anello = ps.AnelloFrame(5)
+    prossimo, letti = 0, []
+    for giro in range(7):
+        for _ in range(3 + giro % 3):
+            assert anello.metti(prossimo)
+            prossimo += 1
+        letti += anello.prendi_lotto(4)
+        letti += anello.prendi_lotto(4)
+    assert letti == list(range(prossimo))
+    assert anello.testa != 0 and len(anello) == 0
+    assert anello.slot == [None] * 5                 # nessun riferimento ai frame già consegnati
+
+
+def test_anello_pieno_scarta_e_conta():
+    anello = ps.AnelloFrame(4)
+    esiti = [anello.metti(i) for i in range(10)]
+    assert esiti == [True] * 4 + [False] * 6
+    assert anello.inseriti == 4 and anello.scartati == 6 and anello.picco == 4
+    assert anello.prendi_lotto(2) == [0, 1]
+    assert anello.metti("a") and anello.metti("b") and not anello.metti("c")
+    assert anello.prendi_lotto(10) == [2, 3, "a", "b"]
+    assert anello.scartati == 7 and anello.picco == 4
+
+
+def test_anello_bloccante_e_chiusura():
+    anello = ps.AnelloFrame(2)
+    anello.metti(0)
+    anello.metti(1)
+    fatto = threading.Event()
+
+    def produttore():
+        anello.metti(2, blocca=True)      # aspetta che si liberi uno slot invece di scartare
+        fatto.set()
+
+    threading.Thread(target=produttore, daemon=True).start()
+    assert not fatto.wait(0.1)
+    assert anello.prendi_lotto(1) == [0]
+    assert fatto.wait(2) and anello.scartati == 0
+
+    assert anello.prendi_lotto(5) == [1, 2]
+    assert anello.prendi_lotto(5, timeout=0.01) == []
+    anello.chiudi()
+    assert anello.prendi_lotto(5) is None
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_pipeline_stesse_righe_della_decodifica_in_linea(workers):
+    rnd = random.Random(3)
+    sorgente = [(1_700_000_000 + i / 100, pcap_io.LINKTYPE_ETHERNET, bench_sniffer.frame_sintetico(rnd))
+                for i in range(2000)]
+    attese = []
+    for ts, linktype, frame in sorgente:
+        evento = sniffer.decodifica_frame(frame, linktype)
+        if evento:
+            attese.append(sniffer.formatta_evento(sniffer.orologio.orario(ts), evento))
+
+    uscita = io.StringIO()
+    pipeline = ps.PipelineSniffer(workers=workers, capacita=64, lotto=16, uscita=uscita)
+    dati = pipeline.esegui(iter(sorgente), senza_perdite=True)
+    assert uscita.getvalue().splitlines() == attese
+    assert dati["catturati"] == dati["decodificati"] == len(sorgente)
+    assert dati["scartati"] == 0 and dati["righe"] == len(attese) and dati["anello_picco"] <= 64
+
+
+def test_chiusura_sblocca_la_cattura_in_attesa():
+    anello = ps.AnelloFrame(1)
+    anello.metti(0)
+    esito = []
+    produttore = threading.Thread(target=lambda: esito.append(anello.metti(1, blocca=True)), daemon=True)
+    produttore.start()
+    anello.chiudi()
+    produttore.join(2)
+    assert esito == [False] and anello.scartati == 1
+    assert anello.prendi_lotto(5) == [0] and anello.prendi_lotto(5) is None
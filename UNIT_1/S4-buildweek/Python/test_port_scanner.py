@@ -0,0 +1,360 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import port_scanner_v3 as ps
+
+
+@pytest.fixture
+def porte_in_ascolto():
+    server = []
+    for _ in range(3):
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        s.listen()
+        server.append(s)
+    yield sorted(s.getsockname()[1] for s in server)
+    for s in server:
+        s.close()
+
+
+@pytest.mark.parametrize("concorrenza", [1, 2, 50])
+def test_scan_ports_async_trova_le_aperte(porte_in_ascolto, concorrenza):
+    chiusa = socket.socket()   # legata ma non in ascolto: il connect riceve RST
+    chiusa.bind(("127.0.0.1", 0))
+    porte = sorted(porte_in_ascolto + [chiusa.getsockname()[1]])
+    with chiusa:
+        trovate = asyncio.run(asyncio.wait_for(ps.scan_ports_async("127.0.0.1", porte, 0.2, concorrenza), 10))
+    assert trovate == porte_in_ascolto
+
+
+def test_scan_ports_async_on_open_ed_esiti(porte_in_ascolto):
+    aperte, esiti = [], {}
+    with socket.socket() as chiusa:
+        chiusa.bind(("127.0.0.1", 0))
+        porta_chiusa = chiusa.getsockname()[1]
+        porte = porte_in_ascolto + [porta_chiusa]
+        asyncio.run(ps.scan_ports_async("127.0.0.1", porte, 0.2, 10, on_open=aperte.append,
+                                        on_esito=lambda ip, port, stato: esiti.__setitem__(port, stato)))
+    assert sorted(aperte) == porte_in_ascolto
+    assert esiti == {**{p: ps.APERTA for p in porte_in_ascolto}, porta_chiusa: ps.CHIUSA}
+
+
+def test_limite_concorrenza_almeno_uno():
+    assert ps.limite_concorrenza(0) == 1
+    assert 1 <= ps.limite_concorrenza(100) <= 100
+
+
+def test_ordina_porte_crescente_non_tocca_nulla():
+    porte = range(1, 100)
+    assert ps.ordina_porte(porte) is porte
+
+
+def test_ordina_porte_top_prima_le_comuni():
+    porte = list(range(1, 1025))
+    ordinate = ps.ordina_porte(porte, "top", seme=1)
+    assert sorted(ordinate) == porte                       # nessuna porta persa o ripetuta
+    prime = [p for p in ps.TOP_PORTE if 1 <= p <= 1024]
+    assert ordinate[:len(prime)] == prime                  # le comuni per prime, nell'ordine di TOP_PORTE
+    assert ordinate == ps.ordina_porte(porte, "top", seme=1)   # stesso seme, stesso ordine
+    assert ordinate != ps.ordina_porte(porte, "top", seme=2)
+
+
+def test_ordina_porte_ordine_sconosciuto():
+    with pytest.raises(ValueError):
+        ps.ordina_porte([80], "a caso")
+
+
+def test_arresto_max_aperte():
+    arresto = ps.Arresto(max_aperte=2)
+    assert not arresto.scattato()
+    arresto.porta_aperta()
+    assert not arresto.scattato()
+    arresto.porta_aperta()
+    assert arresto.scattato() and "2 porte aperte" in arresto.motivo
+
+
+def test_arresto_budget():
+    arresto = ps.Arresto(budget=0.05)
+    assert not arresto.scattato()
+    time.sleep(0.06)
+    assert arresto.scattato() and "budget" in arresto.motivo
+
+
+def test_stimatore_rtt_timeout():
+    rtt = ps.StimatoreRTT(timeout_iniziale=0.3, minimo=0.05, massimo=3.0)
+    assert rtt.timeout() == 0.3
+    rtt.campione(0.1)
+    assert rtt.srtt == 0.1 and rtt.timeout() == pytest.approx(0.1 + 4 * 0.05)
+    rtt.campione(0.1)
+    assert rtt.srtt == pytest.approx(0.1) and rtt.rttvar == pytest.approx(0.0375)
+    rtt.campione(0.0001)
+    assert rtt.timeout() >= 0.05
+    lento = ps.StimatoreRTT()
+    lento.campione(10)
+    assert lento.timeout() == 3.0
+
+
+def test_stimatore_rtt_ritentativi():
+    rtt = ps.StimatoreRTT()
+    assert not rtt.vale_la_pena_ritentare()          # l'host non ha mai risposto
+    rtt.risposte = 10
+    assert rtt.vale_la_pena_ritentare(0)
+    assert not rtt.vale_la_pena_ritentare(1)         # nessuna perdita dimostrata: un solo ritentativo
+    rtt.ritentativi, rtt.recuperati = 10, 1
+    assert rtt.vale_la_pena_ritentare(1)
+    rtt.ritentativi = 100                            # 1% recuperato: l'host sta filtrando
+    assert not rtt.vale_la_pena_ritentare(0)
+
+
+def test_finestra_iniziale_senza_campioni():
+    host = ps.StatoHost("127.0.0.1", range(100), ps.StimatoreRTT())
+    assert host.limite(1000) == ps.FINESTRA_INIZIALE and host.limite(2) == 2
+    host.rtt.campione(0.001)
+    assert host.limite(1000) == 1000
+    senza_risposta = ps.StatoHost("127.0.0.1", range(100), ps.StimatoreRTT())
+    senza_risposta.scaduti = 1                       # il primo probe è scaduto: niente da aspettare
+    assert senza_risposta.limite(1000) == 1000
+
+
+@pytest.fixture
+def buco_nero():
+    """Porta con la coda di accept piena: i SYN vengono scartati e il connect va in timeout."""
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    s.listen(0)
+    riempitivi = []
+    for _ in range(16):
+        c = socket.socket()
+        c.settimeout(0.2)
+        try:
+            c.connect(s.getsockname())
+        except OSError:
+            c.close()
+            break
+        riempitivi.append(c)
+    else:
+        pytest.skip("impossibile riempire la coda di accept")
+    yield s.getsockname()[1]
+    for c in riempitivi + [s]:
+        c.close()
+
+
+def test_buco_nero_ritentato_una_volta(porte_in_ascolto, buco_nero):
+    # Prima le porte che rispondono (seminano il RTT), poi quella filtrata: timeout misurato, un solo ritentativo
+    rtt = ps.StimatoreRTT(timeout_iniziale=1.0)
+    esiti = {}
+    inizio = time.perf_counter()
+    trovate = asyncio.run(ps.scan_ports_async(
+        "127.0.0.1", porte_in_ascolto + [buco_nero], 1.0, 1, rtt=rtt,
+        on_esito=lambda ip, port, stato: esiti.__setitem__(port, stato)))
+    assert trovate == porte_in_ascolto and esiti[buco_nero] == ps.FILTRATA
+    assert rtt.ritentativi == 1
+    assert time.perf_counter() - inizio < 1.0         # mai usato il timeout iniziale
+
+
+def test_scan_ports_async_una_porta(porte_in_ascolto):
+    # una sola porta, quindi un solo worker: la scansione deve finire
+    porta = porte_in_ascolto[0]
+    assert asyncio.run(asyncio.wait_for(ps.scan_ports_async("127.0.0.1", [porta], 0.2), 5)) == [porta]
+
+
+def test_scan_ports_async_arresto_anticipato(porte_in_ascolto):
+    arresto = ps.Arresto(max_aperte=1)
+    trovate = asyncio.run(asyncio.wait_for(
+        ps.scan_ports_async("127.0.0.1", porte_in_ascolto, 0.2, 1, arresto=arresto), 5))
+    assert len(trovate) == 1 and arresto.motivo
+
+
+def test_scan_ports_async_fermato_dal_budget():
+    # 20000 porte (quasi tutte chiuse): il budget ferma la scansione molto prima della fine
+    esiti = []
+    arresto = ps.Arresto(budget=0.2)
+    inizio = time.monotonic()
+    asyncio.run(asyncio.wait_for(ps.scan_ports_async(
+        "127.0.0.2", range(1, 20001), 0.2, 50, on_esito=lambda ip, port, stato: esiti.append(port),
+        arresto=arresto), 10))
+    assert time.monotonic() - inizio < 2 and arresto.motivo == "budget di tempo esaurito"
+    assert 0 < len(esiti) < 20000
+
+
+def test_espandi_target():
+    assert ps.espandi_target(["10.0.0.0/30", " 10.0.0.9 ", "", "::1"]) == ["10.0.0.1", "10.0.0.2", "10.0.0.9"]
+
+
+def test_scoperta_host_ripiega_sul_tcp_ping(monkeypatch):
+    # Senza socket ICMP l'host viene trovato dal TCP ping (anche un RST vuol dire "vivo")
+    monkeypatch.setattr(ps, "scopri_host_icmp", lambda ips, timeout: None)
+    stimatori = asyncio.run(ps.scopri_host(["127.0.0.1", "127.0.0.1"], timeout=0.3))
+    assert list(stimatori) == ["127.0.0.1"]
+    assert stimatori["127.0.0.1"].srtt is not None
+
+
+def test_scoperta_host_tcp_solo_per_chi_non_risponde_al_ping(monkeypatch):
+    chiesti = []
+
+    async def tcp(ips, timeout, concorrenza):
+        chiesti.extend(ips)
+        return {ip: 0.002 for ip in ips}
+
+    monkeypatch.setattr(ps, "scopri_host_icmp", lambda ips, timeout: {"10.0.0.1": 0.001})
+    monkeypatch.setattr(ps, "scopri_host_tcp", tcp)
+    stimatori = asyncio.run(ps.scopri_host(["10.0.0.2", "10.0.0.1"]))
+    assert chiesti == ["10.0.0.2"]
+    assert list(stimatori) == ["10.0.0.2", "10.0.0.1"]              # ordine di input
+    assert stimatori["10.0.0.1"].srtt == 0.001
+
+
+def test_sweep_async_piu_host(porte_in_ascolto):
+    # i listener sono solo su 127.0.0.1: 127.0.0.2 risponde con RST su tutte le porte
+    stimatori = {ip: ps.StimatoreRTT(0.2) for ip in ("127.0.0.1", "127.0.0.2")}
+    risultati = asyncio.run(asyncio.wait_for(ps.sweep_async(stimatori, porte_in_ascolto, 10, 2), 10))
+    assert risultati == {"127.0.0.1": porte_in_ascolto, "127.0.0.2": []}
+
+
+def test_stato_scansione_salva_e_ricarica(tmp_path):
+    percorso = str(tmp_path / "scan.stato")
+    stato = ps.StatoScansione(percorso)
+    stato.registra("10.0.0.1", 22, ps.APERTA)
+    stato.registra("10.0.0.1", 23, ps.CHIUSA)
+    stato.registra("10.0.0.1", 65535, ps.FILTRATA)
+    stato.registra("10.0.0.2", 80, ps.APERTA)
+    stato.salva()
+    assert not stato.modificato
+
+    ricaricato = ps.StatoScansione(percorso)
+    assert ricaricato.da_sondare("10.0.0.1", [21, 22, 23, 65535]) == ([21], [22])
+    assert ricaricato.da_sondare("10.0.0.2", [80, 81]) == ([81], [80])
+    assert ricaricato.da_sondare("10.0.0.3", [80]) == ([80], [])
+
+
+def test_stato_scansione_ttl_scaduto(tmp_path):
+    stato = ps.StatoScansione(str(tmp_path / "scan.stato"), ttl=60)
+    stato.registra("10.0.0.1", 22, ps.APERTA)      # blocco 0
+    stato.registra("10.0.0.1", 300, ps.APERTA)     # blocco 1
+    ora = time.time()
+    assert stato.da_sondare("10.0.0.1", [22, 300], ora + 30) == ([], [22, 300])
+    # solo il blocco richiesto viene azzerato: la porta 300 resta in cache
+    assert stato.da_sondare("10.0.0.1", [22], ora + 120) == ([22], [])
+    assert stato.da_sondare("10.0.0.1", [300], ora + 30) == ([], [300])
+
+
+def test_stato_scansione_file_illeggibile(tmp_path, capsys):
+    percorso = tmp_path / "rotto.stato"
+    percorso.write_bytes(b"non sono zlib")
+    stato = ps.StatoScansione(str(percorso))
+    assert stato.host == {} and "illeggibile" in capsys.readouterr().out
+
+
+def test_sweep_async_con_stato(tmp_path, porte_in_ascolto):
+    stato = ps.StatoScansione(str(tmp_path / "scan.stato"))
+    stimatori = {"127.0.0.1": ps.StimatoreRTT(0.2)}
+    assert asyncio.run(ps.sweep_async(stimatori, porte_in_ascolto, 10, stato=stato)) == {"127.0.0.1": porte_in_ascolto}
+    stato.salva()
+    # seconda passata: tutto dalla cache, nessun probe
+    chiamate = []
+    ricaricato = ps.StatoScansione(stato.percorso)
+    risultati = asyncio.run(ps.sweep_async(stimatori, porte_in_ascolto, 10, stato=ricaricato,
+                                           on_open=lambda ip, port: chiamate.append(port)))
+    assert risultati == {"127.0.0.1": porte_in_ascolto} and chiamate == []
+
+
+@pytest.fixture
+def servizio(monkeypatch):
+    """
+    servizio(saluto, risposte): server TCP che manda 'saluto' appena connessi e poi, per ogni
+    messaggio ricevuto, la risposta della prima chiave con cui inizia. Ritorna la porta e
+    la lista dei messaggi ricevuti.
+    """
+    monkeypatch.setattr(ps, "ATTESA_BANNER", 0.2)
+    monkeypatch.setattr(ps, "SILENZIO_BANNER", 0.1)
+    ascolti = []
+
+    def avvia(saluto=b"", risposte=None):
+        ascolto = socket.create_server(("127.0.0.1", 0))
+        ascolti.append(ascolto)
+        ricevuti = []
+
+        def servi(conn):
+            with conn:
+                try:
+                    conn.sendall(saluto)
+                    while dati := conn.recv(4096):
+                        ricevuti.append(dati)
+                        conn.sendall(next((r for k, r in (risposte or {}).items() if dati.startswith(k)), b""))
+                except OSError:
+                    pass   # es. il probe della scansione chiude con RST
+
+        def accetta():
+            while True:
+                try:
+                    conn, _ = ascolto.accept()
+                except OSError:
+                    return
+                threading.Thread(target=servi, args=(conn,), daemon=True).start()
+
+        threading.Thread(target=accetta, daemon=True).start()
+        return ascolto.getsockname()[1], ricevuti
+
+    yield avvia
+    for ascolto in ascolti:
+        ascolto.close()
+
+
+def test_banner_servizio_muto_sollecitato(servizio):
+    porta, ricevuti = servizio(risposte={ps.SOLLECITO_GENERICO: b"-ERR unknown command\r\n"})
+    assert asyncio.run(ps.leggi_banner("127.0.0.1", porta, 3)) == "-ERR unknown command"
+    assert ricevuti == [ps.SOLLECITO_GENERICO]
+
+
+def test_banner_sollecito_dopo_il_saluto(servizio, monkeypatch):
+    porta, ricevuti = servizio(b"220 mail ESMTP\r\n", {b"EHLO": b"250-mail\r\n250 STARTTLS\r\n"})
+    monkeypatch.setitem(ps.SOLLECITI, porta, ps.SOLLECITI[25])
+    testo = asyncio.run(ps.leggi_banner("127.0.0.1", porta, 3))
+    assert testo == "220 mail ESMTP\r\n250-mail\r\n250 STARTTLS" and ricevuti == [ps.SOLLECITI[25][1]]
+
+
+def test_banner_sollecito_subito(servizio, monkeypatch):
+    porta, ricevuti = servizio(risposte={b"HEAD / HTTP/1.0": b"HTTP/1.0 200 OK\r\nServer: finto\r\n\r\n"})
+    monkeypatch.setitem(ps.SOLLECITI, porta, ps.SOLLECITI[80])
+    inizio = time.monotonic()
+    assert asyncio.run(ps.leggi_banner("127.0.0.1", porta, 3)).startswith("HTTP/1.0 200 OK")
+    assert time.monotonic() - inizio < ps.ATTESA_BANNER + 1 and len(ricevuti) == 1
+
+
+def test_banner_saluto_senza_sollecito_specifico(servizio):
+    # chi parla per primo e non ha un sollecito per la porta non riceve nulla
+    porta, ricevuti = servizio(b"SSH-2.0-OpenSSH_9.6\r\n")
+    assert asyncio.run(ps.leggi_banner("127.0.0.1", porta, 3)) == "SSH-2.0-OpenSSH_9.6" and ricevuti == []
+
+
+def test_testo_banner():
+    assert ps._testo_banner(b"\xff\xfd\x18login: ") == "\\xff\\xfd\\x18login:"      # negoziazione telnet
+    assert ps._testo_banner("220 caffè\r\n".encode()) == "220 caffè"
+    assert ps._testo_banner(b"") == ""
+
+
+def test_leggi_banner_async_e_port_scan(servizio, monkeypatch, capsys):
+    muto, _ = servizio()
+    parla, _ = servizio(b"220 ciao\r\n")
+    with socket.socket() as chiusa:
+        chiusa.bind(("127.0.0.1", 0))
+        porta_chiusa = chiusa.getsockname()[1]
+        visti = []
+        banner = asyncio.run(ps.leggi_banner_async([("127.0.0.1", p) for p in (muto, parla, porta_chiusa)], 2, 3,
+                                                   on_banner=lambda ip, port, testo: visti.append(port)))
+    assert banner == {("127.0.0.1", muto): "", ("127.0.0.1", parla): "220 ciao", ("127.0.0.1", porta_chiusa): None}
+    assert sorted(visti) == sorted((muto, parla, porta_chiusa))
+
+    monkeypatch.setattr(ps, "check_host_up", lambda ip, rtt: True)
+    aperte = ps.port_scan("127.0.0.1", parla, parla, banner=True)
+    assert aperte == [parla] and aperte.banner == {("127.0.0.1", parla): "220 ciao"}
+    assert f"Porta {parla}: 220 ciao" in capsys.readouterr().out
+
+    monkeypatch.setattr(ps, "scopri_host_icmp", lambda ips, timeout: None)
+    risultati = ps.sweep(["127.0.0.1"], muto, muto, timeout=0.3, banner=True)
+    assert risultati == {"127.0.0.1": [muto]} and risultati.banner == {("127.0.0.1", muto): ""}
+    assert f"127.0.0.1: porta {muto}: nessun banner" in capsys.readouterr().out
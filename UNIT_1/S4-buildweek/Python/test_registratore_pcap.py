@@ -0,0 +1,87 @@
+import os
+import shutil
+import struct
+import time
+
+import pytest
+
+import pcap_io
+import registratore_pcap
+
+
+def _frame(i):
+    """Frame Ethernet finto di lunghezza variabile, riconoscibile dal numero."""
+    return bytes(12) + b"\x08\x00" + struct.pack("!I", i) + bytes(i % 50)
+
+
+def _leggi_segmenti(percorsi):
+    frame = []
+    for percorso in percorsi:
+        with pcap_io.LettorePcap(percorso) as lettore:
+            frame += [(ts, linktype, bytes(f)) for ts, linktype, f in lettore]
+    return frame
+
+
+def test_registratore_e_lettore_andata_e_ritorno(tmp_path):
+    scritti = [(1700000000 + i / 1000, pcap_io.LINKTYPE_ETHERNET, _frame(i)) for i in range(5000)]
+    with registratore_pcap.RegistratorePcap(str(tmp_path / "cattura"), max_byte=20_000) as registratore:
+        for ts, linktype, frame in scritti:
+            assert registratore.metti(ts, linktype, frame, blocca=True)
+
+    statistiche = registratore.statistiche()
+    assert statistiche["scritti"] == 5000 and statistiche["scartati"] == 0
+    assert statistiche["segmenti"] == len(registratore.segmenti) > 1
+    letti = _leggi_segmenti(registratore.segmenti)
+    assert len(letti) == len(scritti)
+    for (ts, linktype, frame), (ts_letto, linktype_letto, frame_letto) in zip(scritti, letti):
+        assert frame_letto == frame and linktype_letto == linktype
+        assert abs(ts_letto - ts) < 2e-6
+
+
+def test_registratore_un_segmento_per_linktype(tmp_path):
+    # Ethernet e RAW alternati: due segmenti aperti insieme, non un file per frame
+    with registratore_pcap.RegistratorePcap(str(tmp_path / "misto")) as registratore:
+        for i in range(1000):
+            linktype = pcap_io.LINKTYPE_ETHERNET if i % 2 else pcap_io.LINKTYPE_RAW
+            registratore.metti(float(i), linktype, _frame(i), blocca=True)
+    assert len(registratore.segmenti) == 2
+    letti = _leggi_segmenti(registratore.segmenti)
+    assert sorted(ts for ts, _, _ in letti) == [float(i) for i in range(1000)]
+    assert {linktype for _, linktype, _ in letti} == {pcap_io.LINKTYPE_ETHERNET, pcap_io.LINKTYPE_RAW}
+
+
+def test_registratore_compressione(tmp_path):
+    with registratore_pcap.RegistratorePcap(str(tmp_path / "gz"), comprimi=True) as registratore:
+        registratore.metti(1.0, pcap_io.LINKTYPE_ETHERNET, _frame(1))
+    assert all(p.endswith(".pcap.gz") and os.path.exists(p) for p in registratore.segmenti)
+    assert not list(tmp_path.glob("*.pcap"))
+
+
+def test_registratore_segmento_scaduto_senza_traffico(tmp_path):
+    with registratore_pcap.RegistratorePcap(str(tmp_path / "lento"), max_secondi=0.2) as registratore:
+        registratore.metti(1.0, pcap_io.LINKTYPE_ETHERNET, _frame(1))
+        fine = time.monotonic() + 2
+        while not registratore.segmenti and time.monotonic() < fine:
+            time.sleep(0.05)
+        assert len(registratore.segmenti) == 1        # chiuso dal tempo, non da chiudi()
+        registratore.metti(2.0, pcap_io.LINKTYPE_ETHERNET, _frame(2))
+    assert len(registratore.segmenti) == 2
+    assert [ts for ts, _, _ in _leggi_segmenti(registratore.segmenti)] == [1.0, 2.0]
+
+
+def test_registratore_cartella_inesistente(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        registratore_pcap.RegistratorePcap(str(tmp_path / "manca" / "seg")).avvia()
+
+
+def test_registratore_errore_di_scrittura(tmp_path):
+    # La cartella sparisce dopo l'avvio: l'errore esce da metti() e da chiudi(), senza blocchi
+    cartella = tmp_path / "sparisce"
+    cartella.mkdir()
+    registratore = registratore_pcap.RegistratorePcap(str(cartella / "seg"), capacita=8).avvia()
+    shutil.rmtree(cartella)
+    with pytest.raises(FileNotFoundError):
+        for i in range(10000):
+            registratore.metti(float(i), pcap_io.LINKTYPE_ETHERNET, _frame(i), blocca=True)
+    with pytest.raises(FileNotFoundError):
+        registratore.chiudi()
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+pytest.importorskip("scapy.all")
+
+from scapy.all import ARP, IP, TCP, UDP, Ether, IPv6, Raw  # noqa: E402
+
+import bench_sniffer  # noqa: E402
+import pcap_io  # noqa: E402
+import sniffer_tool4 as sniffer  # noqa: E402
+
+
+def test_decodifica_veloce_uguale_a_scapy():
+    # Stessi frame sintetici del benchmark: TCP (anche con VLAN e padding), ARP, UDP e IPv6 da ignorare
+    rnd = random.Random(42)
+    for _ in range(3000):
+        frame = bench_sniffer.frame_sintetico(rnd)
+        veloce = sniffer.decodifica_frame(frame, pcap_io.LINKTYPE_ETHERNET)
+        assert veloce == sniffer.evento_da_scapy(Ether(frame)), frame.hex()
+
+
+@pytest.mark.parametrize("pacchetto", [
+    IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=1234, dport=80, flags="SA") / Raw(b"ciao"),
+    IP(src="10.0.0.1", dst="10.0.0.2", flags="MF") / TCP(dport=22),
+    IP(src="10.0.0.1", dst="10.0.0.2", frag=10) / Raw(b"x" * 20),      # frammento successivo: niente TCP
+    IP(src="10.0.0.1", dst="10.0.0.2") / UDP(sport=53, dport=53),
+    IPv6() / TCP(dport=443),
+])
+def test_linktype_raw_uguale_a_scapy(pacchetto):
+    frame = bytes(pacchetto)
+    atteso = sniffer.evento_da_scapy(Ether() / pacchetto)
+    assert sniffer.decodifica_linktype(frame, pcap_io.LINKTYPE_RAW) == atteso
+    assert sniffer.decodifica_veloce(bytes(Ether() / pacchetto)) == atteso
+
+
+def test_linktype_linux_sll():
+    ip = bytes(IP(src="1.2.3.4", dst="5.6.7.8") / TCP(sport=5, dport=6, flags="R"))
+    sll = b"\x00\x00\x00\x01\x00\x06" + bytes(8) + b"\x08\x00"       # header "cooked" di 16 byte
+    assert sniffer.decodifica_linktype(sll + ip, pcap_io.LINKTYPE_LINUX_SLL) == ("TCP", "1.2.3.4", 5, "5.6.7.8", 6, "R", 0)
+
+
+def test_arp():
+    frame = bytes(Ether() / ARP(op=2, psrc="10.0.0.1", pdst="10.0.0.2", hwsrc="aa:bb:cc:dd:ee:ff"))
+    assert sniffer.decodifica_veloce(frame) == ("ARP", 2, "10.0.0.1", "10.0.0.2", "aa:bb:cc:dd:ee:ff")
+
+
+def test_frame_sconosciuti_vanno_a_scapy():
+    assert sniffer.decodifica_veloce(b"\x00" * 10) is sniffer.NON_DECODIFICATO
+    assert sniffer.decodifica_linktype(b"\x00" * 60, 9999) is sniffer.NON_DECODIFICATO
+    assert sniffer.decodifica_veloce(bytes(Ether(type=0x88CC) / Raw(b"x" * 50))) is sniffer.NON_DECODIFICATO
+
+
+def test_pcap_riletto_come_live(tmp_path, capsys):
+    # analizza_pcap stampa le stesse righe della decodifica frame per frame
+    rnd = random.Random(7)
+    frames = [bench_sniffer.frame_sintetico(rnd) for _ in range(500)]
+    percorso = tmp_path / "sintetico.pcap"
+    bench_sniffer.scrivi_pcap(str(percorso), frames)
+    sniffer.analizza_pcap(str(percorso))
+    righe = capsys.readouterr().out.splitlines()
+    attese = [evento for evento in (sniffer.evento_da_scapy(Ether(f)) for f in frames) if evento]
+    assert len(righe) == len(attese)
+    assert all(riga.split(" ", 1)[1] == sniffer.formatta_evento("", evento).lstrip()
+               for riga, evento in zip(righe, attese))
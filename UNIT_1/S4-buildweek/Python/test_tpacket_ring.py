@@ -0,0 +1,81 @@
+import select
+import socket
+
+import pytest
+
+import sniffer_tool4 as sniffer
+
+try:
+    socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0).close()
+except (AttributeError, PermissionError) as e:
+    pytest.skip(f"serve un socket AF_PACKET (Linux, CAP_NET_RAW): {e}", allow_module_level=True)
+
+import tpacket_ring  # noqa: E402
+
+
+def _traffico_su_loopback():
+    """Una connessione TCP e un datagramma UDP su 127.0.0.1: ritorna la porta del server TCP."""
+    with socket.create_server(("127.0.0.1", 0)) as server:
+        porta = server.getsockname()[1]
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp:
+            udp.sendto(b"x", ("127.0.0.1", porta))
+        socket.create_connection(("127.0.0.1", porta)).close()
+    return porta
+
+
+@pytest.mark.parametrize("iface", ["lo", None])
+def test_cattura_filtrata_su_loopback(iface):
+    with tpacket_ring.AnelloTpacket(iface, dim_blocco=1 << 16, n_blocchi=4, attesa_blocco_ms=10) as anello:
+        porta = _traffico_su_loopback()
+        frame = []
+        for blocco in anello.blocchi(timeout_ms=200):
+            if not blocco:
+                break
+            frame += [(linktype, bytes(f)) for _, linktype, f in blocco]
+        assert anello.hatype_sconosciuti == 0
+
+    eventi = [sniffer.decodifica_frame(f, linktype) for linktype, f in frame]
+    nostri = [e for e in eventi if e and e[0] == "TCP" and porta in (e[2], e[4])]
+    # su lo ogni frame passa in uscita e in ingresso: l'handshake compare una volta sola
+    assert [e[5] for e in nostri[:3]] == ["S", "SA", "A"]
+    assert not [f for _, f in frame if f[12:14] == b"\x08\x00" and f[23] == 17]     # l'UDP non passa il filtro
+
+
+@pytest.mark.parametrize("iface", ["lo", None])
+def test_nessun_frame_prima_del_filtro(iface, monkeypatch):
+    # Traffico mentre il filtro viene attaccato: il socket non ancora legato non deve ricevere nulla
+    ricevuti = []
+    originale = tpacket_ring.attacca_filtro
+
+    def attacca_con_traffico(sock, istruzioni):
+        _traffico_su_loopback()
+        ricevuti.append(select.select([sock], [], [], 0.1)[0])
+        originale(sock, istruzioni)
+    monkeypatch.setattr(tpacket_ring, "attacca_filtro", attacca_con_traffico)
+    tpacket_ring.AnelloTpacket(iface, dim_blocco=1 << 16, n_blocchi=2).chiudi()
+    assert ricevuti == [[]]
+
+
+def test_interfaccia_inesistente_chiude_il_socket(monkeypatch):
+    aperti = []
+    originale = socket.socket
+
+    def traccia(*args, **kwargs):
+        s = originale(*args, **kwargs)
+        aperti.append(s)
+        return s
+    monkeypatch.setattr(tpacket_ring.socket, "socket", traccia)
+    with pytest.raises(OSError):
+        tpacket_ring.AnelloTpacket("nessuna0", dim_blocco=1 << 16, n_blocchi=2)
+    assert len(aperti) == 1 and aperti[0].fileno() == -1
+
+
+def test_filtro_non_supportato():
+    with pytest.raises(ValueError, match="tcp or arp"):
+        tpacket_ring.AnelloTpacket("lo", filtro="udp")
+
+
+def test_tpacket_solo_per_la_cattura_live(capsys):
+    with pytest.raises(SystemExit):
+        sniffer.cli(["-t", "-r", "cattura.pcap"])
+    assert "-t/--tpacket" in capsys.readouterr().err
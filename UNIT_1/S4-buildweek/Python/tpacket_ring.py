@@ -0,0 +1,268 @@
+"""
+Cattura Linux con socket AF_PACKET e anello TPACKET_V3 in memoria condivisa.
+
+Con scapy (conf.L2listen + recv_raw) ogni frame costa una chiamata di sistema e una
+copia dal kernel. Qui il kernel scrive i frame direttamente in un anello di blocchi
+mappato con mmap nel nostro processo:
+
+- ogni blocco contiene molti frame; il kernel lo passa a noi (TP_STATUS_USER) quando
+  è pieno o dopo 'attesa_blocco_ms', e noi lo restituiamo (TP_STATUS_KERNEL) dopo
+  averne letto tutti i frame: una poll() per blocco invece di una recv() per frame;
+- il filtro "tcp or arp" è un programma BPF classico attaccato al socket, quindi i
+  frame che non ci interessano non arrivano nemmeno nell'anello;
+- i frame sono memoryview dentro l'anello, senza copie: restano validi finché non si
+  passa al blocco successivo (chi li deve tenere ne fa bytes()).
+
+Solo Linux, serve CAP_NET_RAW (root). I frame escono come tuple (ts, linktype, frame),
+le stesse di pcap_io.LettorePcap e sniffer_tool4.sorgente_live.
+"""
+import ctypes
+import mmap
+import os
+import select
+import socket
+import struct
+
+import metriche
+import pcap_io
+
+# ---COSTANTI DEL KERNEL (linux/if_packet.h, linux/filter.h)---
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+SO_ATTACH_FILTER = 26
+ETH_P_ALL = 0x0003
+
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+PACKET_OUTGOING = 4
+
+ARPHRD_LOOPBACK = 772
+LINKTYPE_IEEE802_11 = 105
+LINKTYPE_IEEE802_11_RADIOTAP = 127
+# tipo di interfaccia (ARPHRD_*) -> linktype dei frame letti da un socket SOCK_RAW, come in libpcap.
+# I frame di interfacce di altri tipi (es. ARPHRD_IPGRE) non vengono interpretati a caso come
+# Ethernet: si scartano e si contano in 'hatype_sconosciuti'.
+LINKTYPE_DA_ARPHRD = {
+    1: pcap_io.LINKTYPE_ETHERNET,            # ARPHRD_ETHER
+    ARPHRD_LOOPBACK: pcap_io.LINKTYPE_ETHERNET,   # lo ha un header Ethernet con MAC a zero
+    512: pcap_io.LINKTYPE_RAW,               # ARPHRD_PPP: nessun header di livello 2
+    519: pcap_io.LINKTYPE_RAW,               # ARPHRD_RAWIP (modem LTE/5G)
+    768: pcap_io.LINKTYPE_RAW,               # ARPHRD_TUNNEL (IP-in-IP)
+    769: pcap_io.LINKTYPE_RAW,               # ARPHRD_TUNNEL6 (ip6tnl)
+    776: pcap_io.LINKTYPE_RAW,               # ARPHRD_SIT (IPv6-in-IPv4)
+    801: LINKTYPE_IEEE802_11,                # ARPHRD_IEEE80211
+    803: LINKTYPE_IEEE802_11_RADIOTAP,       # ARPHRD_IEEE80211_RADIOTAP (monitor mode)
+    65534: pcap_io.LINKTYPE_RAW,             # ARPHRD_NONE (tun, wireguard)
+}
+
+# struct tpacket_req3: block_size, block_nr, frame_size, frame_nr, retire_blk_tov, sizeof_priv, feature_req_word
+TPACKET_REQ3 = struct.Struct("=7I")
+# struct tpacket_block_desc: version, offset_to_priv, poi tpacket_hdr_v1: block_status, num_pkts, offset_to_first_pkt
+OFFSET_STATO_BLOCCO = 8
+BLOCCO_HDR = struct.Struct("=II")   # num_pkts, offset_to_first_pkt
+OFFSET_BLOCCO_HDR = 12
+# struct tpacket3_hdr: next_offset, sec, nsec, snaplen, len, status, mac, net
+TPACKET3_HDR = struct.Struct("=IIIIIIHH")
+# struct sockaddr_ll dopo l'header allineato a 16 byte (TPACKET_ALIGN(sizeof(tpacket3_hdr)) = 48): ci servono hatype e pkttype
+OFFSET_SOCKADDR_LL = 48
+SOCKADDR_LL_TIPO = struct.Struct("=HB")
+OFFSET_HATYPE = 8
+TPACKET_STATS_V3 = struct.Struct("=III")  # packets, drops, freeze_q_cnt
+
+DIM_BLOCCO_DEFAULT = 1 << 20   # 1 MiB per blocco (multiplo della pagina)
+N_BLOCCHI_DEFAULT = 32         # 32 MiB di anello
+DIM_FRAME = 2048               # richiesto dal kernel anche se in V3 i frame hanno lunghezza variabile
+ATTESA_BLOCCO_MS = 50          # un blocco non pieno viene comunque passato a noi dopo questo tempo
+SNAPLEN = 262144
+
+# ---FILTRO BPF CLASSICO---
+# Istruzioni (code, jt, jf, k) come in linux/filter.h. Invece di leggere l'ethertype a un offset fisso
+# usiamo i caricamenti "ancillari" del kernel (protocollo dell'skb, offset dall'header di rete):
+# il filtro vale per qualunque tipo di interfaccia, anche catturando su tutte insieme.
+BPF_LD_H_ABS = 0x28
+BPF_LD_B_ABS = 0x30
+BPF_JEQ_K = 0x15
+BPF_RET_K = 0x06
+SKF_AD_PROTOCOL = -0x1000        # SKF_AD_OFF + SKF_AD_PROTOCOL: ethertype del frame (ordine host)
+SKF_NET_OFF = -0x100000          # offset relativi all'inizio dell'header IP
+
+
+def _k(valore):
+    return valore & 0xFFFFFFFF
+
+
+# "tcp or arp", comprese le connessioni TCP su IPv6 (anche con header di frammentazione)
+FILTRO_TCP_O_ARP = [
+    (BPF_LD_H_ABS, 0, 0, _k(SKF_AD_PROTOCOL)),   # 0: A = ethertype
+    (BPF_JEQ_K, 9, 0, 0x0806),                   # 1: ARP -> accetta
+    (BPF_JEQ_K, 0, 2, 0x0800),                   # 2: IPv4? altrimenti -> 5
+    (BPF_LD_B_ABS, 0, 0, _k(SKF_NET_OFF + 9)),   # 3: A = protocollo IPv4
+    (BPF_JEQ_K, 6, 7, 6),                        # 4: TCP -> accetta, altrimenti scarta
+    (BPF_JEQ_K, 0, 6, 0x86DD),                   # 5: IPv6? altrimenti scarta
+    (BPF_LD_B_ABS, 0, 0, _k(SKF_NET_OFF + 6)),   # 6: A = next header
+    (BPF_JEQ_K, 3, 0, 6),                        # 7: TCP -> accetta
+    (BPF_JEQ_K, 0, 3, 44),                       # 8: header di frammentazione? altrimenti scarta
+    (BPF_LD_B_ABS, 0, 0, _k(SKF_NET_OFF + 40)),  # 9: A = next header dopo il frammento
+    (BPF_JEQ_K, 0, 1, 6),                        # 10: TCP -> accetta, altrimenti scarta
+    (BPF_RET_K, 0, 0, SNAPLEN),                  # 11: accetta
+    (BPF_RET_K, 0, 0, 0),                        # 12: scarta
+]
+
+FILTRI = {"tcp or arp": FILTRO_TCP_O_ARP}
+
+
+def lega(sock, iface=None, protocollo=ETH_P_ALL):
+    """
+    bind() del socket AF_PACKET a 'iface' (None = tutte le interfacce) per 'protocollo'.
+    socket.bind() vuole sempre un nome di interfaccia: per "tutte" (ifindex 0) si chiama
+    bind() della libc con una struct sockaddr_ll scritta a mano.
+    """
+    indice = socket.if_nametoindex(iface) if iface else 0
+    # struct sockaddr_ll: family, protocol (big endian), ifindex, hatype, pkttype, halen, addr[8]
+    indirizzo = struct.pack("=HHiHBB8s", socket.AF_PACKET, socket.htons(protocollo), indice, 0, 0, 0, b"")
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.bind(sock.fileno(), indirizzo, len(indirizzo)) != 0:
+        errore = ctypes.get_errno()
+        raise OSError(errore, os.strerror(errore))
+
+
+def attacca_filtro(sock, istruzioni):
+    """SO_ATTACH_FILTER con un programma BPF classico (lista di tuple code, jt, jf, k)."""
+    programma = ctypes.create_string_buffer(b"".join(struct.pack("=HBBI", *i) for i in istruzioni))
+    # struct sock_fprog: unsigned short len, struct sock_filter *filter (il kernel copia il programma)
+    fprog = struct.pack("HL", len(istruzioni), ctypes.addressof(programma))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+class AnelloTpacket:
+    """
+    Socket AF_PACKET con anello TPACKET_V3. iface=None cattura su tutte le interfacce.
+
+        with AnelloTpacket("lo") as anello:
+            for ts, linktype, frame in anello:
+                ...
+
+    blocchi() dà invece un blocco alla volta come lista di frame, per chi lavora a lotti.
+    """
+
+    def __init__(self, iface=None, filtro="tcp or arp", dim_blocco=DIM_BLOCCO_DEFAULT,
+                 n_blocchi=N_BLOCCHI_DEFAULT, attesa_blocco_ms=ATTESA_BLOCCO_MS):
+        if filtro not in FILTRI:
+            raise ValueError(f"filtro non supportato dal backend TPACKET_V3: {filtro!r} "
+                             f"(disponibili: {', '.join(FILTRI)})")
+        self.dim_blocco = dim_blocco
+        self.n_blocchi = n_blocchi
+        self.pacchetti = 0
+        self.scartati_kernel = 0
+        self.hatype_sconosciuti = 0   # frame di interfacce con ARPHRD_* non in LINKTYPE_DA_ARPHRD
+
+        # Protocollo 0 e bind() solo alla fine: nessun frame arriva prima di filtro e anello
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        try:
+            attacca_filtro(self.sock, FILTRI[filtro])
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            richiesta = TPACKET_REQ3.pack(dim_blocco, n_blocchi, DIM_FRAME, dim_blocco // DIM_FRAME * n_blocchi,
+                                          attesa_blocco_ms, 0, 0)
+            self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, richiesta)
+            self.mappa = mmap.mmap(self.sock.fileno(), dim_blocco * n_blocchi,
+                                   mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            lega(self.sock, iface)
+        except BaseException:
+            self.sock.close()
+            raise
+        self.vista = memoryview(self.mappa)
+        self._poll = select.poll()
+        self._poll.register(self.sock.fileno(), select.POLLIN | select.POLLERR)
+        self._prossimo = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.chiudi()
+        return False
+
+    def _aspetta_blocco(self, timeout_ms):
+        """Offset del prossimo blocco pronto per noi, oppure None dopo timeout_ms (None = aspetta sempre)."""
+        offset = self._prossimo * self.dim_blocco
+        stato_in = OFFSET_STATO_BLOCCO + offset
+        while not struct.unpack_from("=I", self.mappa, stato_in)[0] & TP_STATUS_USER:
+            if not self._poll.poll(timeout_ms) and timeout_ms is not None:
+                return None
+        return offset
+
+    def _restituisci(self, offset):
+        struct.pack_into("=I", self.mappa, offset + OFFSET_STATO_BLOCCO, TP_STATUS_KERNEL)
+        self._prossimo = (self._prossimo + 1) % self.n_blocchi
+
+    def _frame_del_blocco(self, offset):
+        vista = self.vista
+        n_frame, primo = BLOCCO_HDR.unpack_from(vista, offset + OFFSET_BLOCCO_HDR)
+        posizione = offset + primo
+        unpack_hdr = TPACKET3_HDR.unpack_from
+        unpack_ll = SOCKADDR_LL_TIPO.unpack_from
+        linktypes = LINKTYPE_DA_ARPHRD
+        for _ in range(n_frame):
+            successivo, sec, nsec, catturati, _, _, mac, _ = unpack_hdr(vista, posizione)
+            hatype, tipo = unpack_ll(vista, posizione + OFFSET_SOCKADDR_LL + OFFSET_HATYPE)
+            linktype = linktypes.get(hatype)
+            if linktype is None:
+                self.hatype_sconosciuti += 1
+            # Su lo ogni frame passa due volte (uscita e ingresso): come libpcap teniamo solo l'ingresso
+            elif not (tipo == PACKET_OUTGOING and hatype == ARPHRD_LOOPBACK):
+                inizio = posizione + mac
+                yield sec + nsec / 1e9, linktype, vista[inizio:inizio + catturati]
+            posizione += successivo
+
+    def blocchi(self, timeout_ms=None):
+        """
+        Genera un blocco alla volta come lista di (ts, linktype, frame). Il blocco torna al
+        kernel quando si chiede il successivo: i suoi frame (memoryview) valgono fino ad allora.
+        Con timeout_ms, dopo quel tempo senza blocchi pronti genera una lista vuota.
+        """
+        m = metriche.registro
+        while True:
+            offset = self._aspetta_blocco(timeout_ms)
+            if offset is None:
+                yield []
+                continue
+            try:
+                frame = list(self._frame_del_blocco(offset))
+                self.pacchetti += len(frame)
+                m.conta("sniffer.blocchi_tpacket")
+                yield frame
+            finally:
+                self._restituisci(offset)
+
+    def __iter__(self):
+        for blocco in self.blocchi():
+            yield from blocco
+
+    def statistiche(self):
+        """Contatori del kernel (si azzerano a ogni lettura): frame passati dal filtro e persi ad anello pieno."""
+        dati = self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, TPACKET_STATS_V3.size)
+        pacchetti, scartati, _ = TPACKET_STATS_V3.unpack(dati)
+        self.scartati_kernel += scartati
+        return {"kernel_pacchetti": pacchetti, "kernel_scartati": scartati,
+                "hatype_sconosciuti": self.hatype_sconosciuti}
+
+    def chiudi(self):
+        if self.sock.fileno() < 0:
+            return
+        metriche.registro.conta("sniffer.scartati_kernel", self.statistiche()["kernel_scartati"])
+        metriche.registro.conta("sniffer.scartati_hatype", self.hatype_sconosciuti)
+        self.vista.release()
+        try:
+            self.mappa.close()
+        except BufferError:
+            pass   # qualcuno tiene ancora un frame: la mappa si libera con l'ultimo riferimento
+        self.sock.close()
+
+
+def sorgente_tpacket(filtro="tcp or arp", iface=None):
+    """Come sniffer_tool4.sorgente_live, ma dall'anello TPACKET_V3."""
+    with AnelloTpacket(iface, filtro) as anello:
+        yield from anello